@@ -0,0 +1,354 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+import pandas as pd
+
+from changes import install_changes
+from growth import install_growth
+from piglet_db import DB_PATH, herd_shards, piglet_table
+from resources import lazy_import
+
+# -----------------------------
+# Settings
+# -----------------------------
+# Columnar in-memory copy of the herd and its weighings for reporting. Dimension
+# columns are categoricals, so group-bys work on integer codes. The copy is
+# brought up to date from SQLite incrementally (HerdChanges versions for pigs,
+# WeightHistory rowids for weighings); queries only touch the columns.
+STORE_DIR = os.environ.get("PIGLYTICS_ANALYTICS_DIR", "analytics_store")
+REFRESH_SECONDS = 5.0
+SAVE_SECONDS = 300.0
+CACHE_ENTRIES = 128
+DIMENSIONS = ["gender", "breed", "location", "health_status"]
+AGGREGATES = {"mean", "sum", "count", "min", "max", "median", "std", "nunique"}
+PIGLET_COLUMNS = ["barcode", "birth_date", "breed", "weight", "health_status", "location"]
+
+# -----------------------------
+# Sources
+# -----------------------------
+# One SQLite file the engine reads: the database, or one herd shard. Each
+# keeps its own HerdChanges version and WeightHistory rowid cursors and the
+# raw rows of its own pigs, so a pig moved between barns leaves one source's
+# rows and joins the other's whichever is read first.
+
+# Dates and weights are parsed once as rows arrive, not on every derive
+def _typed_weighings(frame):
+    frame["weighed_on"] = pd.to_datetime(frame["weighed_on"], errors="coerce")
+    frame["weight"] = pd.to_numeric(frame["weight"], errors="coerce")
+    return frame
+
+class _Source:
+    def __init__(self, path):
+        install_changes(path)
+        install_growth(path)
+        self.path = path
+        self.name = os.path.basename(path)
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.raw_piglets = pd.DataFrame(columns=PIGLET_COLUMNS + ["gender"]).set_index("barcode")
+        self.raw_weighings = pd.DataFrame({"rowid": pd.Series(dtype="int64"), "barcode": pd.Series(dtype=object),
+                                           "weighed_on": pd.Series(dtype="datetime64[ns]"),
+                                           "weight": pd.Series(dtype=float)})
+        self.herd_version = 0
+        self.weight_rowid = 0
+        self.data_version = None
+
+    def refresh(self, force=False):
+        data_version = self.conn.execute("PRAGMA data_version").fetchone()[0]
+        if not force and data_version == self.data_version:
+            return False
+        self.data_version = data_version
+        return self._refresh_piglets() | self._refresh_weighings()
+
+    def _refresh_piglets(self):
+        rows = self.conn.execute("SELECT barcode, version, gender, deleted FROM HerdChanges WHERE version > ?",
+                                 (self.herd_version,)).fetchall()
+        if not rows:
+            return False
+        barcodes = [row[0] for row in rows]
+        fresh = []
+        for gender in ("Male", "Female"):
+            wanted = [row[0] for row in rows if row[2] == gender and not row[3]]
+            for start in range(0, len(wanted), 500):
+                chunk = wanted[start:start + 500]
+                frame = pd.read_sql_query(
+                    f"SELECT {', '.join(PIGLET_COLUMNS)} FROM {piglet_table(gender)} "
+                    f"WHERE barcode IN ({', '.join('?' * len(chunk))})", self.conn, params=chunk)
+                frame["gender"] = gender
+                frame["birth_date"] = pd.to_datetime(frame["birth_date"], errors="coerce")
+                frame["weight"] = pd.to_numeric(frame["weight"], errors="coerce")
+                fresh.append(frame.set_index("barcode"))
+        kept = self.raw_piglets.drop(index=barcodes, errors="ignore")
+        self.raw_piglets = pd.concat([kept] + fresh) if fresh else kept
+        self.herd_version = max(row[1] for row in rows)
+        return True
+
+    # INSERT OR REPLACE gives a replaced weighing a new rowid, so rows past the
+    # last seen rowid cover inserts and updates; a count mismatch afterwards
+    # means something was deleted and the weighings are reloaded in full.
+    def _refresh_weighings(self):
+        delta = pd.read_sql_query("SELECT rowid, barcode, weighed_on, weight FROM WeightHistory WHERE rowid > ? "
+                                  "ORDER BY rowid", self.conn, params=(self.weight_rowid,))
+        delta = _typed_weighings(delta)
+        total = self.conn.execute("SELECT COUNT(*) FROM WeightHistory").fetchone()[0]
+        if delta.empty and total == len(self.raw_weighings):
+            return False
+        weighings = pd.concat([self.raw_weighings, delta], ignore_index=True) if len(self.raw_weighings) else delta
+        weighings = weighings.drop_duplicates(["barcode", "weighed_on"], keep="last")
+        if len(weighings) != total:
+            weighings = _typed_weighings(
+                pd.read_sql_query("SELECT rowid, barcode, weighed_on, weight FROM WeightHistory", self.conn))
+        self.raw_weighings = weighings.reset_index(drop=True)
+        self.weight_rowid = int(self.raw_weighings["rowid"].max()) if len(self.raw_weighings) else 0
+        return True
+
+# -----------------------------
+# Engine
+# -----------------------------
+class AnalyticsEngine:
+    def __init__(self, db_path=DB_PATH, store_dir=STORE_DIR):
+        self.db_path = db_path
+        self.store_dir = store_dir
+        self.lock = threading.RLock()
+        self.sources = {}
+        self.checked_at = 0.0
+        self.saved_at = time.monotonic()
+        self.version = 0
+        self.piglets = None
+        self.weighings = None
+        self.cache = OrderedDict()
+        self._load()
+        if not self.refresh(force=True):
+            self._derive()
+
+    # The database itself, or every herd shard including ones added since
+    def _sources(self):
+        for path in herd_shards(self.db_path):
+            if path not in self.sources:
+                self.sources[path] = _Source(path)
+        return list(self.sources.values())
+
+    # -----------------------------
+    # Incremental Refresh
+    # -----------------------------
+    def refresh(self, force=False):
+        with self.lock:
+            if not force and time.monotonic() - self.checked_at < REFRESH_SECONDS:
+                return False
+            self.checked_at = time.monotonic()
+            changed = False
+            for source in self._sources():
+                changed |= source.refresh(force)
+            if changed:
+                self._derive()
+                if time.monotonic() - self.saved_at >= SAVE_SECONDS:
+                    self.save()
+            return changed
+
+    # Typed, denormalised query frames: one row per pig with its growth
+    # summary, and one row per weighing carrying the pig's dimensions
+    def _derive(self):
+        np = lazy_import("numpy")
+        sources = self._sources()
+        raw = pd.concat([source.raw_piglets for source in sources])
+        # A pig caught mid-move between two barn shards counts once
+        piglets = raw[~raw.index.duplicated(keep="last")].reset_index().rename(columns={"index": "barcode"})
+        piglets["birth_date"] = pd.to_datetime(piglets["birth_date"], errors="coerce")
+        piglets["weight"] = pd.to_numeric(piglets["weight"], errors="coerce")
+        piglets["birth_week"] = piglets["birth_date"].dt.to_period("W").dt.start_time
+        piglets["sick"] = (piglets["health_status"] == "Sick").astype(float)
+        for column in DIMENSIONS:
+            piglets[column] = piglets[column].astype("category")
+
+        weighings = pd.concat([source.raw_weighings[["barcode", "weighed_on", "weight"]] for source in sources],
+                              ignore_index=True).drop_duplicates(["barcode", "weighed_on"], keep="last")
+        weighings = weighings.dropna(subset=["weighed_on", "weight"]).sort_values(["barcode", "weighed_on"])
+        # First/last weighing per pig from group boundaries in one sorted pass
+        codes, uniques = pd.factorize(weighings["barcode"], sort=False)
+        if len(codes):
+            starts = np.flatnonzero(np.r_[True, codes[1:] != codes[:-1]])
+            ends = np.r_[starts[1:], len(codes)] - 1
+            days = weighings["weighed_on"].to_numpy()
+            grams = weighings["weight"].to_numpy()
+            span = (days[ends] - days[starts]) / np.timedelta64(1, "D")
+            growth = pd.DataFrame({
+                "barcode": uniques[codes[starts]],
+                "weighings": ends - starts + 1,
+                "first_weight": grams[starts],
+                "last_weight": grams[ends],
+                "last_weighed_on": days[ends],
+                "adg": np.where(span > 0, (grams[ends] - grams[starts]) / np.where(span > 0, span, 1), np.nan),
+            })
+            piglets = piglets.merge(growth, on="barcode", how="left")
+        else:
+            for column in ["weighings", "first_weight", "last_weight", "last_weighed_on", "adg"]:
+                piglets[column] = np.nan
+        piglets["age_days"] = (pd.Timestamp.today().normalize() - piglets["birth_date"]).dt.days
+
+        dims = piglets.set_index("barcode")[DIMENSIONS + ["birth_week"]]
+        weighings = weighings.join(dims, on="barcode", how="inner")
+        weighings["week"] = weighings["weighed_on"].dt.to_period("W").dt.start_time
+        weighings["age_days"] = (weighings["weighed_on"] - weighings["birth_week"]).dt.days
+        self.piglets = piglets
+        self.weighings = weighings.reset_index(drop=True)
+        self.version += 1
+        self.cache.clear()
+
+    # -----------------------------
+    # Parquet Store
+    # -----------------------------
+    # Optional: with pyarrow installed the raw columns are saved as Parquet so
+    # a restart only pulls the changes since the last save from SQLite. Rows
+    # are tagged with their source file and the state holds each source's
+    # cursors.
+    def _parquet_ok(self):
+        if not self.store_dir:
+            return False
+        try:
+            lazy_import("pyarrow")
+            return True
+        except ImportError:
+            return False
+
+    def save(self):
+        self.saved_at = time.monotonic()
+        if not self._parquet_ok():
+            return False
+        with self.lock:
+            sources = self._sources()
+            os.makedirs(self.store_dir, exist_ok=True)
+            pd.concat([source.raw_piglets.reset_index().rename(columns={"index": "barcode"}).assign(source=source.name)
+                       for source in sources], ignore_index=True).to_parquet(
+                os.path.join(self.store_dir, "piglets.parquet.tmp"), index=False)
+            pd.concat([source.raw_weighings.assign(source=source.name) for source in sources],
+                      ignore_index=True).to_parquet(os.path.join(self.store_dir, "weighings.parquet.tmp"), index=False)
+            for name in ("piglets", "weighings"):
+                os.replace(os.path.join(self.store_dir, f"{name}.parquet.tmp"),
+                           os.path.join(self.store_dir, f"{name}.parquet"))
+            with open(os.path.join(self.store_dir, "state.json"), "w") as f:
+                json.dump({"db_path": os.path.abspath(self.db_path),
+                           "sources": {source.name: [source.herd_version, source.weight_rowid] for source in sources}},
+                          f)
+        return True
+
+    # A store saved before per-source cursors holds the one source of a
+    # single-file database
+    def _load(self):
+        state_path = os.path.join(self.store_dir or "", "state.json")
+        if not self._parquet_ok() or not os.path.exists(state_path):
+            return
+        with open(state_path) as f:
+            state = json.load(f)
+        if state.get("db_path") != os.path.abspath(self.db_path):
+            return
+        piglets = pd.read_parquet(os.path.join(self.store_dir, "piglets.parquet"))
+        weighings = pd.read_parquet(os.path.join(self.store_dir, "weighings.parquet"))
+        cursors = state.get("sources")
+        if cursors is None:
+            name = os.path.basename(self.db_path)
+            cursors = {name: [state["herd_version"], state["weight_rowid"]]}
+            piglets, weighings = piglets.assign(source=name), weighings.assign(source=name)
+        for source in self._sources():
+            if source.name not in cursors:
+                continue
+            source.raw_piglets = piglets[piglets["source"] == source.name].drop(columns="source").set_index("barcode")
+            source.raw_weighings = weighings[weighings["source"] == source.name].drop(columns="source") \
+                .reset_index(drop=True)
+            source.herd_version, source.weight_rowid = cursors[source.name]
+
+    # -----------------------------
+    # Query API
+    # -----------------------------
+    def _cached(self, key, compute):
+        self.refresh()
+        with self.lock:
+            key = (self.version,) + key
+            if key in self.cache:
+                self.cache.move_to_end(key)
+                return self.cache[key]
+            result = compute()
+            self.cache[key] = result
+            if len(self.cache) > CACHE_ENTRIES:
+                self.cache.popitem(last=False)
+            return result
+
+    def _frame(self, source, filters):
+        frame = {"piglets": self.piglets, "weighings": self.weighings}.get(source)
+        if frame is None:
+            raise ValueError(f"Unknown source {source!r}; use 'piglets' or 'weighings'")
+        for column, value in (filters or {}).items():
+            values = value if isinstance(value, (list, tuple, set)) else [value]
+            frame = frame[frame[column].isin(values)]
+        return frame
+
+    # group_by: columns of the source; aggregates: {output: (column, func)}.
+    #   query("piglets", ["breed", "location", "birth_week"], {"adg": ("adg", "mean")})
+    def query(self, source, group_by=(), aggregates=None, filters=None):
+        aggregates = aggregates or {"pigs": ("barcode", "count")}
+        for column, func in aggregates.values():
+            if func not in AGGREGATES:
+                raise ValueError(f"Unknown aggregate {func!r}")
+        key = ("query", source, tuple(group_by), tuple(sorted(aggregates.items())),
+               tuple(sorted((k, str(v)) for k, v in (filters or {}).items())))
+
+        def compute():
+            frame = self._frame(source, filters)
+            if not group_by:
+                return pd.DataFrame({name: [frame[column].agg(func)] for name, (column, func) in aggregates.items()})
+            grouped = frame.groupby(list(group_by), observed=True, dropna=False)
+            return grouped.agg(**{name: (column, func) for name, (column, func) in aggregates.items()}).reset_index()
+        return self._cached(key, compute)
+
+    # Window query over weighings: the per-period aggregate of `column` for each
+    # group, with a rolling mean over the last `window` periods of that group
+    def trend(self, column="weight", group_by=None, freq="W", func="mean", window=4, filters=None):
+        if func not in AGGREGATES:
+            raise ValueError(f"Unknown aggregate {func!r}")
+        key = ("trend", column, group_by, freq, func, window,
+               tuple(sorted((k, str(v)) for k, v in (filters or {}).items())))
+
+        def compute():
+            frame = self._frame("weighings", filters)
+            period = frame["weighed_on"].dt.to_period(freq).dt.start_time.rename("period")
+            keys = [period] + ([frame[group_by]] if group_by else [])
+            series = frame.groupby(keys, observed=True)[column].agg(func).rename(column).reset_index()
+            series = series.sort_values((group_by and [group_by] or []) + ["period"])
+            rolling = series.groupby(group_by, observed=True)[column] if group_by else series[column]
+            series[f"{column}_rolling"] = rolling.transform(lambda s: s.rolling(window, min_periods=1).mean()) \
+                if group_by else rolling.rolling(window, min_periods=1).mean()
+            return series.reset_index(drop=True)
+        return self._cached(key, compute)
+
+    def dimensions(self, column):
+        return self._cached(("dimensions", column), lambda: sorted(self.piglets[column].dropna().unique().tolist()))
+
+_engines = {}
+_engines_lock = threading.Lock()
+
+def analytics_engine(db_path=DB_PATH):
+    with _engines_lock:
+        if db_path not in _engines:
+            _engines[db_path] = AnalyticsEngine(db_path)
+        return _engines[db_path]
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Columnar herd analytics")
+    parser.add_argument("--db", default=DB_PATH)
+    parser.add_argument("--group-by", default="breed,location,birth_week")
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    engine = AnalyticsEngine(args.db)
+    loaded = time.perf_counter() - start
+    start = time.perf_counter()
+    result = engine.query("piglets", args.group_by.split(","), {"pigs": ("barcode", "count"), "adg": ("adg", "mean")})
+    print(result.sort_values("pigs", ascending=False).head(20).to_string(index=False))
+    print(f"{len(engine.piglets)} pigs, {len(engine.weighings)} weighings; load {loaded:.2f}s, "
+          f"query {1000 * (time.perf_counter() - start):.1f} ms")
+    if engine.save():
+        print(f"Saved Parquet store to {engine.store_dir}")
@@ -0,0 +1,545 @@
+import gzip
+import hashlib
+import json
+import math
+import os
+import re
+import sqlite3
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse, parse_qs
+
+import metrics
+from changes import gender_of, herd_version, install_changes
+from events import event_recorder
+from growth import install_growth
+from piglet_db import (DB_PATH, PIGLET_TABLES, _reader, add_piglet, alert_shards, barcode_index, fan_out, herd_shard,
+                       herd_shards, init_alerts_table, is_sharded, move_piglet, piglet_shard, piglet_table)
+from reports import PERIODS, latest_report
+from resources import lazy_import
+
+# -----------------------------
+# Settings
+# -----------------------------
+# Compact read/write API for handheld scanners and field devices:
+#   GET  /api/herd?since=<version>&fields=barcode,weight&limit=2000   herd delta
+#   GET  /api/piglet/<barcode>                                        one record
+#   GET  /api/alerts?states=open,acknowledged&since=<epoch>           alert delta
+#   GET  /api/report?period=daily                                     latest rendered report
+#   POST /api/scans      {"scans": [...]}                             scan upload
+#   POST /api/batch      {"requests": [{"op": "herd", ...}, ...]}     several of the above
+# Bodies are JSON or msgpack (Content-Type / Accept), optionally gzip-encoded.
+# On sharded storage (see piglet_db) the herd version is a token naming each
+# herd shard's own HerdChanges version, "barn-1:120,barn-2:87"; devices store
+# and send back whatever version they were given.
+API_PORT = int(os.environ.get("PIGLYTICS_API_PORT", "8095"))
+API_TOKEN = os.environ.get("PIGLYTICS_API_TOKEN")   # when set, requests need "Authorization: Bearer <token>"
+HERD_COLUMNS = ["barcode", "gender", "birth_date", "breed", "weight", "health_status", "mother_id", "father_id",
+                "location", "notes"]
+SCAN_FIELDS = ["weight", "health_status", "location", "notes"]
+NEW_PIGLET_FIELDS = ["birth_date", "breed", "mother_id", "father_id"]
+DEFAULT_LIMIT = 2000
+MAX_LIMIT = 20000
+GZIP_MIN_BYTES = 512
+MAX_BODY_BYTES = 8 * 1024 * 1024
+
+api_requests = metrics.counter("piglytics_api_requests_total", "API requests handled")
+api_bytes_sent = metrics.counter("piglytics_api_bytes_sent_total", "API response bytes after compression")
+
+# -----------------------------
+# Schema
+# -----------------------------
+# HerdChanges and Scans live in changes.py, shared with the analytics engine
+_installed = set()
+
+# Idempotent; after the first call per process it is a set lookup (per herd
+# shard in sharded storage, so a barn shard added since is picked up)
+def install_api(db_path=DB_PATH):
+    if db_path not in _installed:
+        init_alerts_table(db_path)
+        _installed.add(db_path)
+    install_growth(db_path)
+    install_changes(db_path)
+
+# -----------------------------
+# Operations
+# -----------------------------
+# Each takes the request's Connections and returns (status, body, etag). They
+# are shared by the GET/POST routes and by /api/batch, so a batch costs one
+# round trip and one connection per database file it touches.
+class ApiError(Exception):
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+
+# Connections opened for one request, one per database file: db() is the
+# database itself, db(path) one of its shards
+class Connections:
+    def __init__(self, db_path):
+        self.db_path = db_path
+        self.opened = {}
+
+    def __call__(self, path=None):
+        path = path or self.db_path
+        if path not in self.opened:
+            self.opened[path] = sqlite3.connect(path, timeout=10)
+        return self.opened[path]
+
+    def close(self):
+        for conn in self.opened.values():
+            conn.close()
+        self.opened.clear()
+
+def _fields(requested):
+    if not requested:
+        return HERD_COLUMNS
+    fields = requested.split(",") if isinstance(requested, str) else list(requested)
+    unknown = set(fields) - set(HERD_COLUMNS)
+    if unknown:
+        raise ApiError(400, f"Unknown fields: {', '.join(sorted(unknown))}")
+    return ["barcode"] + [f for f in fields if f != "barcode"]
+
+# Rows changed after `since`, oldest change first. The response's version is
+# the next `since`; "more" means the limit cut the delta short.
+def op_herd(db, params):
+    limit = min(max(int(params.get("limit") or DEFAULT_LIMIT), 1), MAX_LIMIT)
+    fields = _fields(params.get("fields"))
+    if is_sharded(db.db_path):
+        return _sharded_herd(db.db_path, params.get("since"), limit, fields)
+    conn = db()
+    rows, deleted, upper, current = _herd_delta(conn, int(params.get("since") or 0), limit, fields)
+    body = {"version": upper, "more": upper < current, "columns": fields,
+            "rows": [list(row[1:]) for row in rows], "deleted": deleted}
+    return 200, body, f'W/"herd-{current}"'
+
+def _herd_delta(conn, since, limit, fields):
+    current = herd_version(conn)
+    upper = conn.execute("SELECT version FROM HerdChanges WHERE version > ? ORDER BY version LIMIT 1 OFFSET ?",
+                         (since, limit - 1)).fetchone()
+    upper = upper[0] if upper else current
+    columns = ", ".join("c.gender" if f == "gender" else f"t.{f}" for f in fields)
+    rows = []
+    for table in PIGLET_TABLES:
+        rows += conn.execute(f"""
+        SELECT c.version, {columns} FROM HerdChanges c JOIN {table} t ON t.barcode = c.barcode
+        WHERE c.version > ? AND c.version <= ? AND c.deleted = 0""", (since, upper)).fetchall()
+    rows.sort(key=lambda row: row[0])
+    deleted = [barcode for (barcode,) in conn.execute(
+        "SELECT barcode FROM HerdChanges WHERE version > ? AND version <= ? AND deleted = 1", (since, upper))]
+    return rows, deleted, upper, current
+
+def _shard_name(path):
+    return os.path.basename(path)[len("herd-"):-len(".db")]
+
+# "barn-1:120,barn-2:87" -> {"barn-1": 120, "barn-2": 87}. A plain version
+# from before the database was sharded (or none) starts every shard over.
+def _shard_versions(since):
+    versions = {}
+    for part in str(since or "").split(","):
+        name, _, version = part.rpartition(":")
+        if name:
+            versions[name] = int(version)
+    return versions
+
+def _herd_token(versions):
+    return ",".join(f"{name}:{version}" for name, version in sorted(versions.items()))
+
+# Each herd shard's delta after its own version, with the limit shared out so
+# a page stays about as large as on one file. A pig moved between barns is a
+# tombstone in the shard it left and a new row in the one it joined; a
+# tombstone is dropped when the BarcodeIndex places the pig in another shard,
+# so a device never deletes a pig that only moved.
+def _sharded_herd(db_path, since, limit, fields):
+    install_changes(db_path)
+    versions = _shard_versions(since)
+    paths = herd_shards(db_path)
+    share = -(-limit // max(len(paths), 1))
+    deltas = fan_out(lambda path: _herd_delta(_reader(path), versions.get(_shard_name(path), 0), share, fields),
+                     paths)
+    rows, deleted, uppers, currents = [], [], {}, {}
+    for path, (shard_rows, shard_deleted, upper, current) in zip(paths, deltas):
+        name = _shard_name(path)
+        rows += [list(row[1:]) for row in shard_rows]
+        deleted += [(barcode, os.path.basename(path)) for barcode in shard_deleted]
+        uppers[name], currents[name] = upper, current
+    index = _reader(barcode_index(db_path))
+    moved = set()
+    for start in range(0, len(deleted), 500):
+        chunk = deleted[start:start + 500]
+        placed = dict(index.execute(f"SELECT barcode, shard FROM BarcodeIndex WHERE barcode IN "
+                                    f"({', '.join('?' * len(chunk))})", [barcode for barcode, _ in chunk]).fetchall())
+        moved |= {(barcode, shard) for barcode, shard in chunk if placed.get(barcode, shard) != shard}
+    body = {"version": _herd_token(uppers), "more": any(uppers[name] < currents[name] for name in uppers),
+            "columns": fields, "rows": rows, "deleted": [barcode for barcode, shard in deleted
+                                                        if (barcode, shard) not in moved]}
+    return 200, body, f'W/"herd-{_herd_token(currents)}"'
+
+def _current_version(db):
+    if not is_sharded(db.db_path):
+        return herd_version(db())
+    # A move may just have created a barn's shard
+    install_changes(db.db_path)
+    return _herd_token({_shard_name(path): herd_version(_reader(path)) for path in herd_shards(db.db_path)})
+
+def op_piglet(db, params):
+    barcode = params.get("barcode")
+    path = db.db_path
+    if is_sharded(path):
+        path = piglet_shard(barcode, db.db_path)[1]
+        if path is None:
+            raise ApiError(404, f"No piglet with barcode {barcode}")
+    conn = db(path)
+    change = conn.execute("SELECT version, gender, deleted FROM HerdChanges WHERE barcode = ?", (barcode,)).fetchone()
+    if change is None or change[2]:
+        raise ApiError(404, f"No piglet with barcode {barcode}")
+    table = piglet_table(change[1])
+    columns = [c for c in HERD_COLUMNS if c != "gender"]
+    row = conn.execute(f"SELECT {', '.join(columns)} FROM {table} WHERE barcode = ?", (barcode,)).fetchone()
+    record = dict(zip(columns, row), gender=change[1])
+    record["version"] = change[0]
+    # Shard versions are independent, so the etag names the shard
+    shard = f"{_shard_name(path)}-" if path != db.db_path else ""
+    return 200, record, f'W/"piglet-{shard}{change[0]}"'
+
+# Alerts whose state changed after `since` (epoch seconds); "now" is the next
+# since. `states` filters a full pull (since=0) only: a delta carries every
+# alert that changed, resolved ones included, so a device can drop them.
+def op_alerts(db, params):
+    states = params.get("states") or "open,acknowledged"
+    states = states.split(",") if isinstance(states, str) else list(states)
+    since = float(params.get("since") or 0)
+    now = time.time()
+    columns = ["barcode", "table_name", "state", "last_alerted_at", "alert_count", "acknowledged_at", "resolved_at"]
+    where, args = "MAX(IFNULL(last_alerted_at, 0), IFNULL(acknowledged_at, 0), IFNULL(resolved_at, 0)) > ?", [since]
+    if not since:
+        where += f" AND state IN ({', '.join('?' for _ in states)})"
+        args += states
+    rows = []
+    # One alert shard each in sharded storage, merged newest first
+    for path in alert_shards(db.db_path):
+        rows += db(path).execute(f"""
+        SELECT {', '.join(columns)} FROM AlertsSent
+        WHERE {where}
+        ORDER BY last_alerted_at DESC""", args).fetchall()
+    rows.sort(key=lambda row: row[3] or 0, reverse=True)
+    body = {"now": now, "columns": columns, "rows": [list(row) for row in rows]}
+    digest = hashlib.blake2b(json.dumps(body["rows"]).encode(), digest_size=8).hexdigest()
+    return 200, body, f'W/"alerts-{digest}"'
+
+# Returns why a scan can't be applied, or None. Checked before anything is
+# written, so one malformed scan is reported "invalid" without failing the
+# rest of its upload.
+def _scan_problem(scan):
+    if not isinstance(scan, dict):
+        return "not an object"
+    if not isinstance(scan.get("scan_id"), str) or not scan["scan_id"]:
+        return "missing scan_id"
+    if not isinstance(scan.get("barcode"), str) or not scan["barcode"]:
+        return "missing barcode"
+    scanned_at = scan.get("scanned_at")
+    if scanned_at is not None and (isinstance(scanned_at, bool) or not isinstance(scanned_at, (int, float))
+                                   or not math.isfinite(scanned_at)):
+        return "scanned_at must be epoch seconds"
+    gender = scan.get("gender")
+    if gender is not None and (not isinstance(gender, str) or gender.lower() not in ("male", "female")):
+        return "gender must be male or female"
+    for field in SCAN_FIELDS + NEW_PIGLET_FIELDS:
+        if not isinstance(scan.get(field), (str, int, float, type(None))):
+            return f"{field} must be a string or number"
+    return None
+
+def _invalid(scan, problem):
+    scan_id = scan.get("scan_id") if isinstance(scan, dict) else None
+    return {"scan_id": scan_id if isinstance(scan_id, str) else None, "status": "invalid", "error": problem}
+
+# Applies uploaded scans in one transaction. Every scan is journalled under its
+# scan_id, so a retried upload reports "duplicate" instead of applying twice.
+# A scan older than the newest one already applied to the same pig is kept in
+# the journal (and its weighing in WeightHistory) but does not overwrite the record.
+def apply_scans(conn, scans, device=None, now=None):
+    now = time.time() if now is None else now
+    results = []
+    for scan in scans:
+        problem = _scan_problem(scan)
+        if problem is not None:
+            results.append(_invalid(scan, problem))
+            continue
+        if conn.execute("SELECT 1 FROM Scans WHERE scan_id = ?", (scan["scan_id"],)).fetchone():
+            results.append({"scan_id": scan["scan_id"], "status": "duplicate"})
+            continue
+        change = conn.execute("SELECT gender, deleted FROM HerdChanges WHERE barcode = ?",
+                              (scan["barcode"],)).fetchone()
+        results.append(_apply_scan(conn, scan, device, now, change[0] if change and not change[1] else None))
+    return results
+
+# One valid, new scan against the database or shard holding the pig; gender
+# is the pig's, or None for a barcode not in the herd. A status passed in was
+# decided by the caller: "created" for a pig it added from this scan, or
+# "unknown_barcode" for one it could not place.
+def _apply_scan(conn, scan, device, now, gender, status=None):
+    scan_id, barcode = scan["scan_id"], scan["barcode"]
+    scanned_at = float(scan.get("scanned_at") or now)
+    fields = {f: scan[f] for f in SCAN_FIELDS if scan.get(f) is not None}
+    if status is None and gender is None:
+        if scan.get("gender"):
+            values = dict(fields, **{f: scan.get(f) for f in NEW_PIGLET_FIELDS}, barcode=barcode)
+            conn.execute(f"INSERT INTO {piglet_table(scan['gender'])} ({', '.join(values)}) "
+                         f"VALUES ({', '.join('?' for _ in values)})", list(values.values()))
+            status = "created"
+        else:
+            status = "unknown_barcode"
+    elif status is None:
+        newest = conn.execute("SELECT MAX(scanned_at) FROM Scans WHERE barcode = ? AND status IN ('applied', 'created')",
+                              (barcode,)).fetchone()[0]
+        if newest is not None and scanned_at < newest:
+            status = "stale"
+        else:
+            if fields:
+                conn.execute(f"UPDATE {piglet_table(gender)} SET {', '.join(f'{f} = ?' for f in fields)} "
+                             f"WHERE barcode = ?", [*fields.values(), barcode])
+            status = "applied"
+    if "weight" in fields and status != "unknown_barcode":
+        weighed_on = time.strftime("%Y-%m-%d", time.localtime(scanned_at))
+        verb = "INSERT OR IGNORE" if status == "stale" else "INSERT OR REPLACE"
+        conn.execute(f"{verb} INTO WeightHistory (barcode, weighed_on, weight) VALUES (?, ?, ?)",
+                     (barcode, weighed_on, fields["weight"]))
+    conn.execute("INSERT INTO Scans (scan_id, barcode, scanned_at, device, status, payload, received_at) "
+                 "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                 (scan_id, barcode, scanned_at, device, status, json.dumps(scan, separators=(",", ":")), now))
+    return {"scan_id": scan_id, "status": status}
+
+# Sharded storage: each scan commits on its own pig's shard. Scan ids already
+# journalled anywhere are found in one pass over the shards. A new pig is
+# added through add_piglet, so it takes its id from the BarcodeIndex, and a
+# scan moving a pig to another barn carries it there with move_piglet.
+# Scans of unknown barcodes are journalled in the unassigned shard.
+def apply_sharded_scans(db, scans, device=None, now=None):
+    now = time.time() if now is None else now
+    db_path = db.db_path
+    problems = [_scan_problem(scan) for scan in scans]
+    scan_ids = [scan["scan_id"] for scan, problem in zip(scans, problems) if problem is None]
+
+    def journalled(path):
+        conn = _reader(path)
+        found = set()
+        for start in range(0, len(scan_ids), 500):
+            chunk = scan_ids[start:start + 500]
+            found |= {scan_id for (scan_id,) in conn.execute(
+                f"SELECT scan_id FROM Scans WHERE scan_id IN ({', '.join('?' * len(chunk))})", chunk)}
+        return found
+
+    install_api(db_path)
+    seen = set().union(*fan_out(journalled, herd_shards(db_path))) if scan_ids else set()
+    results = []
+    for scan, problem in zip(scans, problems):
+        if problem is not None:
+            results.append(_invalid(scan, problem))
+            continue
+        if scan["scan_id"] in seen:
+            results.append({"scan_id": scan["scan_id"], "status": "duplicate"})
+            continue
+        seen.add(scan["scan_id"])
+        barcode = scan["barcode"]
+        table, path = piglet_shard(barcode, db_path)
+        status = None
+        if table is None and scan.get("gender"):
+            added = add_piglet(scan["gender"], barcode, *(scan.get(f) for f in ("birth_date", "breed", "weight",
+                                 "health_status", "mother_id", "father_id", "location", "notes")), db_path=db_path)
+            # False: another writer added the barcode first
+            table, path = piglet_shard(barcode, db_path)
+            status = "created" if added else None
+        if table is None:
+            status = "unknown_barcode"
+        path = path or herd_shard(db_path, None)
+        install_api(path)
+        conn = db(path)
+        with conn:
+            result = _apply_scan(conn, scan, device, now, gender_of(table) if table else None, status)
+        results.append(result)
+        location = scan.get("location")
+        if result["status"] == "applied" and location is not None and herd_shard(db_path, location) != path:
+            move_piglet(barcode, location, db_path)
+    return results
+
+def op_scans(db, params):
+    scans = params.get("scans")
+    if not isinstance(scans, list):
+        raise ApiError(400, "Expected a list under 'scans'")
+    events = event_recorder()
+    if events is not None:
+        for scan in scans:
+            events.scan(scan)
+        events.flush()
+    if is_sharded(db.db_path):
+        results = apply_sharded_scans(db, scans, params.get("device"))
+    else:
+        with db():
+            results = apply_scans(db(), scans, params.get("device"))
+    return 200, {"results": results, "version": _current_version(db)}, None
+
+# Serves what the reports worker last rendered; nothing is computed here
+def op_report(db, params):
+    period = params.get("period") or "daily"
+    if period not in PERIODS:
+        raise ApiError(400, f"Unknown period {period!r}")
+    report, _ = latest_report(period)
+    if report is None:
+        raise ApiError(404, f"No {period} report rendered yet")
+    return 200, report, f'W/"report-{period}-{report["start"]}-{report["data_version"]}"'
+
+OPS = {"herd": op_herd, "piglet": op_piglet, "alerts": op_alerts, "scans": op_scans, "report": op_report}
+
+def op_batch(db, params):
+    responses = []
+    for request in params.get("requests") or []:
+        op = OPS.get(request.get("op"))
+        try:
+            if op is None:
+                raise ApiError(400, f"Unknown op {request.get('op')!r}")
+            status, body, etag = op(db, request)
+        except ApiError as e:
+            status, body, etag = e.status, {"error": str(e)}, None
+        except (ValueError, TypeError, KeyError) as e:
+            status, body, etag = 400, {"error": str(e)}, None
+        # Per-request conditional: the device sends back the etag it holds
+        if etag and request.get("etag") == etag:
+            status, body = 304, None
+        responses.append({"status": status, "etag": etag, "body": body})
+    return 200, {"responses": responses}, None
+
+# -----------------------------
+# Payload Encoding
+# -----------------------------
+def _msgpack():
+    try:
+        return lazy_import("msgpack")
+    except ImportError:
+        return None
+
+def decode_payload(data, content_type, content_encoding):
+    if content_encoding == "gzip":
+        data = gzip.decompress(data)
+    if not data:
+        return {}
+    if "msgpack" in (content_type or ""):
+        msgpack = _msgpack()
+        if msgpack is None:
+            raise ApiError(415, "msgpack is not installed on this server")
+        return msgpack.unpackb(data)
+    return json.loads(data)
+
+# Returns (bytes, content type, content encoding or None)
+def encode_payload(payload, accept, accept_encoding):
+    msgpack = _msgpack() if "msgpack" in (accept or "") else None
+    if msgpack is not None:
+        data, content_type = msgpack.packb(payload), "application/msgpack"
+    else:
+        data, content_type = json.dumps(payload, separators=(",", ":")).encode("utf-8"), "application/json"
+    if "gzip" in (accept_encoding or "") and len(data) >= GZIP_MIN_BYTES:
+        return gzip.compress(data, compresslevel=6), content_type, "gzip"
+    return data, content_type, None
+
+# -----------------------------
+# HTTP Endpoint
+# -----------------------------
+class _ApiHandler(BaseHTTPRequestHandler):
+    db_path = DB_PATH
+
+    def _route(self, method):
+        url = urlparse(self.path)
+        if method == "GET":
+            params = {k: v[-1] for k, v in parse_qs(url.query).items()}
+            match = re.fullmatch(r"/api/piglet/([^/]+)", url.path)
+            if match:
+                return "piglet", dict(params, barcode=match.group(1))
+            if url.path in ("/api/herd", "/api/alerts", "/api/report"):
+                return url.path.rsplit("/", 1)[1], params
+        elif url.path in ("/api/scans", "/api/batch"):
+            length = int(self.headers.get("Content-Length") or 0)
+            if length > MAX_BODY_BYTES:
+                raise ApiError(413, "Request body too large")
+            params = decode_payload(self.rfile.read(length), self.headers.get("Content-Type"),
+                                    self.headers.get("Content-Encoding"))
+            if not isinstance(params, dict):
+                raise ApiError(400, "Expected an object")
+            return url.path.rsplit("/", 1)[1], params
+        raise ApiError(404, "Not found")
+
+    def _handle(self, method):
+        etag = None
+        try:
+            if API_TOKEN and self.headers.get("Authorization") != f"Bearer {API_TOKEN}":
+                raise ApiError(401, "Missing or invalid token")
+            name, params = self._route(method)
+            api_requests.inc(op=name)
+            db = Connections(self.db_path)
+            try:
+                op = op_batch if name == "batch" else OPS[name]
+                status, body, etag = op(db, params)
+            finally:
+                db.close()
+        except ApiError as e:
+            status, body = e.status, {"error": str(e)}
+        except (ValueError, TypeError, KeyError) as e:
+            status, body = 400, {"error": str(e)}
+        except Exception as e:
+            # Answer rather than drop the connection, so a device retries
+            print(f"API {method} {self.path} failed: {e!r}", flush=True)
+            status, body, etag = 500, {"error": "Internal error"}, None
+        if etag and etag in (self.headers.get("If-None-Match") or ""):
+            self.send_response(304)
+            self.send_header("ETag", etag)
+            self.end_headers()
+            return
+        data, content_type, content_encoding = encode_payload(body, self.headers.get("Accept"),
+                                                              self.headers.get("Accept-Encoding"))
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(data)))
+        self.send_header("Vary", "Accept, Accept-Encoding")
+        if content_encoding:
+            self.send_header("Content-Encoding", content_encoding)
+        if etag:
+            self.send_header("ETag", etag)
+            self.send_header("Cache-Control", "no-cache")
+        self.end_headers()
+        self.wfile.write(data)
+        api_bytes_sent.inc(len(data))
+
+    def do_GET(self):
+        self._handle("GET")
+
+    def do_POST(self):
+        self._handle("POST")
+
+    def log_message(self, *args):
+        pass
+
+class _ApiServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+_server = None
+_server_lock = threading.Lock()
+
+# Process-wide and idempotent, like mjpeg_stream.start_stream_server
+def start_api_server(port=API_PORT, host="0.0.0.0", db_path=DB_PATH):
+    global _server
+    with _server_lock:
+        if _server is None:
+            install_api(db_path)
+            handler = type("ApiHandler", (_ApiHandler,), {"db_path": db_path})
+            _server = _ApiServer((host, port), handler)
+            threading.Thread(target=_server.serve_forever, name="piglytics-api", daemon=True).start()
+        return _server
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Serve the Piglytics field-device API")
+    parser.add_argument("--db", default=DB_PATH)
+    parser.add_argument("--port", type=int, default=API_PORT)
+    args = parser.parse_args()
+    start_api_server(args.port, db_path=args.db)
+    print(f"API on :{args.port}/api", flush=True)
+    threading.Event().wait()
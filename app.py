@@ -2,6 +2,7 @@ import streamlit as st
 import pandas as pd
 import plotly.express as px
 from datetime import datetime, timedelta
+from sensors import sensor_processor
 
 st.set_page_config(page_title="Piglet Monitoring Dashboard", layout="wide")
 
@@ -11,8 +12,11 @@ st.markdown(f"**Last Sync:** {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}")
 
 # ---------- Key Metrics ----------
 col1, col2, col3, col4 = st.columns(4)
-col1.metric("🌡️ Temperature", "28°C", delta="+1°C")
-col2.metric("💧 Humidity", "70%", delta="-2%")
+sensors = sensor_processor()
+for col, label, metric, unit in [(col1, "🌡️ Temperature", "temperature", "°C"), (col2, "💧 Humidity", "humidity", "%")]:
+    mean, rate = sensors.kpi(metric)
+    col.metric(label, "—" if mean is None else f"{mean:.1f}{unit}",
+               delta=None if rate is None else f"{rate:+.1f}{unit}/min")
 col3.metric("🐷 Piglets", "120", delta="+3")
 col4.metric("⚠️ Alerts", "3")
 
@@ -26,24 +30,20 @@ st.plotly_chart(fig_weight, use_container_width=True)
 
 # ---------- Environment Monitoring ----------
 st.subheader("Environment Monitoring")
-hours = [0, 6, 12, 18, 24]
-temp_values = [26, 27, 29, 30, 28]
-humidity_values = [65, 68, 70, 72, 70]
-env_df = pd.DataFrame({
-    "Hour": hours,
-    "Temperature (°C)": temp_values,
-    "Humidity (%)": humidity_values
-})
-fig_env = px.line(env_df, x="Hour", y=["Temperature (°C)", "Humidity (%)"], markers=True)
-st.plotly_chart(fig_env, use_container_width=True)
+env_df = pd.DataFrame(sensors.history(), columns=["Barn", "Metric", "Time", "Value"])
+if env_df.empty:
+    st.caption("No sensor readings yet.")
+else:
+    env_df["Time"] = pd.to_datetime(env_df["Time"], unit="s")
+    env_df["Series"] = "Barn " + env_df["Barn"] + " " + env_df["Metric"]
+    fig_env = px.line(env_df, x="Time", y="Value", color="Series")
+    st.plotly_chart(fig_env, use_container_width=True)
 
 # ---------- Alerts ----------
 st.subheader("Active Alerts")
-alerts = [
-    {"message": "Piglet #45 not feeding", "severity": "red"},
-    {"message": "Barn 2 overheating", "severity": "orange"},
-    {"message": "All others stable", "severity": "green"},
-]
+alerts = [{"message": "Piglet #45 not feeding", "severity": "red"}]
+alerts += [{"message": alert["message"], "severity": alert["severity"]} for alert in sensors.active_alerts()]
+alerts.append({"message": "All others stable", "severity": "green"})
 
 for alert in alerts:
     color = {"red": "#ff4c4c", "orange": "#ffb84c", "green": "#4caf50"}[alert["severity"]]
@@ -6,6 +6,7 @@ import qrcode
 from io import BytesIO
 from pyzbar.pyzbar import decode
 from PIL import Image
+from growth import install_growth, record_weight, get_forecasts, forecast_curve, TARGET_WEIGHT
 
 # -------------------------------
 # Page Configuration
@@ -24,6 +25,7 @@ if "pig_data" not in st.session_state:
     st.session_state.pig_data = pd.DataFrame(columns=["Pig_ID", "Date", "Weight"])
 
 data = st.session_state.pig_data
+install_growth()
 
 # -------------------------------
 # Sidebar: Add Pig / Weight Entry
@@ -64,6 +66,8 @@ if st.sidebar.button("Add Entry") and selected_pig_id is not None:
         "Weight": [entry_weight]
     })
     st.session_state.pig_data = pd.concat([st.session_state.pig_data, new_row], ignore_index=True)
+    # Persisted so the growth forecast picks the weighing up
+    record_weight(selected_pig_id, entry_date, entry_weight)
     st.sidebar.success(f"Entry added for Pig {selected_pig_id}.")
 
 # -------------------------------
@@ -86,6 +90,9 @@ for pig_id in unique_pigs:
 # Plot Weight Charts
 # -------------------------------
 st.header("📊 Pig Weight Charts")
+# Forecasts are fitted by the ingest worker (workers.py); new weighings show up
+# after its next refresh
+forecasts = get_forecasts().set_index("barcode")
 
 for pig_id in unique_pigs:
     pig_df = data[data["Pig_ID"] == pig_id]
@@ -97,4 +104,14 @@ for pig_id in unique_pigs:
             title=f"Weight of Pig {pig_id} Over Time",
             markers=True
         )
+        # Pigs registered in the herd tables get their fitted curve and market date
+        if pig_id in forecasts.index:
+            forecast = forecasts.loc[pig_id]
+            st.caption(f"Expected to reach {TARGET_WEIGHT:.0f} kg on {forecast['target_date'] or 'n/a'} "
+                       f"({forecast['model']} fit on {forecast['points']} weighings)")
+            target_date = pd.Timestamp(forecast["target_date"] or forecast["last_weighed_on"])
+            until_age = (target_date - pd.Timestamp(forecast["birth_date"])).days + 14
+            curve = forecast_curve(forecast, until_age)
+            fig.add_scatter(x=curve["Date"], y=curve["Weight"], mode="lines", name="Forecast",
+                            line=dict(dash="dash"))
         st.plotly_chart(fig, use_container_width=True, key=f"weight_chart_{pig_id}")
@@ -0,0 +1,227 @@
+import gzip
+import hashlib
+import json
+import os
+import re
+import shutil
+import sqlite3
+import time
+from datetime import datetime, timedelta, timezone
+
+from piglet_db import DB_PATH
+
+# -----------------------------
+# Settings
+# -----------------------------
+BACKUP_DIR = os.environ.get("PIGLYTICS_BACKUP_DIR", "backups")
+STEP_PAGES = 128          # pages copied per step; the source is only locked during a step
+STEP_SLEEP = 0.005        # pause between steps so writers get the lock
+MAX_RESTARTS = 5          # then copy the rest in one step
+KEEP_LAST = int(os.environ.get("PIGLYTICS_BACKUP_KEEP", "24"))
+KEEP_DAILY = int(os.environ.get("PIGLYTICS_BACKUP_KEEP_DAILY", "14"))
+NAME_PATTERN = re.compile(r"^(?P<stem>.+)-(?P<stamp>\d{8}T\d{6}Z)(?:-(?P<label>[A-Za-z0-9_-]+))?\.db\.gz$")
+
+# -----------------------------
+# Online Copy
+# -----------------------------
+# Uses the SQLite online backup API in small steps. Each step holds the source's
+# read lock only for STEP_PAGES pages, so dashboards and scanners keep writing
+# during a backup. A write from another connection makes SQLite restart the
+# copy; after MAX_RESTARTS it is redone as a single step. In WAL mode
+# (see enable_wal) that step is a plain read transaction and never blocks writers.
+class _TooManyRestarts(Exception):
+    pass
+
+def online_copy(db_path, dest_path, step_pages=STEP_PAGES, sleep=STEP_SLEEP):
+    stats = {"steps": 0, "restarts": 0, "pages": 0}
+    last_remaining = None
+
+    def progress(status, remaining, total):
+        nonlocal last_remaining
+        stats["steps"] += 1
+        stats["pages"] = total
+        if last_remaining is not None and remaining > last_remaining:
+            stats["restarts"] += 1
+            # Raising from the callback aborts the stepped copy
+            if stats["restarts"] > MAX_RESTARTS:
+                raise _TooManyRestarts()
+        last_remaining = remaining
+
+    source = sqlite3.connect(db_path, timeout=30)
+    target = sqlite3.connect(dest_path)
+    try:
+        start = time.perf_counter()
+        try:
+            source.backup(target, pages=step_pages, progress=progress, sleep=sleep)
+        except _TooManyRestarts:
+            source.backup(target, pages=-1)
+        stats["seconds"] = time.perf_counter() - start
+    finally:
+        target.close()
+        source.close()
+    return stats
+
+def enable_wal(db_path=DB_PATH):
+    conn = sqlite3.connect(db_path)
+    mode = conn.execute("PRAGMA journal_mode=WAL").fetchone()[0]
+    conn.close()
+    return mode
+
+def _sha256(path):
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+# -----------------------------
+# Snapshots
+# -----------------------------
+# backups/<db>-<UTC timestamp>[-label].db.gz with a .json manifest alongside.
+def list_snapshots(backup_dir=BACKUP_DIR, db_path=DB_PATH):
+    stem = os.path.splitext(os.path.basename(db_path))[0]
+    snapshots = []
+    if not os.path.isdir(backup_dir):
+        return snapshots
+    for name in os.listdir(backup_dir):
+        match = NAME_PATTERN.match(name)
+        if match and match.group("stem") == stem:
+            manifest_path = os.path.join(backup_dir, name[:-len(".db.gz")] + ".json")
+            manifest = {}
+            if os.path.exists(manifest_path):
+                with open(manifest_path) as f:
+                    manifest = json.load(f)
+            snapshots.append({"path": os.path.join(backup_dir, name), "stamp": match.group("stamp"),
+                              "label": match.group("label"), **manifest})
+    return sorted(snapshots, key=lambda s: s["stamp"])
+
+# Takes a point-in-time snapshot; returns its manifest, or None when the
+# database is unchanged since the last snapshot (unless force or a label is given)
+def snapshot(db_path=DB_PATH, backup_dir=BACKUP_DIR, label=None, force=False):
+    os.makedirs(backup_dir, exist_ok=True)
+    now = datetime.now(timezone.utc)
+    stem = os.path.splitext(os.path.basename(db_path))[0]
+    suffix = f"-{re.sub(r'[^A-Za-z0-9_-]', '_', label)}" if label else ""
+    # Names are per second: a second snapshot within the same second (the
+    # "pre-restore" of restoring a snapshot just taken, say) takes the next
+    # free second instead of overwriting the first
+    while os.path.exists(os.path.join(backup_dir, f"{stem}-{now:%Y%m%dT%H%M%SZ}{suffix}.db.gz")):
+        now += timedelta(seconds=1)
+    name = f"{stem}-{now:%Y%m%dT%H%M%SZ}{suffix}"
+    raw_path = os.path.join(backup_dir, f".{name}.db.tmp")
+    try:
+        stats = online_copy(db_path, raw_path)
+        check = sqlite3.connect(raw_path)
+        integrity = check.execute("PRAGMA quick_check").fetchone()[0]
+        check.close()
+        if integrity != "ok":
+            raise RuntimeError(f"snapshot failed integrity check: {integrity}")
+        sha256 = _sha256(raw_path)
+        previous = list_snapshots(backup_dir, db_path)
+        if previous and previous[-1].get("sha256") == sha256 and not (force or label):
+            return None
+        gz_path = os.path.join(backup_dir, f"{name}.db.gz")
+        with open(raw_path, "rb") as src, gzip.open(f"{gz_path}.tmp", "wb", compresslevel=6) as dst:
+            shutil.copyfileobj(src, dst, 1 << 20)
+        os.replace(f"{gz_path}.tmp", gz_path)
+        manifest = {"source": os.path.abspath(db_path), "created_at": now.isoformat(timespec="seconds"),
+                    "label": label, "sha256": sha256, "db_bytes": os.path.getsize(raw_path),
+                    "gz_bytes": os.path.getsize(gz_path), **stats}
+        with open(os.path.join(backup_dir, f"{name}.json"), "w") as f:
+            json.dump(manifest, f, indent=2)
+        manifest["path"] = gz_path
+        return manifest
+    finally:
+        if os.path.exists(raw_path):
+            os.remove(raw_path)
+
+# Keeps the newest KEEP_LAST snapshots, the newest one of each of the last
+# KEEP_DAILY days, and every labelled snapshot; returns deleted paths
+def rotate(backup_dir=BACKUP_DIR, db_path=DB_PATH, keep_last=KEEP_LAST, keep_daily=KEEP_DAILY):
+    snapshots = list_snapshots(backup_dir, db_path)
+    keep = {s["path"] for s in snapshots[-keep_last:]} if keep_last else set()
+    keep |= {s["path"] for s in snapshots if s["label"]}
+    daily = {}
+    for s in snapshots:
+        daily[s["stamp"][:8]] = s["path"]
+    keep |= set(list(daily.values())[-keep_daily:]) if keep_daily else set()
+    deleted = []
+    for s in snapshots:
+        if s["path"] not in keep:
+            os.remove(s["path"])
+            manifest_path = s["path"][:-len(".db.gz")] + ".json"
+            if os.path.exists(manifest_path):
+                os.remove(manifest_path)
+            deleted.append(s["path"])
+    return deleted
+
+def find_snapshot(ref, backup_dir=BACKUP_DIR, db_path=DB_PATH):
+    if os.path.exists(ref):
+        return ref
+    snapshots = list_snapshots(backup_dir, db_path)
+    if ref == "latest":
+        return snapshots[-1]["path"] if snapshots else None
+    matches = [s["path"] for s in snapshots if ref in (s["label"], s["stamp"])]
+    return matches[-1] if matches else None
+
+# Restores a snapshot into the live database through the backup API, so open
+# connections in other processes see the restored pages rather than a swapped
+# file. The current database is snapshotted as "pre-restore" first.
+def restore(ref, db_path=DB_PATH, backup_dir=BACKUP_DIR):
+    path = find_snapshot(ref, backup_dir, db_path)
+    if path is None:
+        raise FileNotFoundError(f"No snapshot matches {ref!r}")
+    if os.path.exists(db_path):
+        snapshot(db_path, backup_dir, label="pre-restore")
+    raw_path = f"{db_path}.restore.tmp"
+    try:
+        with gzip.open(path, "rb") as src, open(raw_path, "wb") as dst:
+            shutil.copyfileobj(src, dst, 1 << 20)
+        source = sqlite3.connect(raw_path)
+        integrity = source.execute("PRAGMA quick_check").fetchone()[0]
+        if integrity != "ok":
+            source.close()
+            raise RuntimeError(f"snapshot failed integrity check: {integrity}")
+        target = sqlite3.connect(db_path, timeout=30)
+        source.backup(target)
+        target.close()
+        source.close()
+    finally:
+        if os.path.exists(raw_path):
+            os.remove(raw_path)
+    return path
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Online backups of the Piglytics database")
+    parser.add_argument("--db", default=DB_PATH)
+    parser.add_argument("--dir", default=BACKUP_DIR)
+    commands = parser.add_subparsers(dest="command", required=True)
+    take = commands.add_parser("snapshot", help="Take a snapshot now and rotate old ones")
+    take.add_argument("--label")
+    take.add_argument("--force", action="store_true", help="Snapshot even if nothing changed")
+    commands.add_parser("list", help="List snapshots")
+    back = commands.add_parser("restore", help="Restore a snapshot (path, label, timestamp or 'latest')")
+    back.add_argument("ref")
+    commands.add_parser("enable-wal", help="Switch the database to WAL so backups never block writers")
+    args = parser.parse_args()
+
+    if args.command == "snapshot":
+        manifest = snapshot(args.db, args.dir, args.label, args.force)
+        if manifest is None:
+            print("Database unchanged since the last snapshot; nothing to do.")
+        else:
+            print(f"Wrote {manifest['path']} ({manifest['db_bytes'] / 1e6:.1f} MB -> {manifest['gz_bytes'] / 1e6:.1f} MB, "
+                  f"{manifest['seconds']:.2f}s, {manifest['restarts']} restarts)")
+        for path in rotate(args.dir, args.db):
+            print(f"Rotated out {path}")
+    elif args.command == "list":
+        for s in list_snapshots(args.dir, args.db):
+            print(f"{s['stamp']}  {s.get('label') or '':<12} {s.get('gz_bytes', 0) / 1e6:8.1f} MB  {s['path']}")
+    elif args.command == "restore":
+        start = time.perf_counter()
+        path = restore(args.ref, args.db, args.dir)
+        print(f"Restored {path} into {args.db} in {time.perf_counter() - start:.2f}s")
+    elif args.command == "enable-wal":
+        print(f"journal_mode={enable_wal(args.db)}")
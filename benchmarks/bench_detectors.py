@@ -0,0 +1,114 @@
+import argparse
+import json
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from detectors import UltralyticsDetector, OnnxDetector, onnx_path, read_clip
+
+# -----------------------------
+# Settings
+# -----------------------------
+MATCH_IOU = 0.5
+WARMUP_FRAMES = 3
+
+# -----------------------------
+# Parity
+# -----------------------------
+def iou(a, b):
+    ix = max(0, min(a[2], b[2]) - max(a[0], b[0]))
+    iy = max(0, min(a[3], b[3]) - max(a[1], b[1]))
+    inter = ix * iy
+    union = (a[2] - a[0]) * (a[3] - a[1]) + (b[2] - b[0]) * (b[3] - b[1]) - inter
+    return inter / union if union else 0.0
+
+# Greedy one-to-one matching of candidate boxes against the reference backend;
+# a match needs the same class and IoU >= MATCH_IOU.
+def match(reference, candidate):
+    used = set()
+    pairs = []
+    for ref in sorted(reference, key=lambda d: -d[5]):
+        best, best_iou = None, MATCH_IOU
+        for i, cand in enumerate(candidate):
+            if i in used or cand[4] != ref[4]:
+                continue
+            overlap = iou(ref, cand)
+            if overlap >= best_iou:
+                best, best_iou = i, overlap
+        if best is not None:
+            used.add(best)
+            pairs.append((ref, candidate[best], best_iou))
+    return pairs
+
+def parity(reference_runs, candidate_runs):
+    ref_total = sum(len(r) for r in reference_runs)
+    cand_total = sum(len(c) for c in candidate_runs)
+    pairs = [p for r, c in zip(reference_runs, candidate_runs) for p in match(r, c)]
+    return {
+        "reference_boxes": ref_total,
+        "candidate_boxes": cand_total,
+        "recall": len(pairs) / ref_total if ref_total else 1.0,
+        "precision": len(pairs) / cand_total if cand_total else 1.0,
+        "mean_iou": sum(p[2] for p in pairs) / len(pairs) if pairs else None,
+        "mean_conf_diff": sum(abs(p[0][5] - p[1][5]) for p in pairs) / len(pairs) if pairs else None,
+    }
+
+# -----------------------------
+# Latency
+# -----------------------------
+def run(detector, frames):
+    for frame in frames[:WARMUP_FRAMES]:
+        detector.detect(frame)
+    outputs, latencies = [], []
+    for frame in frames:
+        start = time.perf_counter()
+        outputs.append(detector.detect(frame))
+        latencies.append(time.perf_counter() - start)
+    latencies.sort()
+    return outputs, {
+        "frames": len(frames),
+        "fps": len(frames) / sum(latencies),
+        "latency_p50_ms": 1000 * latencies[len(latencies) // 2],
+        "latency_p95_ms": 1000 * latencies[int(len(latencies) * 0.95)],
+    }
+
+def sample_frames(clip, count):
+    if clip:
+        return read_clip(clip, limit=count)
+    from herd_generator import generate_frames
+    return [frame for frame, _ in generate_frames([f"SYN{i:011d}" for i in range(50)], count)]
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Check ONNX Runtime detector parity and latency against ultralytics")
+    parser.add_argument("--weights", default="yolov8n.pt")
+    parser.add_argument("--clip", help="Sample video; synthetic pen frames are used when omitted")
+    parser.add_argument("--frames", type=int, default=100)
+    parser.add_argument("--threads", type=int, default=0, help="ONNX Runtime intra-op threads (0 = default)")
+    parser.add_argument("--json", help="Write raw results to this file")
+    args = parser.parse_args()
+
+    frames = sample_frames(args.clip, args.frames)
+    backends = [("ultralytics", lambda: UltralyticsDetector(args.weights))]
+    for label, path in [("onnx_fp32", onnx_path(args.weights)), ("onnx_int8", onnx_path(args.weights, int8=True))]:
+        if os.path.exists(path):
+            backends.append((label, lambda path=path: OnnxDetector(path, threads=args.threads)))
+        else:
+            print(f"skipping {label}: {path} not found (python detectors.py --export {args.weights} --int8)")
+
+    results = {}
+    reference = None
+    for label, build in backends:
+        outputs, summary = run(build(), frames)
+        if reference is None:
+            reference = outputs
+        else:
+            summary.update(parity(reference, outputs))
+        results[label] = summary
+        line = f"{label:<12} {summary['fps']:7.1f} fps  p50 {summary['latency_p50_ms']:7.2f} ms  p95 {summary['latency_p95_ms']:7.2f} ms"
+        if "recall" in summary:
+            line += f"  recall {summary['recall']:.3f}  precision {summary['precision']:.3f}"
+        print(line)
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(results, f, indent=2)
@@ -0,0 +1,118 @@
+import argparse
+import json
+import multiprocessing as mp
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from shm_frames import SharedFrameRing
+
+# -----------------------------
+# Settings
+# -----------------------------
+SHAPES = {"480p": (480, 640, 3), "1080p": (1080, 1920, 3)}
+SLOTS = 8
+
+# -----------------------------
+# Queue + Pickle Transport
+# -----------------------------
+def _queue_producer(q, shape, count):
+    import numpy as np
+    frame = np.random.default_rng(0).integers(0, 255, size=shape, dtype=np.uint8)
+    for i in range(count):
+        frame[0, 0, 0] = i % 256
+        q.put((i, time.perf_counter(), frame))
+    q.put(None)
+
+def run_queue(shape, count):
+    ctx = mp.get_context("spawn")
+    q = ctx.Queue(maxsize=SLOTS)
+    producer = ctx.Process(target=_queue_producer, args=(q, shape, count))
+    producer.start()
+    latencies = []
+    first = None
+    while True:
+        item = q.get()
+        if item is None:
+            break
+        _, sent, frame = item
+        now = time.perf_counter()
+        first = first or now
+        latencies.append(now - sent)
+        int(frame[::64, ::64].sum())  # touch the frame like a consumer would
+    elapsed = time.perf_counter() - first
+    producer.join()
+    return elapsed, latencies
+
+# -----------------------------
+# Shared-Memory Transport
+# -----------------------------
+# The producer waits on the consumer's acknowledged sequence so no frame is
+# lapped; this measures transport cost, not frame dropping.
+def _shm_producer(name, acked, count):
+    import numpy as np
+    ring = SharedFrameRing(name)
+    frame = np.random.default_rng(0).integers(0, 255, size=ring.shape, dtype=np.uint8)
+    for i in range(count):
+        while i - acked.value >= ring.slots - 1:
+            time.sleep(0)
+        frame[0, 0, 0] = i % 256
+        ring.publish(frame, time.perf_counter())
+    ring.close()
+
+def run_shm(shape, count):
+    ctx = mp.get_context("spawn")
+    ring = SharedFrameRing(slots=SLOTS, shape=shape, create=True)
+    acked = ctx.Value("q", -1, lock=False)
+    producer = ctx.Process(target=_shm_producer, args=(ring.name, acked, count))
+    producer.start()
+    latencies = []
+    first = None
+    seq = -1
+    while seq < count - 1:
+        newer = ring.wait_newer(seq, timeout=5.0, poll=0)
+        if newer is None:
+            break
+        seq += 1  # consume every frame in order
+        frame, sent = ring.get(seq)
+        now = time.perf_counter()
+        first = first or now
+        latencies.append(now - sent)
+        int(frame[::64, ::64].sum())
+        acked.value = seq
+    elapsed = time.perf_counter() - first
+    producer.join()
+    ring.close()
+    return elapsed, latencies
+
+# -----------------------------
+# Report
+# -----------------------------
+def summarize(shape, count, elapsed, latencies):
+    latencies = sorted(latencies)
+    frame_mb = shape[0] * shape[1] * shape[2] / 1e6
+    return {
+        "frames": len(latencies),
+        "fps": len(latencies) / elapsed if elapsed else 0.0,
+        "mb_per_s": len(latencies) * frame_mb / elapsed if elapsed else 0.0,
+        "latency_p50_ms": 1000 * latencies[len(latencies) // 2],
+        "latency_p99_ms": 1000 * latencies[int(len(latencies) * 0.99)],
+    }
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compare queue+pickle and shared-memory frame transport")
+    parser.add_argument("--frames", type=int, default=500)
+    parser.add_argument("--json", help="Write raw results to this file")
+    args = parser.parse_args()
+
+    results = {}
+    for label, shape in SHAPES.items():
+        for transport, runner in [("queue_pickle", run_queue), ("shared_memory", run_shm)]:
+            elapsed, latencies = runner(shape, args.frames)
+            results[f"{label}/{transport}"] = summary = summarize(shape, args.frames, elapsed, latencies)
+            print(f"{label:>6} {transport:<14} {summary['fps']:8.0f} fps {summary['mb_per_s']:8.0f} MB/s "
+                  f"p50 {summary['latency_p50_ms']:6.2f} ms  p99 {summary['latency_p99_ms']:6.2f} ms")
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(results, f, indent=2)
@@ -0,0 +1,92 @@
+import argparse
+import ast
+import json
+import os
+import subprocess
+import sys
+
+# -----------------------------
+# Settings
+# -----------------------------
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DASHBOARDS = ["r10_dashboardStreamlit.py", "r3_dashboardStreamlit.py"]
+# Modules the dashboards used to import at the top level before they were deferred
+DEFERRED_IMPORTS = ["cv2", "pyzbar.pyzbar", "ultralytics", "twilio.rest", "numpy"]
+
+# -----------------------------
+# Helpers
+# -----------------------------
+def top_level_imports(path):
+    with open(path, encoding="utf-8") as f:
+        tree = ast.parse(f.read(), filename=path)
+    modules = []
+    for node in tree.body:
+        if isinstance(node, ast.Import):
+            modules.extend(alias.name for alias in node.names)
+        elif isinstance(node, ast.ImportFrom) and node.module:
+            modules.append(node.module)
+    return modules
+
+def time_imports(modules):
+    # Each measurement runs in a fresh interpreter so nothing is already cached
+    code = (
+        "import json, sys, time\n"
+        f"sys.path.insert(0, {ROOT!r})\n"
+        "timings = {}\n"
+        f"for name in {modules!r}:\n"
+        "    start = time.perf_counter()\n"
+        "    try:\n"
+        "        __import__(name)\n"
+        "        timings[name] = time.perf_counter() - start\n"
+        "    except Exception:\n"
+        "        timings[name] = None\n"
+        "print(json.dumps(timings))\n"
+    )
+    out = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True, check=True, cwd=ROOT)
+    return json.loads(out.stdout)
+
+def best_of(modules, repeat):
+    runs = [time_imports(modules) for _ in range(repeat)]
+    best = {}
+    for name in modules:
+        values = [run[name] for run in runs if run[name] is not None]
+        best[name] = min(values) if values else None
+    return best
+
+def total(timings):
+    return sum(v for v in timings.values() if v is not None)
+
+# -----------------------------
+# Benchmark
+# -----------------------------
+def run_benchmark(repeat=5):
+    results = {"deferred": best_of(DEFERRED_IMPORTS, repeat), "dashboards": {}}
+    for dashboard in DASHBOARDS:
+        modules = top_level_imports(os.path.join(ROOT, dashboard))
+        results["dashboards"][dashboard] = best_of(modules, repeat)
+    return results
+
+def print_report(results):
+    print("Cold-start import time per dashboard (best of runs):")
+    for dashboard, timings in results["dashboards"].items():
+        missing = [name for name, value in timings.items() if value is None]
+        print(f"  {dashboard:<30} {total(timings) * 1000:8.1f} ms")
+        if missing:
+            print(f"    (not installed: {', '.join(missing)})")
+    deferred = results["deferred"]
+    print(f"Deferred until first camera use: {total(deferred) * 1000:8.1f} ms")
+    for name, value in deferred.items():
+        shown = f"{value * 1000:8.1f} ms" if value is not None else "not installed"
+        print(f"  {name:<30} {shown}")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Measure dashboard cold-start import time")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--json", help="Write raw results to this file")
+    args = parser.parse_args()
+
+    results = run_benchmark(args.repeat)
+    print_report(results)
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(results, f, indent=2)
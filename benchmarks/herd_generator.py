@@ -0,0 +1,200 @@
+import argparse
+import math
+import os
+import random
+import sqlite3
+import sys
+from datetime import date, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from resources import lazy_import
+
+# -----------------------------
+# Herd Profile
+# -----------------------------
+BREEDS = {
+    "Large White": 0.30, "Landrace": 0.25, "Duroc": 0.15, "Hampshire": 0.08,
+    "Pietrain": 0.08, "Berkshire": 0.07, "Yorkshire": 0.07,
+}
+HEALTH_MIX = {"Healthy": 0.88, "Sick": 0.07, "Unknown": 0.05}
+BARNS = 6
+PENS_PER_BARN = 12
+NOTES = {
+    "Healthy": ["", "feeding well", "active", "good weight gain", "vaccinated", "moved from nursery"],
+    "Sick": ["diarrhea", "not feeding well", "coughing", "lame front leg", "fever", "diarrhea and lethargic"],
+    "Unknown": ["", "needs check", "tag reissued"],
+}
+WEIGH_INTERVAL_DAYS = 7
+FOUNDER_SHARE = 0.02
+
+PIGLET_SCHEMA = '''
+CREATE TABLE IF NOT EXISTS {table} (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    barcode TEXT UNIQUE NOT NULL,
+    birth_date DATE,
+    breed TEXT,
+    weight REAL,
+    health_status TEXT,
+    mother_id INTEGER,
+    father_id INTEGER,
+    location TEXT,
+    notes TEXT
+)
+'''
+
+WEIGHT_SCHEMA = '''
+CREATE TABLE IF NOT EXISTS WeightHistory (
+    barcode TEXT NOT NULL,
+    weighed_on DATE NOT NULL,
+    weight REAL,
+    PRIMARY KEY (barcode, weighed_on)
+)
+'''
+
+ALERTS_SCHEMA = '''
+CREATE TABLE IF NOT EXISTS AlertsSent (
+    barcode TEXT PRIMARY KEY,
+    table_name TEXT,
+    alerted_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+)
+'''
+
+def init_schema(conn):
+    for table in ("MalePiglets", "FemalePiglets"):
+        conn.execute(PIGLET_SCHEMA.format(table=table))
+    conn.execute(WEIGHT_SCHEMA)
+    conn.execute(ALERTS_SCHEMA)
+    conn.commit()
+
+# -----------------------------
+# Generators
+# -----------------------------
+def _pick(rng, weights):
+    return rng.choices(list(weights), weights=list(weights.values()))[0]
+
+# Gompertz curve: mature weight ~ 280 kg, ~1.4 kg at birth, ~135 kg around day 160
+def growth_weight(age_days, mature=280.0, b=5.3, k=0.0125):
+    return mature * math.exp(-b * math.exp(-k * age_days))
+
+def generate_piglets(count, seed=42, today=None):
+    rng = random.Random(seed)
+    today = today or date(2025, 10, 1)
+    founders = max(2, int(count * FOUNDER_SHARE))
+    ids = {"MalePiglets": 0, "FemalePiglets": 0}
+    for i in range(count):
+        table = "MalePiglets" if rng.random() < 0.5 else "FemalePiglets"
+        ids[table] += 1
+        age = rng.randint(1, 240)
+        health = _pick(rng, HEALTH_MIX)
+        breed = _pick(rng, BREEDS)
+        # Later animals descend from earlier ones, giving a multi-generation pedigree
+        if i < founders or ids["MalePiglets"] < 2 or ids["FemalePiglets"] < 2:
+            mother_id = father_id = None
+        else:
+            mother_id = rng.randint(1, ids["FemalePiglets"] - 1)
+            father_id = rng.randint(1, ids["MalePiglets"] - 1)
+        weight = growth_weight(age) * rng.uniform(0.85, 1.15) * (0.8 if health == "Sick" else 1.0)
+        yield table, {
+            "barcode": f"SYN{seed:03d}{i:08d}",
+            "birth_date": (today - timedelta(days=age)).isoformat(),
+            "breed": breed,
+            "weight": round(weight, 1),
+            "health_status": health,
+            "mother_id": mother_id,
+            "father_id": father_id,
+            "location": f"Barn {rng.randint(1, BARNS)} Pen {rng.randint(1, PENS_PER_BARN)}",
+            "notes": rng.choice(NOTES[health]),
+        }
+
+def weight_history(piglet, seed=42, today=None):
+    today = today or date(2025, 10, 1)
+    rng = random.Random(f"{seed}-{piglet['barcode']}")
+    birth = date.fromisoformat(piglet["birth_date"])
+    scale = rng.uniform(0.85, 1.15)
+    day = birth
+    while day <= today:
+        age = (day - birth).days
+        yield piglet["barcode"], day.isoformat(), round(growth_weight(age) * scale * rng.uniform(0.97, 1.03), 1)
+        day += timedelta(days=WEIGH_INTERVAL_DAYS)
+
+def generate_herd(db_path, count, seed=42, with_history=True, batch_size=10000):
+    if os.path.exists(db_path):
+        os.remove(db_path)
+    conn = sqlite3.connect(db_path)
+    conn.execute("PRAGMA journal_mode=OFF")
+    conn.execute("PRAGMA synchronous=OFF")
+    init_schema(conn)
+    columns = ["barcode", "birth_date", "breed", "weight", "health_status", "mother_id", "father_id", "location", "notes"]
+    batches = {"MalePiglets": [], "FemalePiglets": []}
+    history = []
+
+    def flush():
+        for table, rows in batches.items():
+            if rows:
+                conn.executemany(
+                    f"INSERT INTO {table} ({', '.join(columns)}) VALUES ({', '.join('?' * len(columns))})", rows)
+                rows.clear()
+        if history:
+            conn.executemany("INSERT INTO WeightHistory (barcode, weighed_on, weight) VALUES (?, ?, ?)", history)
+            history.clear()
+        conn.commit()
+
+    for table, piglet in generate_piglets(count, seed):
+        batches[table].append(tuple(piglet[c] for c in columns))
+        if with_history:
+            history.extend(weight_history(piglet, seed))
+        if len(batches["MalePiglets"]) + len(batches["FemalePiglets"]) >= batch_size:
+            flush()
+    flush()
+    conn.close()
+    return db_path
+
+# -----------------------------
+# Synthetic Video Frames
+# -----------------------------
+# BGR frames with a barn-ish noisy background and QR tags pasted in at random
+# positions. Returns (frame, [(barcode, (x, y, w, h)), ...]) so decoders can be
+# checked against ground truth. Needs numpy and qrcode.
+def qr_tile(data, size):
+    np = lazy_import("numpy")
+    qrcode = lazy_import("qrcode")
+    qr = qrcode.QRCode(version=1, box_size=4, border=2)
+    qr.add_data(data)
+    qr.make(fit=True)
+    matrix = np.array(qr.get_matrix(), dtype=np.uint8)
+    tile = np.where(matrix, 0, 255).astype(np.uint8)
+    repeat = max(1, size // tile.shape[0])
+    tile = np.kron(tile, np.ones((repeat, repeat), dtype=np.uint8))
+    return np.repeat(tile[:, :, None], 3, axis=2)
+
+def generate_frames(barcodes, count, width=640, height=480, tags_per_frame=2, tag_size=120, seed=42):
+    np = lazy_import("numpy")
+    rng = np.random.default_rng(seed)
+    tiles = {}
+    for _ in range(count):
+        frame = rng.integers(60, 140, size=(height, width, 3), dtype=np.uint8)
+        tags = []
+        chosen = rng.choice(len(barcodes), size=min(tags_per_frame, len(barcodes)), replace=False)
+        slots = max(1, width // (tag_size + 20))
+        for n, idx in enumerate(chosen):
+            data = barcodes[idx]
+            tile = tiles.get(data)
+            if tile is None:
+                tile = tiles[data] = qr_tile(data, tag_size)
+            h, w = tile.shape[:2]
+            x = (n % slots) * (tag_size + 20) + 10
+            y = int(rng.integers(0, max(1, height - h)))
+            frame[y:y + h, x:x + w] = tile
+            tags.append((data, (x, y, w, h)))
+        yield frame, tags
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Generate a synthetic herd database")
+    parser.add_argument("--count", type=int, default=1000, help="Number of piglets (1k to 1M)")
+    parser.add_argument("--db", default="synthetic_herd.db")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--no-history", action="store_true", help="Skip weight histories")
+    args = parser.parse_args()
+
+    generate_herd(args.db, args.count, args.seed, with_history=not args.no_history)
+    print(f"Wrote {args.count} piglets to {args.db}")
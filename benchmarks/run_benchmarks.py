@@ -0,0 +1,175 @@
+import argparse
+import json
+import os
+import platform
+import statistics
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from herd_generator import generate_herd, generate_frames
+from resources import lazy_import
+
+# -----------------------------
+# Settings
+# -----------------------------
+RESULTS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "results")
+DEFAULT_SIZES = [1000, 10000, 100000]
+REGRESSION_THRESHOLD = 0.10  # 10% slower than the baseline is flagged
+
+# -----------------------------
+# Helpers
+# -----------------------------
+def measure(func, repeat=5):
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        timings.append(time.perf_counter() - start)
+    return {"min_s": min(timings), "median_s": statistics.median(timings), "runs": repeat}
+
+def skipped(reason):
+    return {"skipped": reason}
+
+# -----------------------------
+# Benchmarks
+# -----------------------------
+def bench_get_data(db_path, repeat):
+    from piglet_db import get_all_piglets
+    return measure(lambda: get_all_piglets(db_path), repeat)
+
+def bench_filter_chart(db_path, repeat):
+    from piglet_db import get_all_piglets, filter_piglets
+    df = get_all_piglets(db_path)
+    locations = sorted(df["location"].dropna().unique())[:3]
+
+    def run():
+        filtered = filter_piglets(df, locations, ["Sick", "Healthy"])
+        try:
+            px = lazy_import("plotly.express")
+        except ImportError:
+            return filtered
+        px.histogram(filtered, x="breed")
+        px.histogram(filtered, x="weight", color="health_status")
+        px.pie(filtered, names="health_status")
+    return measure(run, repeat)
+
+def bench_alert_dedup(db_path, repeat, alerts=500):
+    import sqlite3
+    from piglet_db import init_alerts_table, already_alerted, mark_alerted
+    init_alerts_table(db_path)
+    conn = sqlite3.connect(db_path)
+    sick = [r[0] for r in conn.execute(
+        "SELECT barcode FROM MalePiglets WHERE health_status='Sick' "
+        "UNION ALL SELECT barcode FROM FemalePiglets WHERE health_status='Sick' LIMIT ?", (alerts,))]
+    conn.close()
+
+    def run():
+        for barcode in sick:
+            if not already_alerted(barcode, db_path):
+                mark_alerted(barcode, "Benchmark", db_path)
+    result = measure(run, repeat)
+    result["alerts"] = len(sick)
+    return result
+
+def bench_ingestion(db_path, repeat, rows=500):
+    from piglet_db import add_piglet
+    counter = iter(range(10 ** 9))
+
+    def run():
+        for _ in range(rows):
+            n = next(counter)
+            add_piglet("female" if n % 2 else "male", f"BENCH{n:09d}", "2025-01-01", "Duroc", 12.5,
+                       "Healthy", None, None, "Barn 1 Pen 1", "", db_path)
+    result = measure(run, repeat)
+    result["rows"] = rows
+    return result
+
+def bench_frames(repeat, frames=30):
+    try:
+        pyzbar = lazy_import("pyzbar.pyzbar")
+        lazy_import("qrcode")
+    except ImportError as e:
+        return skipped(f"missing dependency: {e.name}")
+    barcodes = [f"SYN042{i:08d}" for i in range(50)]
+    batch = list(generate_frames(barcodes, frames))
+
+    def run():
+        for frame, _ in batch:
+            pyzbar.decode(frame)
+    result = measure(run, repeat)
+    result["frames"] = frames
+    decoded = sum(len(pyzbar.decode(frame)) for frame, _ in batch[:5])
+    result["decode_recall_first5"] = decoded / max(1, sum(len(tags) for _, tags in batch[:5]))
+    return result
+
+def run_suite(sizes, repeat, workdir):
+    results = {
+        "timestamp": datetime.now().isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "machine": platform.machine(),
+        "sizes": {},
+    }
+    for size in sizes:
+        db_path = os.path.join(workdir, f"herd_{size}.db")
+        start = time.perf_counter()
+        generate_herd(db_path, size, with_history=False)
+        print(f"Generated {size} piglets in {time.perf_counter() - start:.1f}s")
+        entry = {}
+        for name, func in [("get_data", bench_get_data), ("filter_chart", bench_filter_chart),
+                           ("alert_dedup", bench_alert_dedup), ("ingestion", bench_ingestion)]:
+            try:
+                entry[name] = func(db_path, repeat)
+            except ImportError as e:
+                entry[name] = skipped(f"missing dependency: {e.name}")
+            print(f"  {size:>8} {name:<14} {entry[name]}")
+        results["sizes"][str(size)] = entry
+    results["frame_processing"] = bench_frames(repeat)
+    print(f"  frame_processing {results['frame_processing']}")
+    return results
+
+# -----------------------------
+# Regression Check
+# -----------------------------
+def compare(current, baseline, threshold=REGRESSION_THRESHOLD):
+    regressions = []
+    for size, entry in current["sizes"].items():
+        for name, result in entry.items():
+            base = baseline.get("sizes", {}).get(size, {}).get(name, {})
+            if "median_s" in result and "median_s" in base and base["median_s"] > 0:
+                change = result["median_s"] / base["median_s"] - 1
+                if change > threshold:
+                    regressions.append(f"{name} @ {size}: {change:+.0%}")
+    return regressions
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run the Piglytics benchmark suite")
+    parser.add_argument("--sizes", type=int, nargs="+", default=DEFAULT_SIZES,
+                        help="Herd sizes to generate (up to 1000000)")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--output", help="Result file (default: benchmarks/results/<timestamp>.json)")
+    parser.add_argument("--baseline", help="Earlier result file to compare against")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as workdir:
+        results = run_suite(args.sizes, args.repeat, workdir)
+
+    os.makedirs(RESULTS_DIR, exist_ok=True)
+    output = args.output or os.path.join(RESULTS_DIR, f"{datetime.now():%Y%m%d-%H%M%S}.json")
+    with open(output, "w") as f:
+        json.dump(results, f, indent=2)
+    print(f"Results written to {output}")
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            regressions = compare(results, json.load(f))
+        if regressions:
+            print("Regressions:")
+            for line in regressions:
+                print(f"  {line}")
+            sys.exit(1)
+        print("No regressions.")
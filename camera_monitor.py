@@ -0,0 +1,228 @@
+import threading
+import time
+from collections import deque
+
+import metrics
+from clip_buffer import clip_recorder, attach_clip
+from events import event_recorder
+from fusion import BarcodeFusion, frame_alerts
+from mjpeg_stream import stream_hub
+from piglet_db import DB_PATH, mark_alerted
+from resources import resource_manager
+from shm_frames import pipeline_lease, vision_pipeline
+from vision import annotate, decode_barcodes, detect_objects
+
+# -----------------------------
+# Settings
+# -----------------------------
+# One monitor per camera per process: a thread that reads the camera (through
+# a VisionPipeline, or ResourceManager's shared capture and model), fuses tags
+# with detections, raises alerts, feeds the clip recorder and publishes the
+# annotated frames to the camera's StreamHub. Dashboard sessions and the
+# vision worker only subscribe and show what it publishes, so YOLO runs once
+# per frame however many sessions are watching. The last subscriber to leave
+# stops the monitor, which releases the camera.
+RECENT_ALERTS = 50
+PIPELINE_RESTARTS = 3
+
+frame_decode_seconds = metrics.histogram("frame_decode_seconds", "pyzbar decode time per frame")
+frame_inference_seconds = metrics.histogram("frame_inference_seconds", "YOLO inference time per frame")
+frames_processed = metrics.counter("frames_processed_total", "Camera frames processed")
+alerts_sent = metrics.counter("alerts_sent_total", "Sick piglet alerts sent")
+
+# Default delivery: the workers' channels, configured from the environment
+def deliver_alert(piglet, table_name, db_path=DB_PATH):
+    from workers import deliver
+    deliver(piglet, table_name, db_path)
+
+def annotate_fused(frame, barcodes, fused, labels):
+    return annotate(frame, barcodes, [detection for detection, _ in fused], labels)
+
+# -----------------------------
+# Camera Monitor
+# -----------------------------
+# deliver(piglet, table_name, db_path) sends an alert and marks it alerted;
+# draw(frame, barcodes, fused, labels) annotates a private copy of a frame.
+# Viewers read `status` (a warning while the camera is down), `error` (set
+# when the monitor gave up) and recent_alerts().
+class CameraMonitor:
+    def __init__(self, camera_index=0, weights="yolov8n.pt", multiprocess=False, db_path=DB_PATH,
+                 deliver=deliver_alert, draw=annotate_fused):
+        self.camera_index = camera_index
+        self.weights = weights
+        self.multiprocess = multiprocess
+        self.db_path = db_path
+        self.deliver = deliver
+        self.draw = draw
+        self.fusion = BarcodeFusion(camera_index, db_path)
+        self.recorder = clip_recorder(camera_index)
+        self.events = event_recorder()
+        self.hub = stream_hub(camera_index)
+        self.alerts = deque(maxlen=RECENT_ALERTS)
+        self.alert_total = 0
+        self.status = None
+        self.error = None
+        self.lock = threading.Lock()
+        self.stop_event = threading.Event()
+        self.thread = None
+
+    def start(self):
+        self.thread = threading.Thread(target=self._run, name=f"camera-monitor-{self.camera_index}", daemon=True)
+        self.thread.start()
+        return self
+
+    def alive(self):
+        return self.thread is not None and self.thread.is_alive()
+
+    def stop(self):
+        self.stop_event.set()
+        if self.thread is not None and self.thread is not threading.current_thread():
+            self.thread.join(timeout=10)
+
+    # Returns (alert_total, alerts raised after the first `after` of them)
+    def recent_alerts(self, after=0):
+        with self.lock:
+            fresh = max(0, min(self.alert_total - after, len(self.alerts)))
+            return self.alert_total, list(self.alerts)[len(self.alerts) - fresh:]
+
+    def _run(self):
+        try:
+            if self.multiprocess:
+                self._run_pipeline()
+            else:
+                self._run_camera()
+        except Exception as e:
+            self.error = f"{type(e).__name__}: {e}"
+            print(f"Camera {self.camera_index} monitor stopped: {self.error}", flush=True)
+        finally:
+            if self.events is not None:
+                self.events.flush()
+
+    # Fuses one detection result with the barcodes read from the same frame
+    # and raises its alerts
+    def _fuse(self, barcodes, detections):
+        fused = self.fusion.update(barcodes, detections)
+        # Same alert selection as replay
+        scanned = {data for data, _ in barcodes}
+        for piglet, table in frame_alerts(self.fusion, barcodes, fused, self.db_path):
+            try:
+                self.deliver(piglet, table, self.db_path)
+            except Exception as e:
+                # Still marked, so a failing channel doesn't resend on every frame
+                print(f"Alert delivery failed for {piglet['barcode']}: {e}", flush=True)
+                mark_alerted(piglet["barcode"], table, self.db_path)
+            alerts_sent.inc(source="barcode" if piglet["barcode"] in scanned else "camera")
+            barcode = piglet["barcode"]
+            self.recorder.trigger(barcode, on_saved=lambda path, barcode=barcode: self._attach(barcode, path))
+            with self.lock:
+                self.alerts.append(piglet)
+                self.alert_total += 1
+        return fused
+
+    def _attach(self, barcode, path):
+        attach_clip(barcode, path, self.db_path)
+
+    def _publish(self, frame, barcodes, fused):
+        self.hub.publish(self.draw(frame, barcodes, fused, self.fusion.labels(fused)))
+
+    # Capture, decode and inference run in worker processes sharing frames
+    # through shared memory; this thread fuses, alerts and annotates.
+    def _run_pipeline(self):
+        with pipeline_lease(self.camera_index, self.weights) as pipeline:
+            last_seq = last_result = -1
+            fused, barcodes = [], []
+            restarts = 0
+            while not self.stop_event.is_set():
+                latest = pipeline.latest(last_seq)
+                if latest is None:
+                    if pipeline.alive():
+                        self.status = "Unable to read from camera."
+                        continue
+                    if restarts >= PIPELINE_RESTARTS:
+                        raise RuntimeError("vision pipeline keeps exiting")
+                    restarts += 1
+                    self.status = f"Vision pipeline exited; restarting ({restarts}/{PIPELINE_RESTARTS})."
+                    # vision_pipeline replaces a dead pipeline; its ring starts over
+                    pipeline = vision_pipeline(self.camera_index, self.weights)
+                    last_seq = last_result = -1
+                    continue
+                self.status = None
+                restarts = 0
+                last_seq, frame, result_seq, new_barcodes, detections = latest
+                self.recorder.push(frame)
+                if self.events is not None:
+                    self.events.frame(frame, camera_index=self.camera_index)
+                # A detection result is repeated for every frame captured while
+                # the next one is computed; it is fused and alerted on once
+                if result_seq > last_result:
+                    frames_processed.inc()
+                    last_result, barcodes = result_seq, new_barcodes
+                    fused = self._fuse(barcodes, detections)
+                self._publish(frame, barcodes, fused)
+
+    # Camera and model are shared through ResourceManager with anything else
+    # in this process using them
+    def _run_camera(self):
+        manager = resource_manager()
+        # Keeps the last few seconds of this camera so alerts can be saved as clips
+        manager.add_frame_listener(self.camera_index, self.recorder.push)
+        # PIGLYTICS_RECORD captures the camera for replay.py
+        if self.events is not None:
+            manager.add_frame_listener(self.camera_index, self.events.frame)
+        with manager.subscribe_camera(self.camera_index) as camera, manager.lease_model(self.weights) as model:
+            while not self.stop_event.is_set():
+                ret, frame = camera.read()
+                if not ret or frame is None:
+                    self.status = "Unable to read from camera."
+                    time.sleep(0.1)
+                    continue
+                self.status = None
+                frames_processed.inc()
+                with frame_decode_seconds.time():
+                    barcodes = decode_barcodes(frame)
+                try:
+                    with frame_inference_seconds.time():
+                        detections = detect_objects(model, frame)
+                except Exception as e:
+                    print(f"YOLO prediction failed: {e}", flush=True)
+                    detections = []
+                # The shared frame is read-only; annotate a private copy
+                self._publish(frame.copy(), barcodes, self._fuse(barcodes, detections))
+
+_monitors = {}
+_monitor_refs = {}
+_monitors_lock = threading.Lock()
+
+# Refcounted like ResourceManager's cameras. The first subscriber's options
+# (multiprocess, weights, ...) start the monitor; later ones share it as is.
+# A monitor that gave up is replaced by the next subscribe.
+def subscribe_monitor(camera_index=0, **options):
+    with _monitors_lock:
+        monitor = _monitors.get(camera_index)
+        if monitor is None or not monitor.alive():
+            monitor = _monitors[camera_index] = CameraMonitor(camera_index, **options).start()
+        _monitor_refs[camera_index] = _monitor_refs.get(camera_index, 0) + 1
+        return monitor
+
+def unsubscribe_monitor(camera_index=0):
+    with _monitors_lock:
+        refs = _monitor_refs.get(camera_index, 0) - 1
+        _monitor_refs[camera_index] = max(refs, 0)
+        monitor = _monitors.pop(camera_index, None) if refs <= 0 else None
+    # Joining the monitor thread happens outside the lock
+    if monitor is not None:
+        monitor.stop()
+
+class MonitorSubscription:
+    def __init__(self, camera_index, options):
+        self.camera_index = camera_index
+        self.options = options
+
+    def __enter__(self):
+        return subscribe_monitor(self.camera_index, **self.options)
+
+    def __exit__(self, *exc):
+        unsubscribe_monitor(self.camera_index)
+
+def camera_monitor(camera_index=0, **options):
+    return MonitorSubscription(camera_index, options)
@@ -0,0 +1,87 @@
+import sqlite3
+
+from piglet_db import DB_PATH, PIGLET_TABLES, herd_shards, is_sharded, piglet_table
+
+# -----------------------------
+# Schema
+# -----------------------------
+# HerdChanges gives every piglet row the version of its latest change, so a
+# device that last synced at version V downloads only rows changed after V,
+# and the analytics engine reloads only those pigs. Triggers keep it current;
+# deleted pigs stay as tombstones. Scans holds one row per uploaded scan;
+# scan_id makes uploads safe to retry.
+CHANGES_SCHEMA = [
+    """
+    CREATE TABLE IF NOT EXISTS HerdChanges (
+        barcode TEXT PRIMARY KEY,
+        version INTEGER NOT NULL,
+        gender TEXT NOT NULL,
+        deleted INTEGER NOT NULL DEFAULT 0
+    ) WITHOUT ROWID""",
+    "CREATE UNIQUE INDEX IF NOT EXISTS idx_herd_changes_version ON HerdChanges(version)",
+    """
+    CREATE TABLE IF NOT EXISTS Scans (
+        scan_id TEXT PRIMARY KEY,
+        barcode TEXT NOT NULL,
+        scanned_at REAL NOT NULL,
+        device TEXT,
+        status TEXT NOT NULL,
+        payload TEXT NOT NULL,
+        received_at REAL NOT NULL
+    )""",
+    "CREATE INDEX IF NOT EXISTS idx_scans_barcode ON Scans(barcode, scanned_at)",
+]
+
+def gender_of(table):
+    return "Male" if table == piglet_table("male") else "Female"
+
+def change_trigger_sql(table):
+    gender = gender_of(table)
+    upsert = (f"INSERT INTO HerdChanges (barcode, version, gender, deleted) "
+              f"VALUES ({{row}}.barcode, (SELECT IFNULL(MAX(version), 0) + 1 FROM HerdChanges), '{gender}', {{deleted}}) "
+              f"ON CONFLICT(barcode) DO UPDATE SET version = excluded.version, gender = excluded.gender, "
+              f"deleted = excluded.deleted;")
+    return [
+        f"CREATE TRIGGER IF NOT EXISTS {table}_changes_insert AFTER INSERT ON {table} BEGIN\n"
+        f"    {upsert.format(row='NEW', deleted=0)}\nEND",
+        f"CREATE TRIGGER IF NOT EXISTS {table}_changes_update AFTER UPDATE ON {table} BEGIN\n"
+        f"    {upsert.format(row='NEW', deleted=0)}\nEND",
+        f"CREATE TRIGGER IF NOT EXISTS {table}_changes_rename AFTER UPDATE OF barcode ON {table} "
+        f"WHEN OLD.barcode <> NEW.barcode BEGIN\n    {upsert.format(row='OLD', deleted=1)}\nEND",
+        f"CREATE TRIGGER IF NOT EXISTS {table}_changes_delete AFTER DELETE ON {table} BEGIN\n"
+        f"    {upsert.format(row='OLD', deleted=1)}\nEND",
+    ]
+
+def herd_version(conn):
+    return conn.execute("SELECT IFNULL(MAX(version), 0) FROM HerdChanges").fetchone()[0]
+
+# -----------------------------
+# Install
+# -----------------------------
+_installed = set()
+
+# Idempotent; after the first call per process it is a set lookup. An empty
+# HerdChanges is backfilled so existing pigs get a version. A shard directory
+# installs into every herd shard, including ones added since the last call.
+def install_changes(db_path=DB_PATH):
+    if is_sharded(db_path):
+        for path in herd_shards(db_path):
+            install_changes(path)
+        return
+    if db_path in _installed:
+        return
+    conn = sqlite3.connect(db_path)
+    with conn:
+        for sql in CHANGES_SCHEMA:
+            conn.execute(sql)
+        for table in PIGLET_TABLES:
+            for sql in change_trigger_sql(table):
+                conn.execute(sql)
+        if conn.execute("SELECT 1 FROM HerdChanges LIMIT 1").fetchone() is None:
+            for table in PIGLET_TABLES:
+                conn.execute(f"""
+                INSERT OR IGNORE INTO HerdChanges (barcode, version, gender, deleted)
+                SELECT barcode, ? + ROW_NUMBER() OVER (ORDER BY id), '{gender_of(table)}', 0 FROM {table}""",
+                             (herd_version(conn),))
+    conn.close()
+    _installed.add(db_path)
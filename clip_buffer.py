@@ -0,0 +1,214 @@
+import json
+import os
+import queue
+import re
+import sqlite3
+import threading
+import time
+from datetime import datetime
+
+from piglet_db import DB_PATH, alert_shard, alert_shards, is_sharded
+from resources import lazy_import
+
+# -----------------------------
+# Settings
+# -----------------------------
+CLIP_DIR = "clips"
+PRE_SECONDS = 10.0
+POST_SECONDS = 5.0
+CLIP_FPS = 10
+SLOT_BYTES = 128 * 1024   # one encoded 640x480 JPEG at quality 80 is ~40-70 KB
+JPEG_QUALITY = 80
+STAGING_FRAMES = 4        # raw frames waiting for the encoder; extra frames are dropped
+
+# -----------------------------
+# Encoded Frame Ring
+# -----------------------------
+# Fixed-size slots in one preallocated (or memory-mapped) byte array. Writing a
+# frame is a memcpy into the next slot; nothing is allocated per frame and the
+# oldest frame is overwritten once the ring is full.
+class FrameRing:
+    def __init__(self, slots, slot_bytes=SLOT_BYTES, storage_path=None):
+        np = lazy_import("numpy")
+        self.slots = slots
+        self.slot_bytes = slot_bytes
+        if storage_path:
+            self.data = np.memmap(storage_path, dtype=np.uint8, mode="w+", shape=(slots, slot_bytes))
+        else:
+            self.data = np.zeros((slots, slot_bytes), dtype=np.uint8)
+        self.lengths = np.zeros(slots, dtype=np.int64)
+        self.timestamps = np.zeros(slots, dtype=np.float64)
+        self.seqs = np.full(slots, -1, dtype=np.int64)
+        self.next_seq = 0
+        self.oversized = 0
+        self.lock = threading.Lock()
+
+    def write(self, encoded, stamp):
+        size = encoded.size
+        if size > self.slot_bytes:
+            self.oversized += 1
+            return False
+        with self.lock:
+            slot = self.next_seq % self.slots
+            self.data[slot, :size] = encoded
+            self.lengths[slot] = size
+            self.timestamps[slot] = stamp
+            self.seqs[slot] = self.next_seq
+            self.next_seq += 1
+        return True
+
+    # Copies out the frames stamped within [start, end], oldest first
+    def window(self, start, end):
+        np = lazy_import("numpy")
+        with self.lock:
+            valid = (self.seqs >= 0) & (self.timestamps >= start) & (self.timestamps <= end)
+            slots = np.nonzero(valid)[0]
+            slots = slots[np.argsort(self.seqs[slots])]
+            return [(float(self.timestamps[s]), self.data[s, :self.lengths[s]].tobytes()) for s in slots]
+
+    def latest_timestamp(self):
+        with self.lock:
+            if self.next_seq == 0:
+                return None
+            return float(self.timestamps[(self.next_seq - 1) % self.slots])
+
+# -----------------------------
+# Clip Recorder
+# -----------------------------
+# One per camera. push() is called from the capture thread and only copies the
+# raw frame into a preallocated staging slot; JPEG encoding, ring writes and
+# clip flushing all happen on the recorder's own thread, so the capture loop
+# never waits on them.
+class ClipRecorder:
+    def __init__(self, camera_index=0, pre_seconds=PRE_SECONDS, post_seconds=POST_SECONDS, fps=CLIP_FPS,
+                 slot_bytes=SLOT_BYTES, quality=JPEG_QUALITY, clip_dir=CLIP_DIR, storage_path=None):
+        self.camera_index = camera_index
+        self.pre_seconds = pre_seconds
+        self.post_seconds = post_seconds
+        self.min_interval = 1.0 / fps
+        self.quality = quality
+        self.clip_dir = clip_dir
+        self.ring = FrameRing(int((pre_seconds + post_seconds + 2) * fps), slot_bytes, storage_path)
+        self.staging = None
+        self.staging_stamps = [0.0] * STAGING_FRAMES
+        self.free = queue.Queue()
+        self.ready = queue.Queue()
+        for i in range(STAGING_FRAMES):
+            self.free.put(i)
+        self.last_push = 0.0
+        self.dropped = 0
+        self.pending = []
+        self.pending_lock = threading.Lock()
+        self.thread = threading.Thread(target=self._run, name=f"clip-recorder-{camera_index}", daemon=True)
+        self.thread.start()
+
+    def push(self, frame, stamp=None):
+        stamp = time.time() if stamp is None else stamp
+        if stamp - self.last_push < self.min_interval:
+            return
+        if self.staging is None:
+            np = lazy_import("numpy")
+            self.staging = np.empty((STAGING_FRAMES,) + frame.shape, dtype=frame.dtype)
+        if frame.shape != self.staging.shape[1:]:
+            self.dropped += 1
+            return
+        try:
+            slot = self.free.get_nowait()
+        except queue.Empty:
+            self.dropped += 1
+            return
+        self.last_push = stamp
+        self.staging[slot][...] = frame
+        self.staging_stamps[slot] = stamp
+        self.ready.put(slot)
+
+    # Schedules a clip covering pre_seconds before and post_seconds after now.
+    # on_saved(path) is called from a writer thread once the clip is on disk.
+    def trigger(self, label, on_saved=None, stamp=None):
+        stamp = time.time() if stamp is None else stamp
+        with self.pending_lock:
+            self.pending.append((stamp - self.pre_seconds, stamp + self.post_seconds, label, on_saved))
+
+    def _run(self):
+        cv2 = None
+        while True:
+            try:
+                slot = self.ready.get(timeout=0.5)
+            except queue.Empty:
+                slot = None
+            if slot is not None:
+                cv2 = cv2 or lazy_import("cv2")
+                frame = self.staging[slot]
+                ok, encoded = cv2.imencode(".jpg", frame, [cv2.IMWRITE_JPEG_QUALITY, self.quality])
+                if ok and encoded.size > self.ring.slot_bytes:
+                    # Busy scenes can overflow a slot; retry once at lower quality
+                    ok, encoded = cv2.imencode(".jpg", frame, [cv2.IMWRITE_JPEG_QUALITY, self.quality // 2])
+                stamp = self.staging_stamps[slot]
+                self.free.put(slot)
+                if ok:
+                    self.ring.write(encoded.ravel(), stamp)
+            self._flush_due()
+
+    def _flush_due(self):
+        now = time.time()
+        with self.pending_lock:
+            due = [clip for clip in self.pending if clip[1] <= now]
+            self.pending = [clip for clip in self.pending if clip[1] > now]
+        for start, end, label, on_saved in due:
+            frames = self.ring.window(start, end)
+            if frames:
+                threading.Thread(target=self._write_clip, args=(frames, start, label, on_saved), daemon=True).start()
+
+    # Clips are MJPEG streams (concatenated JPEGs, playable with VLC or
+    # `ffplay -f mjpeg`) with a JSON sidecar holding per-frame timestamps.
+    def _write_clip(self, frames, start, label, on_saved):
+        os.makedirs(self.clip_dir, exist_ok=True)
+        safe_label = re.sub(r"[^A-Za-z0-9_-]", "_", str(label))
+        name = f"cam{self.camera_index}_{safe_label}_{datetime.fromtimestamp(start):%Y%m%d-%H%M%S}"
+        path = os.path.join(self.clip_dir, f"{name}.mjpeg")
+        with open(path, "wb") as f:
+            for _, data in frames:
+                f.write(data)
+        with open(os.path.join(self.clip_dir, f"{name}.json"), "w") as f:
+            json.dump({"camera": self.camera_index, "label": label, "timestamps": [t for t, _ in frames]}, f)
+        if on_saved is not None:
+            on_saved(path)
+
+    def stats(self):
+        return {"frames": self.ring.next_seq, "dropped": self.dropped, "oversized": self.ring.oversized,
+                "pending_clips": len(self.pending)}
+
+# -----------------------------
+# Process-wide Registry
+# -----------------------------
+_recorders = {}
+_recorders_lock = threading.Lock()
+
+def clip_recorder(camera_index=0, **kwargs):
+    with _recorders_lock:
+        recorder = _recorders.get(camera_index)
+        if recorder is None:
+            recorder = ClipRecorder(camera_index, **kwargs)
+            _recorders[camera_index] = recorder
+        return recorder
+
+# -----------------------------
+# AlertsSent Link
+# -----------------------------
+def init_clip_column(db_path=DB_PATH):
+    if is_sharded(db_path):
+        for path in alert_shards(db_path):
+            init_clip_column(path)
+        return
+    conn = sqlite3.connect(db_path)
+    columns = [row[1] for row in conn.execute("PRAGMA table_info(AlertsSent)")]
+    if "clip_path" not in columns:
+        conn.execute("ALTER TABLE AlertsSent ADD COLUMN clip_path TEXT")
+        conn.commit()
+    conn.close()
+
+def attach_clip(barcode, path, db_path=DB_PATH):
+    conn = sqlite3.connect(alert_shard(db_path, barcode))
+    conn.execute("UPDATE AlertsSent SET clip_path = ? WHERE barcode = ?", (path, barcode))
+    conn.commit()
+    conn.close()
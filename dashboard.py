@@ -2,6 +2,9 @@ import streamlit as st
 import pandas as pd
 import plotly.express as px
 from datetime import datetime
+from streamlit_autorefresh import st_autorefresh
+from summary_tables import install_summary, get_kpis
+from sensors import sensor_processor
 
 st.set_page_config(page_title="Ken's Global Farm Dashboard", layout="wide")
 
@@ -42,13 +45,25 @@ st.markdown(
     unsafe_allow_html=True
 )
 st.markdown(f"**Last Sync:** {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}")
+st_autorefresh(interval=10 * 1000, key="sensor_refresh")
+
+def sensor_metric(processor, metric, unit):
+    mean, rate = processor.kpi(metric)
+    if mean is None:
+        return "—", None
+    return f"{mean:.1f}{unit}", (f"{rate:+.1f}{unit}/min" if rate is not None else None)
 
 # ---------- Key Metrics with Icons ----------
+# Piglet and alert counts come from the trigger-maintained summary table
+install_summary()
+kpis = get_kpis()
+# Temperature and humidity are live window means from the shared sensor processor
+sensors = sensor_processor()
 metrics = [
-    ("🌡️ Temperature", "28°C", "+1°C"),
-    ("💧 Humidity", "70%", "-2%"),
-    ("🐷 Piglets", "120", "+3"),
-    ("⚠️ Alerts", "3", None)
+    ("🌡️ Temperature", *sensor_metric(sensors, "temperature", "°C")),
+    ("💧 Humidity", *sensor_metric(sensors, "humidity", "%")),
+    ("🐷 Piglets", str(kpis["piglets"]), None),
+    ("⚠️ Alerts", str(kpis["alerts"]), None)
 ]
 
 if st.session_state.screen_width >= 768:
@@ -75,35 +90,34 @@ st.plotly_chart(fig_weight, use_container_width=True)
 
 # ---------- Environment Monitoring with Icons ----------
 st.subheader("Environment Monitoring")
-hours = [0, 6, 12, 18, 24]
-temp_values = [26, 27, 29, 30, 28]
-humidity_values = [65, 68, 70, 72, 70]
-
-env_df = pd.DataFrame({
-    "Hour": hours,
-    "🌡️ Temperature (°C)": temp_values,
-    "💧 Humidity (%)": humidity_values
-})
-
-fig_env = px.line(env_df, x="Hour", y=["🌡️ Temperature (°C)", "💧 Humidity (%)"], markers=True)
-fig_env.update_layout(
-    legend=dict(
-        orientation="h",
-        yanchor="bottom",
-        y=1.02,
-        xanchor="center",
-        x=0.5
+env_df = pd.DataFrame(sensors.history(), columns=["Barn", "Metric", "Time", "Value"])
+if env_df.empty:
+    st.caption("No sensor readings yet. Set PIGLYTICS_SENSOR_SOURCE to an MQTT broker or serial port.")
+    fig_env = None
+else:
+    env_df["Time"] = pd.to_datetime(env_df["Time"], unit="s")
+    env_df["Metric"] = env_df["Metric"].map({"temperature": "🌡️ Temperature (°C)", "humidity": "💧 Humidity (%)"}) \
+        .fillna(env_df["Metric"])
+    env_df["Series"] = "Barn " + env_df["Barn"] + " " + env_df["Metric"]
+    fig_env = px.line(env_df, x="Time", y="Value", color="Series")
+
+if fig_env is not None:
+    fig_env.update_layout(
+        legend=dict(
+            orientation="h",
+            yanchor="bottom",
+            y=1.02,
+            xanchor="center",
+            x=0.5
+        )
     )
-)
-st.plotly_chart(fig_env, use_container_width=True)
+    st.plotly_chart(fig_env, use_container_width=True)
 
 # ---------- Alerts with Icons ----------
 st.subheader("Active Alerts")
-alerts = [
-    {"message": "🐷 Piglet #45 not feeding", "severity": "red"},
-    {"message": "🌡️ Barn 2 overheating", "severity": "orange"},
-    {"message": "✅ All others stable", "severity": "green"},
-]
+alerts = [{"message": "🐷 Piglet #45 not feeding", "severity": "red"}]
+alerts += [{"message": f"🌡️ {alert['message']}", "severity": alert["severity"]} for alert in sensors.active_alerts()]
+alerts.append({"message": "✅ All others stable", "severity": "green"})
 
 if st.session_state.screen_width >= 768:
     cols = st.columns(len(alerts))
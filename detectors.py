@@ -0,0 +1,184 @@
+import os
+
+from resources import lazy_import
+
+# -----------------------------
+# Settings
+# -----------------------------
+# PIGLYTICS_DETECTOR picks the backend: "ultralytics" (default, PyTorch) or
+# "onnx" (ONNX Runtime on CPU). For "onnx", PIGLYTICS_ONNX_MODEL points at an
+# exported model; when unset, "<weights>.onnx" (or "<weights>.int8.onnx" with
+# PIGLYTICS_ONNX_INT8=1) next to the .pt file is used.
+DEFAULT_BACKEND = "ultralytics"
+CONF_THRESHOLD = 0.25
+IOU_THRESHOLD = 0.45
+IMG_SIZE = 640
+
+def detector_config():
+    return {
+        "backend": os.environ.get("PIGLYTICS_DETECTOR", DEFAULT_BACKEND).lower(),
+        "onnx_model": os.environ.get("PIGLYTICS_ONNX_MODEL"),
+        "int8": os.environ.get("PIGLYTICS_ONNX_INT8", "0") == "1",
+        "threads": int(os.environ.get("PIGLYTICS_ONNX_THREADS", "0")),
+    }
+
+def onnx_path(weights, int8=False):
+    base = os.path.splitext(weights)[0]
+    return f"{base}.int8.onnx" if int8 else f"{base}.onnx"
+
+# -----------------------------
+# Backends
+# -----------------------------
+# Every backend exposes detect(frame) -> [(x1, y1, x2, y2, class_id, confidence), ...]
+# in original frame pixels, the format vision.py uses everywhere.
+class UltralyticsDetector:
+    name = "ultralytics"
+
+    def __init__(self, weights="yolov8n.pt", conf=CONF_THRESHOLD, iou=IOU_THRESHOLD):
+        YOLO = lazy_import("ultralytics").YOLO
+        self.model = YOLO(weights)
+        self.conf = conf
+        self.iou = iou
+
+    def detect(self, frame):
+        results = self.model(frame, conf=self.conf, iou=self.iou, verbose=False)
+        if not results:
+            return []
+        boxes = results[0].boxes
+        return [(*map(int, box), int(cls_id), float(conf))
+                for box, cls_id, conf in zip(boxes.xyxy, boxes.cls, boxes.conf)]
+
+class OnnxDetector:
+    name = "onnx"
+
+    def __init__(self, model_path, conf=CONF_THRESHOLD, iou=IOU_THRESHOLD, threads=0):
+        ort = lazy_import("onnxruntime")
+        np = lazy_import("numpy")
+        options = ort.SessionOptions()
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        if threads:
+            options.intra_op_num_threads = threads
+        self.session = ort.InferenceSession(model_path, options, providers=["CPUExecutionProvider"])
+        model_input = self.session.get_inputs()[0]
+        self.input_name = model_input.name
+        size = model_input.shape[-1]
+        self.size = size if isinstance(size, int) else IMG_SIZE
+        self.conf = conf
+        self.iou = iou
+        # Reused every frame so preprocessing does not allocate a new canvas
+        self.canvas = np.full((self.size, self.size, 3), 114, dtype=np.uint8)
+
+    def _letterbox(self, frame):
+        cv2 = lazy_import("cv2")
+        h, w = frame.shape[:2]
+        scale = min(self.size / h, self.size / w)
+        nh, nw = round(h * scale), round(w * scale)
+        top, left = (self.size - nh) // 2, (self.size - nw) // 2
+        self.canvas[...] = 114
+        cv2.resize(frame, (nw, nh), dst=self.canvas[top:top + nh, left:left + nw], interpolation=cv2.INTER_LINEAR)
+        return scale, left, top
+
+    def detect(self, frame):
+        cv2 = lazy_import("cv2")
+        np = lazy_import("numpy")
+        scale, left, top = self._letterbox(frame)
+        blob = cv2.dnn.blobFromImage(self.canvas, 1 / 255.0, swapRB=True)
+        # YOLOv8 head: (1, 4 + classes, anchors) with cx, cy, w, h in input pixels
+        preds = self.session.run(None, {self.input_name: blob})[0][0].T
+        scores = preds[:, 4:]
+        class_ids = scores.argmax(axis=1)
+        confidences = scores[np.arange(len(scores)), class_ids]
+        keep = confidences >= self.conf
+        if not keep.any():
+            return []
+        boxes = preds[keep, :4]
+        class_ids, confidences = class_ids[keep], confidences[keep]
+        xywh = np.column_stack([boxes[:, 0] - boxes[:, 2] / 2, boxes[:, 1] - boxes[:, 3] / 2, boxes[:, 2], boxes[:, 3]])
+        # Class-aware NMS: offsetting each class keeps boxes of different classes apart
+        offset = xywh.copy()
+        offset[:, :2] += class_ids[:, None] * 4 * self.size
+        chosen = cv2.dnn.NMSBoxes(offset.tolist(), confidences.tolist(), self.conf, self.iou)
+        h, w = frame.shape[:2]
+        detections = []
+        for i in np.array(chosen).reshape(-1):
+            x, y, bw, bh = xywh[i]
+            x1 = int(np.clip((x - left) / scale, 0, w))
+            y1 = int(np.clip((y - top) / scale, 0, h))
+            x2 = int(np.clip((x + bw - left) / scale, 0, w))
+            y2 = int(np.clip((y + bh - top) / scale, 0, h))
+            detections.append((x1, y1, x2, y2, int(class_ids[i]), float(confidences[i])))
+        return detections
+
+def create_detector(weights="yolov8n.pt", backend=None):
+    config = detector_config()
+    backend = (backend or config["backend"]).lower()
+    if backend == "ultralytics":
+        return UltralyticsDetector(weights)
+    if backend == "onnx":
+        model_path = config["onnx_model"] or onnx_path(weights, config["int8"])
+        if not os.path.exists(model_path):
+            raise FileNotFoundError(f"ONNX model {model_path} not found; run: python detectors.py --export {weights}")
+        return OnnxDetector(model_path, threads=config["threads"])
+    raise ValueError(f"Unknown detector backend: {backend}")
+
+# -----------------------------
+# Export / Quantization
+# -----------------------------
+class _FrameCalibrationReader:
+    def __init__(self, detector, frames):
+        self.detector = detector
+        self.frames = iter(frames)
+
+    def get_next(self):
+        cv2 = lazy_import("cv2")
+        frame = next(self.frames, None)
+        if frame is None:
+            return None
+        self.detector._letterbox(frame)
+        return {self.detector.input_name: cv2.dnn.blobFromImage(self.detector.canvas, 1 / 255.0, swapRB=True)}
+
+# Exports <weights> to ONNX and, with int8=True, writes a quantized copy.
+# Static quantization needs a handful of representative frames (a sample clip);
+# without them weights are quantized dynamically.
+def export_onnx(weights="yolov8n.pt", int8=False, calibration_frames=None):
+    YOLO = lazy_import("ultralytics").YOLO
+    fp32_path = YOLO(weights).export(format="onnx", imgsz=IMG_SIZE, simplify=True)
+    if not int8:
+        return fp32_path
+    quantization = lazy_import("onnxruntime.quantization")
+    int8_path = onnx_path(weights, int8=True)
+    if calibration_frames:
+        reader = _FrameCalibrationReader(OnnxDetector(fp32_path), calibration_frames)
+        quantization.quantize_static(fp32_path, int8_path, reader, quant_format=quantization.QuantFormat.QDQ,
+                                     weight_type=quantization.QuantType.QInt8,
+                                     activation_type=quantization.QuantType.QUInt8)
+    else:
+        quantization.quantize_dynamic(fp32_path, int8_path, weight_type=quantization.QuantType.QUInt8)
+    return int8_path
+
+def read_clip(path, limit=None, step=1):
+    cv2 = lazy_import("cv2")
+    cap = cv2.VideoCapture(path)
+    frames = []
+    index = 0
+    while limit is None or len(frames) < limit:
+        ok, frame = cap.read()
+        if not ok:
+            break
+        if index % step == 0:
+            frames.append(frame)
+        index += 1
+    cap.release()
+    return frames
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Export the health detector for ONNX Runtime")
+    parser.add_argument("--export", metavar="WEIGHTS", default="yolov8n.pt")
+    parser.add_argument("--int8", action="store_true", help="Also write an int8-quantized model")
+    parser.add_argument("--calibration-clip", help="Video used for static int8 calibration")
+    args = parser.parse_args()
+
+    frames = read_clip(args.calibration_clip, limit=64, step=5) if args.calibration_clip else None
+    print(f"Wrote {export_onnx(args.export, args.int8, frames)}")
@@ -1,5 +1,14 @@
+import os
 import sqlite3
 from datetime import datetime
+import piglet_db
+from scan_journal import ScanJournal, API_URL
+
+# With PIGLYTICS_API_URL set, scans go to the local offline journal and are
+# synced to the central database whenever the link is up
+journal = ScanJournal() if API_URL else None
+# With PIGLYTICS_SHARD_DIR set, pigs are written to their barn's shard
+SHARD_DIR = os.environ.get("PIGLYTICS_SHARD_DIR")
 
 # Connect to SQLite database (creates it if it doesn't exist)
 conn = sqlite3.connect('piglets.db')
@@ -40,6 +49,20 @@ CREATE TABLE IF NOT EXISTS FemalePiglets (
 conn.commit()
 
 def add_piglet(gender, barcode, birth_date, breed, weight, health_status, mother_id, father_id, location, notes):
+    if journal is not None:
+        journal.record(barcode, gender=gender, birth_date=birth_date, breed=breed, weight=weight,
+                       health_status=health_status, mother_id=mother_id, father_id=father_id,
+                       location=location, notes=notes)
+        print(f"Scan for {barcode} saved ({journal.pending_count()} waiting to sync).")
+        return
+    if SHARD_DIR:
+        os.makedirs(SHARD_DIR, exist_ok=True)
+        if piglet_db.add_piglet(gender, barcode, birth_date, breed, weight, health_status, mother_id, father_id,
+                                location, notes, SHARD_DIR):
+            print(f"{gender.capitalize()} piglet with barcode {barcode} added successfully.")
+        else:
+            print(f"Error: Piglet with barcode {barcode} already exists.")
+        return
     table = 'MalePiglets' if gender.lower() == 'male' else 'FemalePiglets'
     try:
         cursor.execute(f'''
@@ -72,10 +95,17 @@ def scan_piglet():
 
 # Example usage
 if __name__ == "__main__":
+    if journal is not None:
+        journal.start_background_sync()
     while True:
         scan_piglet()
         cont = input("Scan another piglet? (y/n): ").strip().lower()
         if cont != 'y':
             break
+    if journal is not None:
+        try:
+            journal.sync()
+        except OSError as e:
+            print(f"Offline: {journal.pending_count()} scans will sync next time ({e}).")
 
 conn.close()
@@ -0,0 +1,174 @@
+import atexit
+import glob
+import heapq
+import json
+import os
+import struct
+import threading
+import time
+
+from resources import lazy_import
+
+# -----------------------------
+# Settings
+# -----------------------------
+# Event log: a magic line, then records of
+#   <float64 timestamp><uint8 kind><uint32 length><payload>
+# Frames are stored as JPEG, scans and sensor readings as compact JSON.
+MAGIC = b"PIGLYTICS-EVENTS 1\n"
+HEADER = struct.Struct("<dBI")
+FRAME, SCAN, SENSOR = 1, 2, 3
+KIND_NAMES = {FRAME: "frame", SCAN: "scan", SENSOR: "sensor"}
+# Set PIGLYTICS_RECORD to record live inputs. Every process writes its own
+# log next to that path, named after the process, e.g. run.ingest-4242.events
+# for run.events (see process_log_path). replay.py merges them by timestamp.
+RECORD_PATH = os.environ.get("PIGLYTICS_RECORD")
+PROCESS_NAME = os.environ.get("PIGLYTICS_PROCESS_NAME")    # set per worker by launcher.py
+RECORD_FPS = 10
+JPEG_QUALITY = 85
+FLUSH_INTERVAL = 1.0
+
+# -----------------------------
+# Recorder
+# -----------------------------
+# Appends live inputs to an event log for replay.py. Frames beyond max_fps
+# per camera are skipped so recording doesn't cost a full encode per frame.
+# Writes are flushed at least every FLUSH_INTERVAL seconds, so a process
+# killed outright loses at most that much.
+class EventRecorder:
+    def __init__(self, path, max_fps=RECORD_FPS):
+        new = not os.path.exists(path) or os.path.getsize(path) == 0
+        self.file = open(path, "ab")
+        if new:
+            self.file.write(MAGIC)
+        self.min_interval = 1.0 / max_fps if max_fps else 0.0
+        self.last_frame = {}
+        self.lock = threading.Lock()
+        self.events = 0
+        self.flushed_at = time.monotonic()
+
+    def _write(self, kind, payload, stamp=None):
+        stamp = time.time() if stamp is None else stamp
+        with self.lock:
+            if self.file.closed:
+                return
+            self.file.write(HEADER.pack(stamp, kind, len(payload)) + payload)
+            self.events += 1
+            if time.monotonic() - self.flushed_at >= FLUSH_INTERVAL:
+                self.file.flush()
+                self.flushed_at = time.monotonic()
+
+    # Same signature as a resources frame listener: listener(frame, stamp)
+    def frame(self, frame, stamp=None, camera_index=0):
+        stamp = time.time() if stamp is None else stamp
+        if stamp - self.last_frame.get(camera_index, 0.0) < self.min_interval:
+            return
+        self.last_frame[camera_index] = stamp
+        cv2 = lazy_import("cv2")
+        ok, encoded = cv2.imencode(".jpg", frame, [cv2.IMWRITE_JPEG_QUALITY, JPEG_QUALITY])
+        if ok:
+            self._write(FRAME, struct.pack("<H", camera_index) + encoded.tobytes(), stamp)
+
+    def scan(self, scan, stamp=None):
+        self._write(SCAN, json.dumps(scan, separators=(",", ":")).encode("utf-8"), stamp)
+
+    def sensor(self, barn, metric, value, stamp=None):
+        stamp = time.time() if stamp is None else stamp
+        self._write(SENSOR, json.dumps([str(barn), metric, float(value)], separators=(",", ":")).encode("utf-8"),
+                    stamp)
+
+    # Records every reading a SensorProcessor ingests
+    def tap_sensors(self, processor):
+        ingest = processor.ingest
+
+        def recording_ingest(barn, metric, value, stamp=None):
+            stamp = time.time() if stamp is None else stamp
+            self.sensor(barn, metric, value, stamp)
+            ingest(barn, metric, value, stamp)
+        processor.ingest = recording_ingest
+
+    def flush(self):
+        with self.lock:
+            if not self.file.closed:
+                self.file.flush()
+                self.flushed_at = time.monotonic()
+
+    def close(self):
+        with self.lock:
+            self.file.close()
+
+# This process's own log for a PIGLYTICS_RECORD path: the process name (or
+# "pid") and pid go before the extension
+def process_log_path(path, name=PROCESS_NAME):
+    stem, ext = os.path.splitext(path)
+    return f"{stem}.{name or 'pid'}-{os.getpid()}{ext}"
+
+# The logs a replay of path covers: path itself if it is a log, otherwise
+# every per-process log recorded for it
+def recorded_logs(path):
+    if os.path.isfile(path):
+        return [path]
+    stem, ext = os.path.splitext(path)
+    return sorted(glob.glob(f"{glob.escape(stem)}.*-[0-9]*{glob.escape(ext)}"))
+
+_recorder = None
+_recorder_lock = threading.Lock()
+
+# A forked child must not write through its parent's file object
+def _reset_after_fork():
+    global _recorder
+    _recorder = None
+os.register_at_fork(after_in_child=_reset_after_fork)
+
+def _close_recorder():
+    with _recorder_lock:
+        if _recorder is not None:
+            _recorder.close()
+
+atexit.register(_close_recorder)
+
+# Process-wide recorder for PIGLYTICS_RECORD, or None when recording is off
+def event_recorder():
+    global _recorder
+    if not RECORD_PATH:
+        return None
+    with _recorder_lock:
+        if _recorder is None:
+            _recorder = EventRecorder(process_log_path(RECORD_PATH))
+        return _recorder
+
+# -----------------------------
+# Reader
+# -----------------------------
+# Yields (timestamp, kind, payload) with payload decoded: (camera, BGR frame)
+# for frames, a dict for scans and (barn, metric, value) for sensor readings.
+# A record cut short by a crash ends the log.
+def read_events(path, decode_frames=True):
+    with open(path, "rb") as f:
+        if f.read(len(MAGIC)) != MAGIC:
+            raise ValueError(f"{path} is not an event log")
+        while True:
+            header = f.read(HEADER.size)
+            if len(header) < HEADER.size:
+                return
+            stamp, kind, length = HEADER.unpack(header)
+            payload = f.read(length)
+            if len(payload) < length:
+                return
+            if kind == FRAME:
+                camera_index = struct.unpack_from("<H", payload)[0]
+                if decode_frames:
+                    np = lazy_import("numpy")
+                    cv2 = lazy_import("cv2")
+                    frame = cv2.imdecode(np.frombuffer(payload, np.uint8, offset=2), cv2.IMREAD_COLOR)
+                else:
+                    frame = payload[2:]
+                yield stamp, kind, (camera_index, frame)
+            elif kind == SCAN:
+                yield stamp, kind, json.loads(payload)
+            elif kind == SENSOR:
+                yield stamp, kind, tuple(json.loads(payload))
+
+# read_events over several logs at once, in timestamp order
+def merge_events(paths, decode_frames=True):
+    return heapq.merge(*(read_events(path, decode_frames) for path in paths), key=lambda event: event[0])
@@ -0,0 +1,223 @@
+import sqlite3
+import threading
+import time
+import uuid
+
+from piglet_db import DB_PATH, PIGLET_TABLES, already_alerted, herd_shards, is_sharded
+from vision import is_sick
+
+# -----------------------------
+# Settings
+# -----------------------------
+MATCH_IOU = 0.3          # a detection continues a track when their boxes overlap this much
+MAX_AGE = 15             # frames a track survives without a matching detection
+ANONYMOUS_AFTER = 10     # sick frames without a tag before alerting on an unknown pig
+SHARD_RESCAN = 30.0      # seconds between looks for new herd shards
+
+# -----------------------------
+# Piglet Lookup Cache
+# -----------------------------
+# barcode -> (table, record) for the whole herd, held in memory so every frame
+# is a dict lookup. PRAGMA data_version changes whenever another connection
+# commits; the cache then reloads only the pigs HerdChanges (see changes.py) lists
+# as changed since its last load, or the whole herd if that table is missing.
+class PigletCache:
+    def __init__(self, db_path=DB_PATH):
+        self.db_path = db_path
+        self.conn = sqlite3.connect(db_path, check_same_thread=False)
+        self.conn.row_factory = sqlite3.Row
+        self.lock = threading.Lock()
+        self.version = None
+        self.herd_version = None
+        self.records = {}
+
+    def _herd_version(self):
+        try:
+            return self.conn.execute("SELECT IFNULL(MAX(version), 0) FROM HerdChanges").fetchone()[0]
+        except sqlite3.OperationalError:
+            return None
+
+    def _reload(self, herd_version):
+        records = {}
+        for table in PIGLET_TABLES:
+            for row in self.conn.execute(f"SELECT * FROM {table}"):
+                records[row["barcode"]] = (table, dict(row))
+        self.records = records
+        self.herd_version = herd_version
+
+    def _refresh(self):
+        version = self.conn.execute("PRAGMA data_version").fetchone()[0]
+        if version == self.version:
+            return
+        self.version = version
+        herd_version = self._herd_version()
+        if herd_version is None or self.herd_version is None:
+            self._reload(herd_version)
+            return
+        if herd_version == self.herd_version:
+            return
+        changed = [row[0] for row in self.conn.execute(
+            "SELECT barcode FROM HerdChanges WHERE version > ?", (self.herd_version,))]
+        for barcode in changed:
+            self.records.pop(barcode, None)
+        for table in PIGLET_TABLES:
+            for start in range(0, len(changed), 500):
+                chunk = changed[start:start + 500]
+                for row in self.conn.execute(f"SELECT * FROM {table} WHERE barcode IN ({', '.join('?' * len(chunk))})",
+                                             chunk):
+                    self.records[row["barcode"]] = (table, dict(row))
+        self.herd_version = herd_version
+
+    def get(self, barcode):
+        with self.lock:
+            self._refresh()
+            return self.records.get(barcode, (None, None))
+
+# Sharded storage: one PigletCache per herd shard, asked in turn. A pig that
+# is moving barns may briefly be in two of them; either record will do.
+class ShardedPigletCache:
+    def __init__(self, db_path):
+        self.db_path = db_path
+        self.lock = threading.Lock()
+        self.caches = {}
+        self.scanned_at = None
+
+    def _shards(self):
+        with self.lock:
+            if self.scanned_at is None or time.monotonic() - self.scanned_at >= SHARD_RESCAN:
+                for path in herd_shards(self.db_path):
+                    if path not in self.caches:
+                        self.caches[path] = PigletCache(path)
+                self.scanned_at = time.monotonic()
+            return list(self.caches.values())
+
+    def get(self, barcode):
+        for cache in self._shards():
+            table, record = cache.get(barcode)
+            if record is not None:
+                return table, record
+        return None, None
+
+_caches = {}
+_caches_lock = threading.Lock()
+
+def piglet_cache(db_path=DB_PATH):
+    with _caches_lock:
+        if db_path not in _caches:
+            _caches[db_path] = ShardedPigletCache(db_path) if is_sharded(db_path) else PigletCache(db_path)
+        return _caches[db_path]
+
+# -----------------------------
+# Box Geometry
+# -----------------------------
+def iou(a, b):
+    x1, y1 = max(a[0], b[0]), max(a[1], b[1])
+    x2, y2 = min(a[2], b[2]), min(a[3], b[3])
+    inter = max(0, x2 - x1) * max(0, y2 - y1)
+    union = (a[2] - a[0]) * (a[3] - a[1]) + (b[2] - b[0]) * (b[3] - b[1]) - inter
+    return inter / union if union > 0 else 0.0
+
+# The tag belongs to the smallest box containing its centre, i.e. the pig it is
+# clipped to rather than a larger overlapping box behind it
+def box_for_tag(rect, boxes):
+    x, y, w, h = rect
+    cx, cy = x + w / 2, y + h / 2
+    best, best_area = None, None
+    for i, (x1, y1, x2, y2) in enumerate(boxes):
+        if x1 <= cx <= x2 and y1 <= cy <= y2:
+            area = (x2 - x1) * (y2 - y1)
+            if best is None or area < best_area:
+                best, best_area = i, area
+    return best
+
+# -----------------------------
+# Detection / Barcode Fusion
+# -----------------------------
+# Detections are linked across frames by IoU into tracks. A tag decoded inside
+# a track's box names that track until the pig leaves view, so a sick pig whose
+# tag was readable a few frames ago still alerts under its real barcode.
+class Track:
+    def __init__(self, box):
+        self.key = uuid.uuid4().hex[:8]
+        self.box = box
+        self.barcode = None
+        self.missed = 0
+        self.sick_frames = 0
+
+class BarcodeFusion:
+    def __init__(self, camera_index=0, db_path=DB_PATH, cache=None):
+        self.camera_index = camera_index
+        self.cache = cache or piglet_cache(db_path)
+        self.tracks = []
+
+    def _match(self, boxes):
+        # Greedy on IoU, highest first; enough for the handful of pigs in view
+        pairs = sorted(((iou(track.box, box), t, d) for t, track in enumerate(self.tracks)
+                        for d, box in enumerate(boxes)), reverse=True)
+        matched, used_tracks = {}, set()
+        for overlap, t, d in pairs:
+            if overlap < MATCH_IOU:
+                break
+            if t not in used_tracks and d not in matched:
+                matched[d] = self.tracks[t]
+                used_tracks.add(t)
+        return matched
+
+    # Returns [(detection, track)] in detection order
+    def update(self, barcodes, detections):
+        boxes = [tuple(d[:4]) for d in detections]
+        matched = self._match(boxes)
+        for track in self.tracks:
+            track.missed += 1
+        fused = []
+        for d, detection in enumerate(detections):
+            track = matched.get(d)
+            if track is None:
+                track = Track(boxes[d])
+                self.tracks.append(track)
+            track.box = boxes[d]
+            track.missed = 0
+            track.sick_frames = track.sick_frames + 1 if is_sick(detection) else 0
+            fused.append((detection, track))
+        for data, rect in barcodes:
+            i = box_for_tag(rect, boxes)
+            if i is not None:
+                fused[i][1].barcode = data
+        self.tracks = [track for track in self.tracks if track.missed <= MAX_AGE]
+        return fused
+
+    # (piglet, table) for every sick pig in view. Tagged pigs come from the
+    # herd records; an untagged pig is reported once per track after it has
+    # looked sick for ANONYMOUS_AFTER frames, which gives its tag time to show.
+    def sick_piglets(self, fused):
+        found = []
+        for detection, track in fused:
+            if not is_sick(detection):
+                continue
+            table, record = self.cache.get(track.barcode) if track.barcode else (None, None)
+            if record is not None:
+                found.append((dict(record, health_status="Sick",
+                                   location=record.get("location") or "Camera Area"), table))
+            elif track.sick_frames >= ANONYMOUS_AFTER:
+                found.append(({"barcode": f"camera_{self.camera_index}_{track.key}", "breed": "Unknown",
+                               "weight": "Unknown", "location": "Camera Area", "health_status": "Sick",
+                               "notes": ""}, "CameraFeed"))
+        return found
+
+    # Per-detection label for vision.annotate: the pig's barcode once known
+    def labels(self, fused):
+        return [track.barcode for _, track in fused]
+
+# (piglet, table) for every alert one frame should raise: known pigs whose tag
+# was scanned, then sick pigs from the fused detections, skipping any pig that
+# is already alerted. Shared by camera_monitor and replay.py.
+def frame_alerts(fusion, barcodes, fused, db_path=DB_PATH):
+    alerts, seen = [], set()
+    candidates = [fusion.cache.get(data)[::-1] for data, _ in barcodes] + fusion.sick_piglets(fused)
+    for piglet, table in candidates:
+        if piglet is None or piglet["barcode"] in seen:
+            continue
+        seen.add(piglet["barcode"])
+        if not already_alerted(piglet["barcode"], db_path):
+            alerts.append((piglet, table))
+    return alerts
@@ -0,0 +1,363 @@
+import os
+import sqlite3
+import time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import date, timedelta
+
+import pandas as pd
+
+from piglet_db import DB_PATH, PIGLET_TABLES, fan_out, herd_shard, herd_shards, is_sharded, piglet_shard
+from resources import lazy_import
+
+# -----------------------------
+# Settings
+# -----------------------------
+TARGET_WEIGHT = float(os.environ.get("PIGLYTICS_MARKET_WEIGHT", "115"))
+# Herd-average Gompertz curve W(t) = A * exp(-b * exp(-k * t)), t in days of age.
+# Used as the prior for pigs with too few weighings to fit their own curve.
+HERD_CURVE = (280.0, 5.3, 0.0125)
+MATURE_RANGE = (150.0, 450.0)   # mature-weight (A) search range in kg
+MATURE_STEPS = 16
+REFINE_STEPS = 9
+MIN_GOMPERTZ_POINTS = 3
+MIN_GOMPERTZ_SPAN = 14          # days between first and last weighing
+CHUNK_SIZE = 5000               # pigs per worker task
+POOL_THRESHOLD = 2 * CHUNK_SIZE # below this the fit runs in-process
+
+WEIGHT_HISTORY_SCHEMA = '''
+CREATE TABLE IF NOT EXISTS WeightHistory (
+    barcode TEXT NOT NULL,
+    weighed_on DATE NOT NULL,
+    weight REAL,
+    PRIMARY KEY (barcode, weighed_on)
+)
+'''
+
+# -----------------------------
+# Schema
+# -----------------------------
+# GrowthStale is filled by triggers on WeightHistory, so a refresh only refits
+# pigs whose weighings changed since their last forecast. Every mark takes a
+# new seq, so a refresh clears only the marks it read and a weighing that lands
+# while it is fitting stays stale for the next one.
+_installed = set()
+
+# Idempotent; after the first call per process it is a set lookup. In sharded
+# storage every herd shard keeps the weighings and forecasts of its own pigs.
+def install_growth(db_path=DB_PATH):
+    if is_sharded(db_path):
+        for path in herd_shards(db_path):
+            install_growth(path)
+        return
+    if db_path in _installed:
+        return
+    conn = sqlite3.connect(db_path)
+    conn.execute(WEIGHT_HISTORY_SCHEMA)
+    conn.execute("""
+    CREATE TABLE IF NOT EXISTS GrowthForecast (
+        barcode TEXT PRIMARY KEY,
+        model TEXT NOT NULL,
+        birth_date DATE,
+        mature_weight REAL,
+        gompertz_b REAL,
+        gompertz_k REAL,
+        daily_gain REAL,
+        points INTEGER NOT NULL,
+        last_weighed_on DATE,
+        last_weight REAL,
+        target_weight REAL NOT NULL,
+        target_date DATE,
+        rmse REAL,
+        fitted_at REAL NOT NULL
+    )""")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_growth_target_date ON GrowthForecast(target_date)")
+    conn.execute("CREATE TABLE IF NOT EXISTS GrowthStale (barcode TEXT PRIMARY KEY, seq INTEGER NOT NULL DEFAULT 0) "
+                 "WITHOUT ROWID")
+    # Older databases have GrowthStale without seq and triggers that never re-mark
+    if "seq" not in [row[1] for row in conn.execute("PRAGMA table_info(GrowthStale)")]:
+        conn.execute("ALTER TABLE GrowthStale ADD COLUMN seq INTEGER NOT NULL DEFAULT 0")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_growth_stale_seq ON GrowthStale(seq)")
+    for event, row in [("INSERT", "new"), ("UPDATE", "new"), ("DELETE", "old")]:
+        conn.execute(f"DROP TRIGGER IF EXISTS WeightHistory_growth_{event.lower()}")
+        conn.execute(f"""
+        CREATE TRIGGER IF NOT EXISTS WeightHistory_stale_{event.lower()} AFTER {event} ON WeightHistory BEGIN
+            INSERT OR REPLACE INTO GrowthStale (barcode, seq)
+            VALUES ({row}.barcode, (SELECT IFNULL(MAX(seq), 0) + 1 FROM GrowthStale));
+        END""")
+    conn.commit()
+    conn.close()
+    _installed.add(db_path)
+
+# An unknown barcode's weighing goes to the unassigned shard, as the split does
+def record_weight(barcode, weighed_on, weight, db_path=DB_PATH):
+    if is_sharded(db_path):
+        path = piglet_shard(barcode, db_path)[1] or herd_shard(db_path, None)
+        install_growth(path)
+        return record_weight(barcode, weighed_on, weight, path)
+    conn = sqlite3.connect(db_path)
+    conn.execute("INSERT OR REPLACE INTO WeightHistory (barcode, weighed_on, weight) VALUES (?, ?, ?)",
+                 (barcode, str(weighed_on), weight))
+    conn.commit()
+    conn.close()
+
+# -----------------------------
+# Vectorized Fitting
+# -----------------------------
+# Every pig in a chunk is fitted at once on padded (pigs x weighings) arrays.
+# For a fixed mature weight A the Gompertz curve is linear after a double log,
+#   ln(-ln(W / A)) = ln(b) - k * t
+# so (b, k) have a closed-form least-squares solution for every pig and every
+# candidate A together; each pig keeps the A with the lowest error in kg.
+def _score_mature(A, ages, weights, w, count):
+    np = lazy_import("numpy")
+    ratio = np.clip(weights[None] / A, 1e-6, 1 - 1e-6)
+    y = np.log(-np.log(ratio))                                                        # (G, n, m)
+    t_mean = (w * ages[None]).sum(axis=2) / count
+    y_mean = (w * y).sum(axis=2) / count
+    dt = (ages[None] - t_mean[..., None]) * w
+    slope = (dt * (y - y_mean[..., None])).sum(axis=2) / np.maximum((dt * dt).sum(axis=2), 1e-9)
+    k = np.maximum(-slope, 1e-5)
+    b = np.exp(y_mean + k * t_mean)
+    fitted = A * np.exp(-b[..., None] * np.exp(-k[..., None] * ages[None]))
+    sse = (w * (fitted - weights[None]) ** 2).sum(axis=2)
+    return b, k, sse
+
+# A is searched on a coarse grid, then on a finer grid around each pig's best
+def fit_gompertz(ages, weights, mask):
+    np = lazy_import("numpy")
+    n = ages.shape[0]
+    pigs = np.arange(n)
+    w = mask[None].astype(float)
+    count = w[0].sum(axis=1)[None]
+    floor = (np.where(mask, weights, 0).max(axis=1) * 1.02)[None, :, None]
+    coarse = np.linspace(*MATURE_RANGE, MATURE_STEPS)
+    step = coarse[1] - coarse[0]
+    A = np.maximum(coarse[:, None, None], floor)                                     # (G, n, 1)
+    _, _, sse = _score_mature(A, ages, weights, w, count)
+    best = A[sse.argmin(axis=0), pigs]                                                # (n, 1)
+    offsets = np.linspace(-step, step, REFINE_STEPS)[:, None, None]
+    A = np.maximum(np.clip(best[None] + offsets, *MATURE_RANGE), floor)
+    b, k, sse = _score_mature(A, ages, weights, w, count)
+    best = sse.argmin(axis=0)
+    rmse = np.sqrt(sse[best, pigs] / count[0])
+    return A[best, pigs, 0], b[best, pigs], k[best, pigs], rmse
+
+# Age in days at which a Gompertz curve reaches the target, or NaN if never
+def gompertz_age_at(target, A, b, k):
+    np = lazy_import("numpy")
+    with np.errstate(invalid="ignore", divide="ignore"):
+        age = -np.log(np.log(A / target) / b) / k
+    return np.where(target < A, age, np.nan)
+
+# ages/weights/mask are (n, m) arrays sorted by age per row; returns per-pig
+# model, parameters and age at target. Pigs with too little data fall back to a
+# piecewise-linear projection from their last two weighings, or to the herd
+# curve scaled through their single weighing.
+def fit_chunk(ages, weights, mask, target):
+    np = lazy_import("numpy")
+    n = ages.shape[0]
+    points = mask.sum(axis=1)
+    last = points - 1
+    pigs = np.arange(n)
+    last_age, last_weight = ages[pigs, last], weights[pigs, last]
+    first_age = ages[:, 0]
+    out = {
+        "model": np.full(n, "herd", dtype=object),
+        "mature_weight": np.full(n, np.nan), "gompertz_b": np.full(n, np.nan), "gompertz_k": np.full(n, np.nan),
+        "daily_gain": np.full(n, np.nan), "rmse": np.full(n, np.nan), "target_age": np.full(n, np.nan),
+    }
+
+    gompertz = (points >= MIN_GOMPERTZ_POINTS) & (last_age - first_age >= MIN_GOMPERTZ_SPAN)
+    if gompertz.any():
+        A, b, k, rmse = fit_gompertz(ages[gompertz], weights[gompertz], mask[gompertz])
+        out["model"][gompertz] = "gompertz"
+        out["mature_weight"][gompertz], out["gompertz_b"][gompertz], out["gompertz_k"][gompertz] = A, b, k
+        out["rmse"][gompertz] = rmse
+        out["target_age"][gompertz] = gompertz_age_at(target, A, b, k)
+
+    linear = ~gompertz & (points >= 2)
+    if linear.any():
+        prev = np.maximum(last[linear] - 1, 0)
+        rows = pigs[linear]
+        gain = (last_weight[linear] - weights[rows, prev]) / np.maximum(last_age[linear] - ages[rows, prev], 1)
+        out["model"][linear] = "linear"
+        out["daily_gain"][linear] = gain
+        with np.errstate(divide="ignore", invalid="ignore"):
+            out["target_age"][linear] = np.where(gain > 0, last_age[linear] + (target - last_weight[linear]) / gain, np.nan)
+
+    herd = ~gompertz & ~linear
+    if herd.any():
+        A, b, k = HERD_CURVE
+        scale = last_weight[herd] / (A * np.exp(-b * np.exp(-k * last_age[herd])))
+        out["mature_weight"][herd] = A * scale
+        out["gompertz_b"][herd], out["gompertz_k"][herd] = b, k
+        out["target_age"][herd] = gompertz_age_at(target, A * scale, b, k)
+
+    # Pigs already at weight are due on their last weighing
+    reached = last_weight >= target
+    out["target_age"][reached] = np.minimum(out["target_age"][reached], last_age[reached])
+    out["target_age"][reached & np.isnan(out["target_age"])] = last_age[reached & np.isnan(out["target_age"])]
+    return out
+
+def _pad(history):
+    np = lazy_import("numpy")
+    groups = history.groupby("barcode", sort=False)
+    sizes = groups.size()
+    n, m = len(sizes), int(sizes.max())
+    ages = np.zeros((n, m))
+    weights = np.zeros((n, m))
+    mask = np.zeros((n, m), dtype=bool)
+    row = groups.ngroup().to_numpy()
+    col = groups.cumcount().to_numpy()
+    ages[row, col] = history["age"].to_numpy()
+    weights[row, col] = history["weight"].to_numpy()
+    mask[row, col] = True
+    # Pad with each pig's last weighing so padded cells never affect the fit
+    last = mask.sum(axis=1) - 1
+    pad = ~mask
+    ages[pad] = np.broadcast_to(ages[np.arange(n), last][:, None], (n, m))[pad]
+    weights[pad] = np.broadcast_to(weights[np.arange(n), last][:, None], (n, m))[pad]
+    return list(sizes.index), ages, weights, mask
+
+def _fit_frame(history, target):
+    barcodes, ages, weights, mask = _pad(history)
+    out = fit_chunk(ages, weights, mask, target)
+    out["barcode"] = barcodes
+    out["points"] = mask.sum(axis=1)
+    return pd.DataFrame(out)
+
+# history: DataFrame of barcode, birth_date, weighed_on, weight
+def fit_history(history, target=TARGET_WEIGHT, workers=None):
+    history = history.dropna(subset=["weight", "birth_date"]).copy()
+    if history.empty:
+        return pd.DataFrame()
+    history["weighed_on"] = pd.to_datetime(history["weighed_on"], errors="coerce")
+    history["birth_date"] = pd.to_datetime(history["birth_date"], errors="coerce")
+    history = history.dropna(subset=["weighed_on", "birth_date"])
+    history["age"] = (history["weighed_on"] - history["birth_date"]).dt.days.astype(float)
+    history = history[history["age"] >= 0].sort_values(["barcode", "age"])
+    if history.empty:
+        return pd.DataFrame()
+    barcodes = history["barcode"].unique()
+    chunks = [history[history["barcode"].isin(barcodes[i:i + CHUNK_SIZE])]
+              for i in range(0, len(barcodes), CHUNK_SIZE)]
+    if len(barcodes) < POOL_THRESHOLD:
+        fits = [_fit_frame(chunk, target) for chunk in chunks]
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            fits = list(pool.map(_fit_frame, chunks, [target] * len(chunks)))
+    fits = pd.concat(fits, ignore_index=True)
+    last = history.groupby("barcode").agg(birth_date=("birth_date", "first"), last_weighed_on=("weighed_on", "last"),
+                                          last_weight=("weight", "last"))
+    fits = fits.join(last, on="barcode")
+    target_days = pd.to_timedelta(fits["target_age"].round(), unit="D")
+    fits["target_date"] = (fits["birth_date"] + target_days).dt.date
+    fits["last_weighed_on"] = fits["last_weighed_on"].dt.date
+    return fits
+
+# -----------------------------
+# Refresh
+# -----------------------------
+def _load_history(conn, barcodes=None):
+    births = " UNION ALL ".join(f"SELECT barcode, birth_date FROM {t}" for t in PIGLET_TABLES)
+    query = f"SELECT h.barcode, p.birth_date, h.weighed_on, h.weight FROM WeightHistory h JOIN ({births}) p USING (barcode)"
+    if barcodes is None:
+        return pd.read_sql_query(query, conn)
+    conn.execute("CREATE TEMP TABLE IF NOT EXISTS _growth_batch (barcode TEXT PRIMARY KEY)")
+    conn.execute("DELETE FROM _growth_batch")
+    conn.executemany("INSERT OR IGNORE INTO _growth_batch VALUES (?)", [(b,) for b in barcodes])
+    history = pd.read_sql_query(query + " WHERE h.barcode IN (SELECT barcode FROM _growth_batch)", conn)
+    # Ends the implicit transaction the temp-table insert opened, so no lock is
+    # held while the history is fitted
+    conn.commit()
+    return history
+
+# Refits pigs with new weighings (all pigs with full=True); returns pigs refitted
+def refresh_forecasts(db_path=DB_PATH, target=TARGET_WEIGHT, full=False, workers=None):
+    if is_sharded(db_path):
+        return sum(refresh_forecasts(path, target, full, workers) for path in herd_shards(db_path))
+    install_growth(db_path)
+    conn = sqlite3.connect(db_path)
+    try:
+        # One statement, so the marks and their highest seq are one snapshot
+        marks = conn.execute("SELECT barcode, seq FROM GrowthStale").fetchall()
+        seen = max((seq for _, seq in marks), default=0)
+        if full:
+            stale = None
+        else:
+            stale = [barcode for barcode, _ in marks]
+            if not stale:
+                return 0
+        fits = fit_history(_load_history(conn, stale), target, workers)
+        now = time.time()
+        rows = [] if fits.empty else [
+            (r.barcode, r.model, str(r.birth_date.date()), _num(r.mature_weight), _num(r.gompertz_b), _num(r.gompertz_k), _num(r.daily_gain),
+             int(r.points), str(r.last_weighed_on), float(r.last_weight), target,
+             None if pd.isna(r.target_date) else str(r.target_date), _num(r.rmse), now)
+            for r in fits.itertuples(index=False)]
+        with conn:
+            if full:
+                conn.execute("DELETE FROM GrowthForecast")
+            else:
+                conn.executemany("DELETE FROM GrowthForecast WHERE barcode = ?", [(b,) for b in stale])
+            conn.executemany("INSERT OR REPLACE INTO GrowthForecast VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)", rows)
+            # Marks re-set during the fit have a higher seq and survive
+            if full:
+                conn.execute("DELETE FROM GrowthStale WHERE seq <= ?", (seen,))
+            else:
+                conn.executemany("DELETE FROM GrowthStale WHERE barcode = ? AND seq <= ?", [(b, seen) for b in stale])
+        return len(rows)
+    finally:
+        conn.close()
+
+def _num(value):
+    return None if pd.isna(value) else float(value)
+
+# -----------------------------
+# Dashboard Queries
+# -----------------------------
+def get_forecasts(db_path=DB_PATH, within_days=None):
+    if is_sharded(db_path):
+        frames = [frame for frame in fan_out(lambda path: get_forecasts(path, within_days), herd_shards(db_path))
+                  if not frame.empty]
+        if not frames:
+            return pd.DataFrame()
+        return pd.concat(frames, ignore_index=True).sort_values("target_date", na_position="first", ignore_index=True)
+    conn = sqlite3.connect(db_path)
+    try:
+        if within_days is None:
+            return pd.read_sql_query("SELECT * FROM GrowthForecast ORDER BY target_date", conn)
+        end = (date.today() + timedelta(days=within_days)).isoformat()
+        return pd.read_sql_query("SELECT * FROM GrowthForecast WHERE target_date <= ? ORDER BY target_date",
+                                 conn, params=(end,))
+    except pd.errors.DatabaseError:
+        return pd.DataFrame()
+    finally:
+        conn.close()
+
+# Fitted weight curve of one GrowthForecast row from birth to until_age days, for charting
+def forecast_curve(forecast, until_age):
+    np = lazy_import("numpy")
+    birth = pd.Timestamp(forecast["birth_date"])
+    ages = np.arange(0, int(until_age) + 1, 3)
+    if forecast["model"] == "linear":
+        last_age = (pd.Timestamp(forecast["last_weighed_on"]) - birth).days
+        ages = ages[ages >= last_age]
+        weights = forecast["last_weight"] + forecast["daily_gain"] * (ages - last_age)
+    else:
+        weights = forecast["mature_weight"] * np.exp(-forecast["gompertz_b"] * np.exp(-forecast["gompertz_k"] * ages))
+    return pd.DataFrame({"Date": birth + pd.to_timedelta(ages, unit="D"), "Weight": weights})
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Refresh market-weight forecasts")
+    parser.add_argument("--db", default=DB_PATH)
+    parser.add_argument("--full", action="store_true", help="Refit every pig, not just those with new weighings")
+    parser.add_argument("--target", type=float, default=TARGET_WEIGHT)
+    parser.add_argument("--workers", type=int)
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    count = refresh_forecasts(args.db, args.target, args.full, args.workers)
+    print(f"Refitted {count} pigs in {time.perf_counter() - start:.2f}s")
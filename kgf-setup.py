@@ -1,3 +1,4 @@
+import hashlib
 import os
 import subprocess
 import sys
@@ -38,35 +39,35 @@ pip_exe = get_pip_executable(venv_dir)
 python_exe = get_python_executable(venv_dir)
 
 # -------------------------------
-# Step 2: Upgrade pip
-# -------------------------------
-run(f"{pip_exe} install --upgrade pip")
-
-# -------------------------------
-# Step 3: Reorder requirements.txt (ultralytics first)
+# Step 2: Install packages only when requirements changed
 # -------------------------------
+# The hash of requirements.txt (and the interpreter) is stamped into the venv,
+# so restarts skip pip entirely when nothing changed.
 if not os.path.exists("requirements.txt"):
     print("Error: requirements.txt not found!")
     sys.exit(1)
 
-with open("requirements.txt", "r") as f:
-    lines = [line.strip() for line in f if line.strip()]
-
-ultra = [line for line in lines if line.lower() == "ultralytics"]
-others = [line for line in lines if line.lower() != "ultralytics"]
+with open("requirements.txt", "rb") as f:
+    requirements = f.read()
+digest = hashlib.sha256(requirements + sys.version.encode()).hexdigest()
+stamp_path = os.path.join(venv_dir, ".requirements.sha256")
+installed = open(stamp_path).read().strip() if os.path.exists(stamp_path) else None
 
-# Rewriting requirements.txt with ultralytics at the top
-with open("requirements.txt", "w") as f:
-    for line in ultra + others:
-        f.write(line + "\n")
-
-# -------------------------------
-# Step 4: Install all packages
-# -------------------------------
-run(f"{pip_exe} install -r requirements.txt")
+if installed == digest:
+    print("Environment is current; skipping install.")
+else:
+    run(f"{pip_exe} install --upgrade pip")
+    # ultralytics first, as before, without rewriting requirements.txt
+    lines = [line.strip() for line in requirements.decode().splitlines() if line.strip()]
+    ultra = [line for line in lines if line.lower() == "ultralytics"]
+    if ultra:
+        run(f"{pip_exe} install {' '.join(ultra)}")
+    run(f"{pip_exe} install -r requirements.txt")
+    with open(stamp_path, "w") as f:
+        f.write(digest)
 
 # -------------------------------
-# Step 5: Run Streamlit app
+# Step 3: Run dashboards and workers under the launcher
 # -------------------------------
-print("Starting Streamlit dashboard...")
-run(f"{python_exe} -m streamlit run r3_dashboardStreamlit.py --server.address 0.0.0.0 --server.port 8501")
+print("Starting Piglytics launcher...")
+os.execv(python_exe, [python_exe, "launcher.py", "--app", "r3_dashboardStreamlit.py", *sys.argv[1:]])
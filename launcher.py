@@ -0,0 +1,276 @@
+import asyncio
+import hashlib
+import json
+import os
+import signal
+import subprocess
+import sys
+import threading
+import time
+import urllib.request
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# -----------------------------
+# Settings
+# -----------------------------
+RUN_DIR = ".run"
+PUBLIC_PORT = 8501          # what browsers connect to
+BACKEND_BASE_PORT = 8511    # Streamlit processes listen on 8511, 8512, ... behind the proxy
+HEALTH_PORT = int(os.environ.get("PIGLYTICS_HEALTH_PORT", "8500"))
+CHECK_INTERVAL = 2.0
+STARTUP_GRACE = 60          # seconds a new process gets before health checks count
+HEARTBEAT_TIMEOUT = 30
+STOP_GRACE = 10             # seconds between SIGTERM and SIGKILL
+MAX_BACKOFF = 60
+
+# -----------------------------
+# Supervised Process
+# -----------------------------
+# A crashed or unhealthy process is restarted with exponential backoff. Health
+# is Streamlit's /_stcore/health endpoint for dashboards and a heartbeat file
+# (see workers.heartbeat) for background workers.
+class Worker:
+    def __init__(self, name, argv, env, health_url=None, heartbeat_path=None):
+        self.name = name
+        self.argv = argv
+        self.env = env
+        self.health_url = health_url
+        self.heartbeat_path = heartbeat_path
+        self.process = None
+        self.started_at = 0.0
+        self.restarts = 0
+        self.backoff = 1.0
+        self.retry_at = 0.0
+        self.healthy = False
+        self.lock = threading.Lock()
+
+    def start(self):
+        if self.heartbeat_path and os.path.exists(self.heartbeat_path):
+            os.remove(self.heartbeat_path)
+        self.process = subprocess.Popen(self.argv, env=self.env)
+        self.started_at = time.monotonic()
+        self.healthy = False
+        print(f"[launcher] started {self.name} (pid {self.process.pid})", flush=True)
+
+    def stop(self, grace=STOP_GRACE):
+        process, self.process = self.process, None
+        if process is None or process.poll() is not None:
+            return
+        process.terminate()
+        try:
+            process.wait(grace)
+        except subprocess.TimeoutExpired:
+            process.kill()
+            process.wait()
+        print(f"[launcher] stopped {self.name}", flush=True)
+
+    def restart(self):
+        self.stop()
+        self.start()
+
+    def probe(self):
+        if self.health_url:
+            try:
+                with urllib.request.urlopen(self.health_url, timeout=2) as response:
+                    return response.status == 200
+            except OSError:
+                return False
+        if self.heartbeat_path:
+            try:
+                return time.time() - os.path.getmtime(self.heartbeat_path) < HEARTBEAT_TIMEOUT
+            except OSError:
+                return False
+        return True
+
+    def supervise(self):
+        with self.lock:
+            now = time.monotonic()
+            if self.process is None:
+                if now >= self.retry_at:
+                    self.start()
+                return
+            if self.process.poll() is not None:
+                print(f"[launcher] {self.name} exited with {self.process.returncode}", flush=True)
+                self._schedule_restart(now)
+                return
+            self.healthy = self.probe()
+            if self.healthy:
+                self.backoff = 1.0
+            elif now - self.started_at > STARTUP_GRACE:
+                print(f"[launcher] {self.name} failed its health check", flush=True)
+                self.stop()
+                self._schedule_restart(now)
+
+    def _schedule_restart(self, now):
+        self.process = None
+        self.healthy = False
+        self.restarts += 1
+        self.retry_at = now + self.backoff
+        self.backoff = min(self.backoff * 2, MAX_BACKOFF)
+
+    def status(self):
+        alive = self.process is not None and self.process.poll() is None
+        return {"pid": self.process.pid if alive else None, "healthy": self.healthy, "restarts": self.restarts,
+                "uptime_s": round(time.monotonic() - self.started_at) if alive else 0}
+
+# -----------------------------
+# Sticky Dashboard Proxy
+# -----------------------------
+# Streamlit keeps session state in the process that served the page, so every
+# connection from one client address goes to the same backend. Unhealthy
+# backends are skipped, which lets a rolling restart proceed without downtime.
+class StickyProxy:
+    def __init__(self, port, backends):
+        self.port = port
+        self.backends = backends  # [(port, worker)]
+
+    def pick(self, client):
+        healthy = [port for port, worker in self.backends if worker.healthy] or [port for port, _ in self.backends]
+        digest = hashlib.blake2b(client.encode(), digest_size=4).digest()
+        return healthy[int.from_bytes(digest, "big") % len(healthy)]
+
+    async def _pipe(self, reader, writer):
+        try:
+            while data := await reader.read(65536):
+                writer.write(data)
+                await writer.drain()
+        except (ConnectionError, asyncio.CancelledError):
+            pass
+        finally:
+            writer.close()
+
+    async def _handle(self, client_reader, client_writer):
+        client = client_writer.get_extra_info("peername")[0]
+        try:
+            backend_reader, backend_writer = await asyncio.open_connection("127.0.0.1", self.pick(client))
+        except OSError:
+            client_writer.close()
+            return
+        await asyncio.gather(self._pipe(client_reader, backend_writer), self._pipe(backend_reader, client_writer))
+
+    async def _serve(self):
+        server = await asyncio.start_server(self._handle, "0.0.0.0", self.port)
+        async with server:
+            await server.serve_forever()
+
+    def start(self):
+        threading.Thread(target=asyncio.run, args=(self._serve(),), name="dashboard-proxy", daemon=True).start()
+
+# -----------------------------
+# Supervisor
+# -----------------------------
+class Supervisor:
+    def __init__(self, workers):
+        self.workers = workers
+        self.stopping = threading.Event()
+        self.restart_requested = threading.Event()
+
+    def status(self):
+        return {worker.name: worker.status() for worker in self.workers}
+
+    def healthy(self):
+        return all(worker.healthy for worker in self.workers)
+
+    # One process at a time, waiting for each to pass its health check, so
+    # the other dashboards keep serving while one restarts
+    def rolling_restart(self):
+        print("[launcher] rolling restart", flush=True)
+        for worker in self.workers:
+            if self.stopping.is_set():
+                return
+            with worker.lock:
+                worker.restart()
+            deadline = time.monotonic() + STARTUP_GRACE
+            while not self.stopping.is_set() and time.monotonic() < deadline:
+                worker.supervise()
+                if worker.healthy:
+                    break
+                time.sleep(0.5)
+
+    def run(self):
+        for worker in self.workers:
+            worker.start()
+        while not self.stopping.is_set():
+            if self.restart_requested.is_set():
+                self.restart_requested.clear()
+                self.rolling_restart()
+            for worker in self.workers:
+                worker.supervise()
+            self.stopping.wait(CHECK_INTERVAL)
+        for worker in self.workers:
+            worker.stop()
+
+def start_health_server(supervisor, port=HEALTH_PORT):
+    class HealthHandler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path not in ("/health", "/"):
+                self.send_error(404)
+                return
+            body = json.dumps(supervisor.status()).encode("utf-8")
+            self.send_response(200 if supervisor.healthy() else 503)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(("0.0.0.0", port), HealthHandler)
+    threading.Thread(target=server.serve_forever, name="launcher-health", daemon=True).start()
+    return server
+
+# -----------------------------
+# Process Layout
+# -----------------------------
+def build_workers(app, dashboards, background, python=sys.executable):
+    os.makedirs(RUN_DIR, exist_ok=True)
+    base_env = dict(os.environ)
+    # Cross-process caches: sensor aggregates are written by the ingest worker
+    # and read by every dashboard; camera frames are served by the vision worker.
+    base_env.setdefault("PIGLYTICS_SENSOR_SNAPSHOT", os.path.abspath(os.path.join(RUN_DIR, "sensors.json")))
+    # Dashboards leave the table alert scan and the camera to these workers
+    if "alerts" in background:
+        base_env["PIGLYTICS_ALERTS_WORKER"] = "1"
+    if "vision" in background:
+        base_env["PIGLYTICS_VISION_WORKER"] = "1"
+    dashboard_env = {k: v for k, v in base_env.items() if k != "PIGLYTICS_SENSOR_SOURCE"}
+
+    workers = []
+    ports = [PUBLIC_PORT] if dashboards == 1 else [BACKEND_BASE_PORT + i for i in range(dashboards)]
+    for i, port in enumerate(ports):
+        address = "0.0.0.0" if dashboards == 1 else "127.0.0.1"
+        argv = [python, "-m", "streamlit", "run", app, "--server.address", address, "--server.port", str(port),
+                "--server.headless", "true"]
+        workers.append(Worker(f"dashboard-{i}", argv, dict(dashboard_env, PIGLYTICS_PROCESS_NAME=f"dashboard-{i}"),
+                              health_url=f"http://127.0.0.1:{port}/_stcore/health"))
+    for name in background:
+        heartbeat_path = os.path.abspath(os.path.join(RUN_DIR, f"{name}.heartbeat"))
+        env = dict(base_env, PIGLYTICS_HEARTBEAT=heartbeat_path, PIGLYTICS_PROCESS_NAME=name)
+        workers.append(Worker(name, [python, "workers.py", name], env, heartbeat_path=heartbeat_path))
+    return workers, ports
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Run the Piglytics dashboards and workers under supervision")
+    parser.add_argument("--app", default="r10_dashboardStreamlit.py")
+    parser.add_argument("--dashboards", type=int, default=max(1, min(4, (os.cpu_count() or 2) // 2)),
+                        help="Streamlit processes behind the sticky proxy (default: half the cores, up to 4)")
+    parser.add_argument("--workers", nargs="*", default=["ingest", "alerts", "backup", "api", "reports"],
+                        choices=["ingest", "alerts", "backup", "api", "reports", "vision"],
+                        help="Background workers to run (add 'vision' on camera hosts)")
+    args = parser.parse_args()
+    workers, ports = build_workers(args.app, args.dashboards, args.workers)
+    supervisor = Supervisor(workers)
+    if args.dashboards > 1:
+        StickyProxy(PUBLIC_PORT, list(zip(ports, workers))).start()
+    start_health_server(supervisor)
+
+    # SIGTERM/SIGINT: stop everything gracefully. SIGHUP: rolling restart.
+    signal.signal(signal.SIGTERM, lambda *_: supervisor.stopping.set())
+    signal.signal(signal.SIGINT, lambda *_: supervisor.stopping.set())
+    if hasattr(signal, "SIGHUP"):
+        signal.signal(signal.SIGHUP, lambda *_: supervisor.restart_requested.set())
+    print(f"[launcher] dashboards on :{PUBLIC_PORT}, health on :{HEALTH_PORT}/health", flush=True)
+    supervisor.run()
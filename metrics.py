@@ -0,0 +1,253 @@
+import functools
+import os
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# -----------------------------
+# Settings
+# -----------------------------
+# Instrumentation is off unless PIGLYTICS_METRICS=1. While disabled every timer,
+# counter and decorator is a single flag check, so it can stay in the hot path.
+ENABLED = os.environ.get("PIGLYTICS_METRICS", "0") == "1"
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+def enable(flag=True):
+    global ENABLED
+    ENABLED = flag
+
+def _label_key(labels):
+    return tuple(sorted(labels.items()))
+
+def _format_labels(key, extra=None):
+    pairs = list(key) + (extra or [])
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{k}="{v}"' for k, v in pairs) + "}"
+
+# -----------------------------
+# Metric Types
+# -----------------------------
+class Counter:
+    kind = "counter"
+
+    def __init__(self, name, help_text):
+        self.name = name
+        self.help = help_text
+        self.values = {}
+        self.lock = threading.Lock()
+
+    def inc(self, amount=1, **labels):
+        if not ENABLED:
+            return
+        key = _label_key(labels)
+        with self.lock:
+            self.values[key] = self.values.get(key, 0) + amount
+
+    def samples(self):
+        with self.lock:
+            return [(self.name, key, value) for key, value in self.values.items()]
+
+class Histogram:
+    kind = "histogram"
+
+    def __init__(self, name, help_text, buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.help = help_text
+        self.buckets = tuple(buckets)
+        self.series = {}
+        self.lock = threading.Lock()
+
+    def observe(self, value, **labels):
+        if not ENABLED:
+            return
+        key = _label_key(labels)
+        with self.lock:
+            series = self.series.get(key)
+            if series is None:
+                series = {"counts": [0] * len(self.buckets), "sum": 0.0, "count": 0}
+                self.series[key] = series
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series["counts"][i] += 1
+                    break
+            series["sum"] += value
+            series["count"] += 1
+
+    def time(self, **labels):
+        return _Timer(self, labels)
+
+    # Bucket-interpolated quantile, good enough for a dashboard panel
+    def quantile(self, q, **labels):
+        with self.lock:
+            series = self.series.get(_label_key(labels))
+            if not series or series["count"] == 0:
+                return None
+            target = q * series["count"]
+            seen = 0
+            lower = 0.0
+            for bound, count in zip(self.buckets, series["counts"]):
+                if count and seen + count >= target:
+                    return lower + (bound - lower) * (target - seen) / count
+                seen += count
+                lower = bound
+            return self.buckets[-1]
+
+    def samples(self):
+        out = []
+        with self.lock:
+            for key, series in self.series.items():
+                cumulative = 0
+                for bound, count in zip(self.buckets, series["counts"]):
+                    cumulative += count
+                    out.append((f"{self.name}_bucket", key + (("le", bound),), cumulative))
+                out.append((f"{self.name}_bucket", key + (("le", "+Inf"),), series["count"]))
+                out.append((f"{self.name}_sum", key, series["sum"]))
+                out.append((f"{self.name}_count", key, series["count"]))
+        return out
+
+    def summary(self):
+        rows = []
+        with self.lock:
+            keys = list(self.series)
+        for key in keys:
+            series = self.series[key]
+            labels = dict(key)
+            rows.append({
+                "metric": self.name,
+                "labels": ", ".join(f"{k}={v}" for k, v in key),
+                "count": series["count"],
+                "mean_ms": 1000 * series["sum"] / series["count"] if series["count"] else 0.0,
+                "p50_ms": 1000 * (self.quantile(0.5, **labels) or 0.0),
+                "p95_ms": 1000 * (self.quantile(0.95, **labels) or 0.0),
+            })
+        return rows
+
+class _Timer:
+    def __init__(self, histogram, labels):
+        self.histogram = histogram
+        self.labels = labels
+        self.start = None
+
+    def __enter__(self):
+        if ENABLED:
+            self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        if self.start is not None:
+            self.histogram.observe(time.perf_counter() - self.start, **self.labels)
+
+# -----------------------------
+# Registry
+# -----------------------------
+_registry = {}
+_registry_lock = threading.Lock()
+
+def counter(name, help_text=""):
+    with _registry_lock:
+        return _registry.setdefault(name, Counter(name, help_text))
+
+def histogram(name, help_text="", buckets=DEFAULT_BUCKETS):
+    with _registry_lock:
+        return _registry.setdefault(name, Histogram(name, help_text, buckets))
+
+def timed(name, help_text="", **labels):
+    hist = histogram(name, help_text)
+
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if not ENABLED:
+                return func(*args, **kwargs)
+            start = time.perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                hist.observe(time.perf_counter() - start, **labels)
+        return wrapper
+    return decorator
+
+def performance_rows():
+    rows = []
+    with _registry_lock:
+        metrics = list(_registry.values())
+    for metric in metrics:
+        if isinstance(metric, Histogram):
+            rows.extend(metric.summary())
+    return rows
+
+# -----------------------------
+# Exporters
+# -----------------------------
+def render_prometheus():
+    lines = []
+    with _registry_lock:
+        metrics = list(_registry.values())
+    for metric in metrics:
+        lines.append(f"# HELP {metric.name} {metric.help}")
+        lines.append(f"# TYPE {metric.name} {metric.kind}")
+        for name, key, value in metric.samples():
+            lines.append(f"{name}{_format_labels(key)} {value}")
+    return "\n".join(lines) + "\n"
+
+def write_metrics_file(path):
+    tmp = f"{path}.tmp"
+    with open(tmp, "w") as f:
+        f.write(render_prometheus())
+    os.replace(tmp, path)
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path not in ("/metrics", "/"):
+            self.send_error(404)
+            return
+        body = render_prometheus().encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+_server = None
+
+def start_metrics_server(port=9108, host="0.0.0.0"):
+    global _server
+    with _registry_lock:
+        if _server is not None:
+            return _server
+        _server = ThreadingHTTPServer((host, port), _MetricsHandler)
+    threading.Thread(target=_server.serve_forever, name="metrics-server", daemon=True).start()
+    return _server
+
+def _file_writer(path, interval):
+    while True:
+        time.sleep(interval)
+        write_metrics_file(path)
+
+_file_thread = None
+
+def start_metrics_file(path, interval=10.0):
+    global _file_thread
+    with _registry_lock:
+        if _file_thread is not None:
+            return
+        _file_thread = threading.Thread(target=_file_writer, args=(path, interval), name="metrics-file", daemon=True)
+    _file_thread.start()
+
+# Reads PIGLYTICS_METRICS_PORT / PIGLYTICS_METRICS_FILE; safe to call on every rerun
+def configure_from_env():
+    if not ENABLED:
+        return
+    port = os.environ.get("PIGLYTICS_METRICS_PORT")
+    if port:
+        try:
+            start_metrics_server(int(port))
+        except OSError:
+            pass  # another process already serves this port
+    path = os.environ.get("PIGLYTICS_METRICS_FILE")
+    if path:
+        start_metrics_file(path)
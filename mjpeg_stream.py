@@ -0,0 +1,211 @@
+import os
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse, parse_qs
+
+import metrics
+from resources import lazy_import
+
+# -----------------------------
+# Settings
+# -----------------------------
+STREAM_PORT = int(os.environ.get("PIGLYTICS_STREAM_PORT", "8090"))
+DEFAULT_FPS = 10
+MAX_FPS = 30
+# (max width, JPEG quality) from best to cheapest; width 0 keeps the source size.
+# Clients are moved along this ladder, so every client on a tier shares one encode.
+TIERS = [(0, 80), (960, 70), (640, 60), (480, 50), (320, 40)]
+# A client drops a tier when sending a frame takes more than SLOW_SHARE of its
+# frame interval, and climbs back after FAST_STREAK sends under FAST_SHARE.
+SLOW_SHARE = 0.5
+FAST_SHARE = 0.15
+FAST_STREAK = 20
+BOUNDARY = "frame"
+
+frames_encoded = metrics.counter("piglytics_stream_frames_encoded_total", "JPEG encodes done by the stream hub")
+bytes_sent = metrics.counter("piglytics_stream_bytes_sent_total", "MJPEG bytes written to stream clients")
+
+# -----------------------------
+# Stream Hub
+# -----------------------------
+# One per camera. publish() only swaps a reference, so the monitoring loop never
+# waits on encoding or on slow clients. Each (frame, tier) is JPEG-encoded at
+# most once, by whichever client asks first; the others reuse the bytes.
+class StreamHub:
+    def __init__(self, camera_index):
+        self.camera_index = camera_index
+        self.frame = None
+        self.seq = 0
+        self.cond = threading.Condition()
+        self.encoded = {}
+        self.encode_lock = threading.Lock()
+        self.clients = 0
+
+    # frame must not be modified by the caller afterwards
+    def publish(self, frame):
+        with self.cond:
+            self.frame = frame
+            self.seq += 1
+            self.cond.notify_all()
+
+    def wait_newer(self, last_seq, timeout=1.0):
+        with self.cond:
+            self.cond.wait_for(lambda: self.seq != last_seq, timeout)
+            return self.seq
+
+    def jpeg(self, tier):
+        cv2 = lazy_import("cv2")
+        with self.encode_lock:
+            with self.cond:
+                frame, seq = self.frame, self.seq
+            if frame is None:
+                return seq, None
+            cached = self.encoded.get(tier)
+            if cached is not None and cached[0] == seq:
+                return cached
+            width, quality = TIERS[tier]
+            if width and frame.shape[1] > width:
+                height = round(frame.shape[0] * width / frame.shape[1])
+                frame = cv2.resize(frame, (width, height), interpolation=cv2.INTER_AREA)
+            ok, encoded = cv2.imencode(".jpg", frame, [cv2.IMWRITE_JPEG_QUALITY, quality])
+            if not ok:
+                return seq, None
+            frames_encoded.inc(tier=tier)
+            self.encoded[tier] = (seq, encoded.tobytes())
+            return self.encoded[tier]
+
+_hubs = {}
+_hubs_lock = threading.Lock()
+
+def stream_hub(camera_index=0):
+    with _hubs_lock:
+        hub = _hubs.get(camera_index)
+        if hub is None:
+            hub = _hubs[camera_index] = StreamHub(camera_index)
+        return hub
+
+# Picks the first tier no wider than the requested width
+def tier_for_width(width):
+    if not width:
+        return 0
+    for i, (tier_width, _) in enumerate(TIERS):
+        if tier_width and tier_width <= width:
+            return i
+    return len(TIERS) - 1
+
+# -----------------------------
+# HTTP Endpoint
+# -----------------------------
+#   /stream/<camera>.mjpg?fps=10&width=640&adaptive=1   multipart MJPEG
+#   /snapshot/<camera>.jpg?width=640                     latest frame
+class _StreamHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        url = urlparse(self.path)
+        params = {k: v[-1] for k, v in parse_qs(url.query).items()}
+        match = re.fullmatch(r"/(stream|snapshot)/(\d+)\.(mjpg|jpg)", url.path)
+        if not match:
+            self.send_error(404)
+            return
+        try:
+            width = int(params.get("width", 0))
+            fps = min(max(float(params.get("fps", DEFAULT_FPS)), 0.1), MAX_FPS)
+        except ValueError:
+            self.send_error(400)
+            return
+        hub = stream_hub(int(match.group(2)))
+        tier = tier_for_width(width)
+        if match.group(1) == "snapshot":
+            self._snapshot(hub, tier)
+        else:
+            self._stream(hub, tier, fps, params.get("adaptive", "1") != "0")
+
+    def _snapshot(self, hub, tier):
+        _, data = hub.jpeg(tier)
+        if data is None:
+            self.send_error(503, "No frame yet")
+            return
+        self.send_response(200)
+        self.send_header("Content-Type", "image/jpeg")
+        self.send_header("Content-Length", str(len(data)))
+        self.send_header("Cache-Control", "no-store")
+        self.end_headers()
+        self.wfile.write(data)
+
+    def _stream(self, hub, tier, fps, adaptive):
+        self.send_response(200)
+        self.send_header("Content-Type", f"multipart/x-mixed-replace; boundary={BOUNDARY}")
+        self.send_header("Cache-Control", "no-store")
+        self.end_headers()
+        interval = 1.0 / fps
+        best_tier = tier
+        fast = 0
+        last_seq = -1
+        with hub.cond:
+            hub.clients += 1
+        try:
+            while True:
+                started = time.monotonic()
+                if hub.wait_newer(last_seq) == last_seq:
+                    continue
+                last_seq, data = hub.jpeg(tier)
+                if data is None:
+                    continue
+                sending = time.monotonic()
+                self.wfile.write(f"--{BOUNDARY}\r\nContent-Type: image/jpeg\r\nContent-Length: {len(data)}\r\n\r\n"
+                                 .encode("ascii") + data + b"\r\n")
+                self.wfile.flush()
+                bytes_sent.inc(len(data))
+                took = time.monotonic() - sending
+                # A slow socket write means the client's link cannot keep up
+                if adaptive:
+                    if took > SLOW_SHARE * interval and tier < len(TIERS) - 1:
+                        tier, fast = tier + 1, 0
+                    elif took < FAST_SHARE * interval and tier > best_tier:
+                        fast += 1
+                        if fast >= FAST_STREAK:
+                            tier, fast = tier - 1, 0
+                    else:
+                        fast = 0
+                # Per-client frame-rate cap
+                remaining = interval - (time.monotonic() - started)
+                if remaining > 0:
+                    time.sleep(remaining)
+        except (BrokenPipeError, ConnectionResetError):
+            pass
+        finally:
+            with hub.cond:
+                hub.clients -= 1
+
+    def log_message(self, *args):
+        pass
+
+class _StreamServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+_server = None
+_server_lock = threading.Lock()
+
+# Process-wide and idempotent, like metrics.start_metrics_server
+def start_stream_server(port=STREAM_PORT, host="0.0.0.0"):
+    global _server
+    with _server_lock:
+        if _server is None:
+            _server = _StreamServer((host, port), _StreamHandler)
+            threading.Thread(target=_server.serve_forever, name="mjpeg-stream", daemon=True).start()
+        return _server
+
+# -----------------------------
+# Dashboard Embed
+# -----------------------------
+# HTML for an <img> showing the stream. Without PIGLYTICS_STREAM_URL the browser
+# builds the URL from the host it loaded the dashboard from.
+def embed_html(camera_index=0, width=640, fps=DEFAULT_FPS, port=STREAM_PORT):
+    path = f"/stream/{camera_index}.mjpg?width={width}&fps={fps}"
+    base = os.environ.get("PIGLYTICS_STREAM_URL")
+    if base:
+        return f'<img src="{base.rstrip("/")}{path}" width="{width}" style="max-width:100%">'
+    return (f'<img id="stream" width="{width}" style="max-width:100%">'
+            f'<script>var loc = window.parent.location;'
+            f'document.getElementById("stream").src = loc.protocol + "//" + loc.hostname + ":{port}{path}";</script>')
@@ -0,0 +1,429 @@
+import argparse
+import heapq
+import sqlite3
+
+from piglet_db import DB_PATH, is_sharded
+
+# -----------------------------
+# Settings
+# -----------------------------
+# Animals are keyed by (sex, id): mother_id points at FemalePiglets.id and
+# father_id at MalePiglets.id. PedigreeClosure stores every (descendant,
+# ancestor) pair up to MAX_DEPTH generations with the shortest path length, so
+# ancestry and descendant lookups are a single indexed range scan.
+MAX_DEPTH = 12
+SEX_TABLES = {"M": "MalePiglets", "F": "FemalePiglets"}
+CLOSURE_INDEX = "CREATE INDEX IF NOT EXISTS idx_closure_ancestor ON PedigreeClosure (ancestor_sex, ancestor_id, depth)"
+
+SCHEMA = [
+    """
+    CREATE VIEW IF NOT EXISTS PedigreeAnimals AS
+        SELECT 'M' AS sex, id, barcode, birth_date, mother_id, father_id, location FROM MalePiglets
+        UNION ALL
+        SELECT 'F' AS sex, id, barcode, birth_date, mother_id, father_id, location FROM FemalePiglets
+    """,
+    """
+    CREATE VIEW IF NOT EXISTS PedigreeLinks AS
+        SELECT sex AS child_sex, id AS child_id, 'F' AS parent_sex, mother_id AS parent_id
+        FROM PedigreeAnimals WHERE mother_id IS NOT NULL
+        UNION ALL
+        SELECT sex, id, 'M', father_id FROM PedigreeAnimals WHERE father_id IS NOT NULL
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS PedigreeClosure (
+        descendant_sex TEXT NOT NULL,
+        descendant_id INTEGER NOT NULL,
+        ancestor_sex TEXT NOT NULL,
+        ancestor_id INTEGER NOT NULL,
+        depth INTEGER NOT NULL,
+        PRIMARY KEY (descendant_sex, descendant_id, ancestor_sex, ancestor_id)
+    ) WITHOUT ROWID
+    """,
+    CLOSURE_INDEX,
+    "CREATE INDEX IF NOT EXISTS idx_male_parents ON MalePiglets (mother_id, father_id, birth_date)",
+    "CREATE INDEX IF NOT EXISTS idx_female_parents ON FemalePiglets (mother_id, father_id, birth_date)",
+    """
+    CREATE TABLE IF NOT EXISTS Inbreeding (
+        sex TEXT NOT NULL,
+        id INTEGER NOT NULL,
+        coefficient REAL NOT NULL,
+        PRIMARY KEY (sex, id)
+    ) WITHOUT ROWID
+    """,
+    # Animals whose mother_id or father_id changed since their closure rows
+    # were written; see _refresh()
+    """
+    CREATE TABLE IF NOT EXISTS PedigreeStale (
+        sex TEXT NOT NULL,
+        id INTEGER NOT NULL,
+        PRIMARY KEY (sex, id)
+    ) WITHOUT ROWID
+    """,
+]
+
+# Closure rows a child gets from one parent: the parent at depth 1 and the
+# parent's own ancestors one generation further. Shared by the insert trigger
+# (NEW.id, NEW.mother_id) and _refresh() (:id, :parent).
+def _link_sql(sex, child, parent_sex, parent):
+    return [f"""
+    INSERT INTO PedigreeClosure (descendant_sex, descendant_id, ancestor_sex, ancestor_id, depth)
+        SELECT '{sex}', {child}, '{parent_sex}', {parent}, 1 WHERE {parent} IS NOT NULL
+        ON CONFLICT (descendant_sex, descendant_id, ancestor_sex, ancestor_id) DO UPDATE SET depth = MIN(depth, excluded.depth)""",
+            f"""
+    INSERT INTO PedigreeClosure (descendant_sex, descendant_id, ancestor_sex, ancestor_id, depth)
+        SELECT '{sex}', {child}, ancestor_sex, ancestor_id, depth + 1 FROM PedigreeClosure
+        WHERE descendant_sex = '{parent_sex}' AND descendant_id = {parent} AND depth < {MAX_DEPTH}
+        ON CONFLICT (descendant_sex, descendant_id, ancestor_sex, ancestor_id) DO UPDATE SET depth = MIN(depth, excluded.depth)"""]
+
+# New animals get their parents' closure rows appended by trigger
+def _insert_trigger(sex, table):
+    links = _link_sql(sex, "NEW.id", "F", "NEW.mother_id") + _link_sql(sex, "NEW.id", "M", "NEW.father_id")
+    return (f"CREATE TRIGGER IF NOT EXISTS {table}_pedigree_insert AFTER INSERT ON {table} BEGIN"
+            f"{';'.join(links)};\nEND")
+
+def _delete_trigger(sex, table):
+    return f"""CREATE TRIGGER IF NOT EXISTS {table}_pedigree_delete AFTER DELETE ON {table} BEGIN
+    DELETE FROM PedigreeClosure WHERE descendant_sex = '{sex}' AND descendant_id = OLD.id;
+    DELETE FROM Inbreeding WHERE sex = '{sex}' AND id = OLD.id;
+END"""
+
+# A changed parent link invalidates the closure of the animal and of all its
+# descendants. Rewriting those inside the UPDATE would stall the writer, so the
+# animal is only marked here; the next pedigree query brings it up to date.
+def _update_trigger(sex, table):
+    return f"""CREATE TRIGGER IF NOT EXISTS {table}_pedigree_update AFTER UPDATE OF mother_id, father_id ON {table}
+    WHEN NEW.mother_id IS NOT OLD.mother_id OR NEW.father_id IS NOT OLD.father_id BEGIN
+    INSERT OR IGNORE INTO PedigreeStale (sex, id) VALUES ('{sex}', NEW.id);
+END"""
+
+# -----------------------------
+# Install / Rebuild
+# -----------------------------
+_installed = set()
+
+# The closure joins parents to children across barns, so it needs the whole
+# herd in one file; sharded storage is refused rather than half indexed
+def install_pedigree(db_path=DB_PATH):
+    if db_path in _installed:
+        return
+    if is_sharded(db_path):
+        raise ValueError(f"{db_path} is a shard directory; the pedigree tools need a single database file")
+    conn = sqlite3.connect(db_path)
+    with conn:
+        for sql in SCHEMA:
+            conn.execute(sql)
+        for sex, table in SEX_TABLES.items():
+            conn.execute(_insert_trigger(sex, table))
+            conn.execute(_delete_trigger(sex, table))
+            conn.execute(_update_trigger(sex, table))
+    empty = conn.execute("SELECT 1 FROM PedigreeClosure LIMIT 1").fetchone() is None
+    has_links = conn.execute("SELECT 1 FROM PedigreeLinks LIMIT 1").fetchone() is not None
+    conn.close()
+    if empty and has_links:
+        rebuild_pedigree(db_path)
+    _installed.add(db_path)
+
+# Breadth-first, one generation per pass: rows found at depth k are never
+# shorter than an existing row, so INSERT OR IGNORE keeps the minimum depth.
+# The ancestor index is dropped for the passes and built once at the end.
+def rebuild_pedigree(db_path=DB_PATH, max_depth=MAX_DEPTH):
+    conn = sqlite3.connect(db_path)
+    with conn:
+        conn.execute("BEGIN IMMEDIATE")
+        conn.execute("DROP TABLE IF EXISTS temp._ped_links")
+        conn.execute("""
+            CREATE TEMP TABLE _ped_links AS SELECT child_sex, child_id, parent_sex, parent_id FROM PedigreeLinks
+        """)
+        conn.execute("CREATE INDEX temp.idx_ped_links ON _ped_links (child_sex, child_id)")
+        conn.execute("DROP INDEX IF EXISTS idx_closure_ancestor")
+        conn.execute("DELETE FROM PedigreeClosure")
+        conn.execute("DELETE FROM PedigreeStale")
+        conn.execute("""
+            INSERT OR IGNORE INTO PedigreeClosure (descendant_sex, descendant_id, ancestor_sex, ancestor_id, depth)
+            SELECT child_sex, child_id, parent_sex, parent_id, 1 FROM _ped_links
+        """)
+        for depth in range(2, max_depth + 1):
+            added = conn.execute("""
+                INSERT OR IGNORE INTO PedigreeClosure (descendant_sex, descendant_id, ancestor_sex, ancestor_id, depth)
+                SELECT c.descendant_sex, c.descendant_id, l.parent_sex, l.parent_id, ?
+                FROM PedigreeClosure c JOIN _ped_links l ON l.child_sex = c.ancestor_sex AND l.child_id = c.ancestor_id
+                WHERE c.depth = ?
+            """, (depth, depth - 1)).rowcount
+            if not added:
+                break
+        conn.execute("DROP TABLE temp._ped_links")
+        conn.execute(CLOSURE_INDEX)
+    conn.close()
+
+# Rewrites the closure rows of every stale animal and of its descendants,
+# parents before children so each copies already-corrected rows from its
+# parents. Their stored F is dropped too; bulk_inbreeding() refills it.
+# Called by the queries below, on their own connection, before they read.
+def _refresh(conn):
+    if conn.execute("SELECT 1 FROM PedigreeStale LIMIT 1").fetchone() is None:
+        return
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        stale = conn.execute("SELECT sex, id FROM PedigreeStale").fetchall()
+        affected = set(stale)
+        for sex, animal_id in stale:
+            affected.update(conn.execute("""
+                SELECT descendant_sex, descendant_id FROM PedigreeClosure WHERE ancestor_sex = ? AND ancestor_id = ?
+            """, (sex, animal_id)).fetchall())
+        rows = {}
+        for sex, animal_id in affected:
+            row = conn.execute(f"SELECT mother_id, father_id FROM {SEX_TABLES[sex]} WHERE id = ?",
+                               (animal_id,)).fetchone()
+            if row is not None:
+                rows[(sex, animal_id)] = row
+        parents = {node: [("M", father) if ("M", father) in rows else None,
+                          ("F", mother) if ("F", mother) in rows else None]
+                   for node, (mother, father) in rows.items()}
+        generation = _generations(parents)
+        for sex, animal_id in sorted(affected, key=lambda node: (generation.get(node, 0), node)):
+            conn.execute("DELETE FROM PedigreeClosure WHERE descendant_sex = ? AND descendant_id = ?", (sex, animal_id))
+            conn.execute("DELETE FROM Inbreeding WHERE sex = ? AND id = ?", (sex, animal_id))
+            if (sex, animal_id) not in rows:
+                continue
+            mother, father = rows[(sex, animal_id)]
+            for parent_sex, parent in (("F", mother), ("M", father)):
+                for sql in _link_sql(sex, ":id", parent_sex, ":parent"):
+                    conn.execute(sql, {"id": animal_id, "parent": parent})
+        conn.execute("DELETE FROM PedigreeStale")
+        conn.commit()
+    except BaseException:
+        conn.rollback()
+        raise
+
+# -----------------------------
+# Query API
+# -----------------------------
+def find_animal(barcode, db_path=DB_PATH):
+    conn = sqlite3.connect(db_path)
+    row = conn.execute("SELECT sex, id FROM PedigreeAnimals WHERE barcode = ?", (barcode,)).fetchone()
+    conn.close()
+    return tuple(row) if row else None
+
+def ancestors(sex, animal_id, max_depth=MAX_DEPTH, db_path=DB_PATH):
+    conn = sqlite3.connect(db_path)
+    _refresh(conn)
+    rows = conn.execute("""
+        SELECT c.ancestor_sex, c.ancestor_id, a.barcode, c.depth FROM PedigreeClosure c
+        LEFT JOIN PedigreeAnimals a ON a.sex = c.ancestor_sex AND a.id = c.ancestor_id
+        WHERE c.descendant_sex = ? AND c.descendant_id = ? AND c.depth <= ?
+        ORDER BY c.depth, c.ancestor_sex, c.ancestor_id
+    """, (sex, animal_id, max_depth)).fetchall()
+    conn.close()
+    return rows
+
+def descendants(sex, animal_id, max_depth=MAX_DEPTH, db_path=DB_PATH):
+    conn = sqlite3.connect(db_path)
+    _refresh(conn)
+    rows = conn.execute("""
+        SELECT c.descendant_sex, c.descendant_id, a.barcode, c.depth FROM PedigreeClosure c
+        LEFT JOIN PedigreeAnimals a ON a.sex = c.descendant_sex AND a.id = c.descendant_id
+        WHERE c.ancestor_sex = ? AND c.ancestor_id = ? AND c.depth <= ?
+        ORDER BY c.depth, c.descendant_sex, c.descendant_id
+    """, (sex, animal_id, max_depth)).fetchall()
+    conn.close()
+    return rows
+
+# Same dam, same sire, same birth date
+def litter_mates(sex, animal_id, db_path=DB_PATH):
+    conn = sqlite3.connect(db_path)
+    row = conn.execute(f"SELECT mother_id, father_id, birth_date FROM {SEX_TABLES[sex]} WHERE id = ?",
+                       (animal_id,)).fetchone()
+    mates = []
+    if row and row[0] is not None and row[1] is not None:
+        for other_sex, table in SEX_TABLES.items():
+            mates += conn.execute(
+                f"SELECT '{other_sex}', id, barcode FROM {table} WHERE mother_id = ? AND father_id = ? AND birth_date IS ?",
+                row).fetchall()
+    conn.close()
+    return [m for m in mates if (m[0], m[1]) != (sex, animal_id)]
+
+def common_ancestors(a, b, db_path=DB_PATH):
+    conn = sqlite3.connect(db_path)
+    _refresh(conn)
+    rows = conn.execute("""
+        SELECT x.ancestor_sex, x.ancestor_id, x.depth, y.depth FROM PedigreeClosure x
+        JOIN PedigreeClosure y ON y.ancestor_sex = x.ancestor_sex AND y.ancestor_id = x.ancestor_id
+        WHERE x.descendant_sex = ? AND x.descendant_id = ? AND y.descendant_sex = ? AND y.descendant_id = ?
+        ORDER BY x.depth + y.depth
+    """, (a[0], a[1], b[0], b[1])).fetchall()
+    conn.close()
+    return rows
+
+# -----------------------------
+# Inbreeding
+# -----------------------------
+# Meuwissen & Luo (1992). Animals are numbered parents first, and F of each
+# comes from tracing only its own ancestors:
+#   F[i] = sum over i and its ancestors j of L[i, j]^2 * D[j] - 1
+# where L halves from child to parent and D[j] = 1/2 - (F[sire] + F[dam]) / 4
+# is j's Mendelian sampling variance. Index 0 stands for an unknown parent
+# with F = -1, which makes a founder's D 1. Nothing is quadratic in the herd.
+def _sub_pedigree(conn, keys, max_depth):
+    _refresh(conn)
+    conn.execute("CREATE TEMP TABLE IF NOT EXISTS _ped_keys (sex TEXT, id INTEGER, PRIMARY KEY (sex, id)) WITHOUT ROWID")
+    conn.execute("DELETE FROM _ped_keys")
+    conn.executemany("INSERT OR IGNORE INTO _ped_keys VALUES (?, ?)", keys)
+    nodes = set(keys)
+    nodes.update(conn.execute("""
+        SELECT c.ancestor_sex, c.ancestor_id FROM _ped_keys k
+        CROSS JOIN PedigreeClosure c ON c.descendant_sex = k.sex AND c.descendant_id = k.id
+        WHERE c.depth <= ?
+    """, (max_depth,)).fetchall())
+    conn.execute("DELETE FROM _ped_keys")
+    conn.executemany("INSERT INTO _ped_keys VALUES (?, ?)", nodes)
+    parents = {node: [None, None] for node in nodes}
+    # CROSS JOIN keeps _ped_keys, which has no statistics, as the outer loop;
+    # the planner would otherwise scan the closure or the herd
+    for sex, table in SEX_TABLES.items():
+        for animal_id, mother, father in conn.execute(f"""
+            SELECT t.id, t.mother_id, t.father_id FROM _ped_keys k CROSS JOIN {table} t ON t.id = k.id WHERE k.sex = ?
+        """, (sex,)):
+            parents[(sex, animal_id)] = [("M", father) if ("M", father) in parents else None,
+                                         ("F", mother) if ("F", mother) in parents else None]
+    return parents
+
+# Every recorded animal and link, with no depth limit
+def _herd_pedigree(conn):
+    rows = conn.execute("SELECT sex, id, mother_id, father_id FROM PedigreeAnimals").fetchall()
+    nodes = {(sex, animal_id) for sex, animal_id, _, _ in rows}
+    return {(sex, animal_id): [("M", father) if ("M", father) in nodes else None,
+                               ("F", mother) if ("F", mother) in nodes else None]
+            for sex, animal_id, mother, father in rows}
+
+def _generations(parents):
+    generation = {}
+    for node in parents:
+        stack = [node]
+        while stack:
+            current = stack[-1]
+            if current in generation:
+                stack.pop()
+                continue
+            pending = [p for p in parents[current] if p is not None and p not in generation]
+            if pending:
+                stack.extend(pending)
+            else:
+                known = [generation[p] for p in parents[current] if p is not None]
+                generation[current] = 1 + max(known) if known else 0
+                stack.pop()
+    return generation
+
+# Returns (index, sires, dams): index maps (sex, id) to 1..n, parents first
+def _number(parents):
+    generation = _generations(parents)
+    order = sorted(parents, key=lambda node: (generation[node], node))
+    index = {node: i + 1 for i, node in enumerate(order)}
+    sires = [0] + [index.get(parents[node][0], 0) for node in order]
+    dams = [0] + [index.get(parents[node][1], 0) for node in order]
+    return index, sires, dams
+
+# F of a (possibly unborn) offspring of sire and dam. Ancestors are expanded
+# highest index first, so all of an ancestor's paths are summed into its L
+# before it passes L on to its own parents.
+def _offspring_inbreeding(sire, dam, sires, dams, F, D):
+    weights = {parent: 0.5 for parent in (sire, dam) if parent}
+    pending = [-parent for parent in weights]
+    heapq.heapify(pending)
+    total = 0.5 - 0.25 * (F[sire] + F[dam])
+    while pending:
+        j = -heapq.heappop(pending)
+        weight = weights.pop(j)
+        total += weight * weight * D[j]
+        for parent in (sires[j], dams[j]):
+            if not parent:
+                continue
+            if parent not in weights:
+                weights[parent] = 0.0
+                heapq.heappush(pending, -parent)
+            weights[parent] += 0.5 * weight
+    return total - 1.0
+
+# F and D for every numbered animal. Full sibs share F, so each litter is
+# traced once.
+def _inbreeding(sires, dams):
+    n = len(sires)
+    F, D = [-1.0] * n, [0.0] * n
+    litters = {}
+    for i in range(1, n):
+        parents = (sires[i], dams[i])
+        if parents in litters:
+            F[i] = litters[parents]
+        else:
+            F[i] = _offspring_inbreeding(*parents, sires, dams, F, D)
+            if all(parents):
+                litters[parents] = F[i]
+        D[i] = 0.5 - 0.25 * (F[parents[0]] + F[parents[1]])
+    return F, D
+
+# Over the given animals' ancestors up to max_depth generations back
+def inbreeding_coefficients(keys, db_path=DB_PATH, max_depth=MAX_DEPTH):
+    keys = [tuple(key) for key in keys]
+    conn = sqlite3.connect(db_path)
+    try:
+        parents = _sub_pedigree(conn, keys, max_depth)
+    finally:
+        conn.close()
+    index, sires, dams = _number(parents)
+    F, _ = _inbreeding(sires, dams)
+    return {key: F[index[key]] for key in keys}
+
+# Expected inbreeding of the offspring of each candidate sire with `dam`
+# (half their relationship), lowest first. One pass numbers every candidate.
+def rank_matings(dam, sires, db_path=DB_PATH, max_depth=MAX_DEPTH):
+    dam, sires = tuple(dam), [tuple(sire) for sire in sires]
+    conn = sqlite3.connect(db_path)
+    try:
+        parents = _sub_pedigree(conn, [dam] + sires, max_depth)
+    finally:
+        conn.close()
+    index, sire_of, dam_of = _number(parents)
+    F, D = _inbreeding(sire_of, dam_of)
+    scores = [_offspring_inbreeding(index[sire], index[dam], sire_of, dam_of, F, D) for sire in sires]
+    return sorted(zip(sires, scores), key=lambda pair: pair[1])
+
+# Stores F for the whole herd in the Inbreeding table. One pass over the full
+# pedigree, so unlike inbreeding_coefficients() it sees every generation.
+def bulk_inbreeding(db_path=DB_PATH):
+    conn = sqlite3.connect(db_path)
+    try:
+        parents = _herd_pedigree(conn)
+        index, sires, dams = _number(parents)
+        F, _ = _inbreeding(sires, dams)
+        with conn:
+            conn.execute("DELETE FROM Inbreeding")
+            conn.executemany("INSERT INTO Inbreeding (sex, id, coefficient) VALUES (?, ?, ?)",
+                             [(sex, animal_id, F[i]) for (sex, animal_id), i in index.items()])
+    finally:
+        conn.close()
+    return len(index)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Pedigree index and inbreeding tools")
+    parser.add_argument("--db", default=DB_PATH)
+    parser.add_argument("--rebuild", action="store_true", help="Rebuild the closure table")
+    parser.add_argument("--inbreeding", action="store_true", help="Recompute inbreeding for the whole herd")
+    parser.add_argument("--barcode", help="Show ancestry for this piglet")
+    args = parser.parse_args()
+
+    try:
+        install_pedigree(args.db)
+    except ValueError as e:
+        parser.error(str(e))
+    if args.rebuild:
+        rebuild_pedigree(args.db)
+    if args.inbreeding:
+        print(f"Inbreeding stored for {bulk_inbreeding(args.db)} animals.")
+    if args.barcode:
+        key = find_animal(args.barcode, args.db)
+        if key is None:
+            print(f"No piglet with barcode {args.barcode}")
+        else:
+            print("Ancestors:", ancestors(*key, db_path=args.db))
+            print("Descendants:", descendants(*key, db_path=args.db))
+            print("Litter mates:", litter_mates(*key, db_path=args.db))
+            print("Inbreeding:", inbreeding_coefficients([key], args.db)[key])
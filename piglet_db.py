@@ -0,0 +1,516 @@
+import glob
+import os
+import re
+import sqlite3
+import threading
+import time
+import zlib
+from concurrent.futures import ThreadPoolExecutor
+import pandas as pd
+
+# -----------------------------
+# Settings
+# -----------------------------
+# PIGLYTICS_SHARD_DIR points every default DB_PATH, and so every process the
+# launcher starts, at sharded storage in that directory (see Sharding)
+SHARD_DIR = os.environ.get("PIGLYTICS_SHARD_DIR")
+DB_PATH = SHARD_DIR or "piglets.db"
+if SHARD_DIR:
+    os.makedirs(SHARD_DIR, exist_ok=True)
+PIGLET_TABLES = ["MalePiglets", "FemalePiglets"]
+
+PIGLET_COLUMNS = ["id", "barcode", "birth_date", "breed", "weight", "health_status", "mother_id", "father_id",
+                  "location", "notes"]
+PIGLET_SCHEMA = """
+CREATE TABLE IF NOT EXISTS {table} (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    barcode TEXT UNIQUE NOT NULL,
+    birth_date DATE,
+    breed TEXT,
+    weight REAL,
+    health_status TEXT,
+    mother_id INTEGER,
+    father_id INTEGER,
+    location TEXT,
+    notes TEXT
+)"""
+
+def piglet_table(gender):
+    return "MalePiglets" if gender.lower() == "male" else "FemalePiglets"
+
+# -----------------------------
+# Sharding
+# -----------------------------
+# Passing a directory instead of a file as db_path selects sharded storage:
+# one database per barn (herd-barn-<n>.db, routed on the barn named in the
+# pig's location), a fixed set of alert shards (alerts-<n>.db, routed on
+# a hash of the barcode so no lookup is needed) and barcodes.db, whose
+# BarcodeIndex maps every barcode to its shard and hands out piglet ids, so
+# barcodes stay unique and mother_id/father_id stay unambiguous across
+# shards. Every shard runs in WAL mode, so writers for different barns no
+# longer queue on one SQLite write lock. Reads fan out to all shards in
+# parallel and are concatenated.
+#
+# Everything that reads or writes the herd takes db_path and routes on it:
+# the scanner (add_piglet), find_piglet, move_piglet and the alert helpers
+# here, and the dashboards, API, reports, analytics, summaries, search,
+# growth forecasts, clip links and the vision pipeline on top of them.
+# Per-barn tables (summaries, search index, HerdChanges, growth) live in each
+# herd shard and are installed on a new shard the first time a reader sees
+# it. HerdChanges versions count per shard, so herd deltas carry one version
+# per shard (see api.py). A pig changes barn only through move_piglet:
+# writing its location directly leaves it in the old shard. pedigree.py still
+# needs a single file. sharding.py splits an existing database and rebuilds
+# the BarcodeIndex.
+SHARD_BARN_PATTERN = re.compile(os.environ.get("PIGLYTICS_SHARD_PATTERN", r"barn\s*(\w+)"), re.IGNORECASE)
+ALERT_SHARDS = int(os.environ.get("PIGLYTICS_ALERT_SHARDS", "4"))
+UNASSIGNED_SHARD = "unassigned"
+SHARD_THREADS = 8
+BARCODE_INDEX = "barcodes.db"
+# Per-pig tables, keyed on barcode, kept in the pig's herd shard
+PER_PIG_TABLES = ["WeightHistory", "GrowthForecast", "GrowthStale", "Scans", "HerdChanges"]
+# What move_piglet carries; GrowthStale and HerdChanges are written by each
+# shard's own triggers as the rows come and go
+MOVED_TABLES = ["WeightHistory", "GrowthForecast", "Scans"]
+
+BARCODE_INDEX_SCHEMA = [
+    """
+    CREATE TABLE IF NOT EXISTS BarcodeIndex (
+        barcode TEXT PRIMARY KEY,
+        table_name TEXT NOT NULL,
+        id INTEGER NOT NULL,
+        shard TEXT NOT NULL,
+        UNIQUE (table_name, id)
+    ) WITHOUT ROWID""",
+    # Last id handed out per piglet table, like sqlite_sequence for one file
+    "CREATE TABLE IF NOT EXISTS IdSequence (table_name TEXT PRIMARY KEY, seq INTEGER NOT NULL) WITHOUT ROWID",
+]
+
+def is_sharded(db_path):
+    return os.path.isdir(db_path)
+
+def shard_key(location):
+    match = SHARD_BARN_PATTERN.search(location or "")
+    return f"barn-{match.group(1).lower()}" if match else UNASSIGNED_SHARD
+
+def alert_bucket(barcode):
+    return zlib.crc32(str(barcode).encode("utf-8")) % ALERT_SHARDS
+
+_ready_shards = set()
+_shards_lock = threading.Lock()
+
+def _init_shard(path, tables, schema=()):
+    with _shards_lock:
+        if path in _ready_shards:
+            return
+        conn = sqlite3.connect(path)
+        conn.execute("PRAGMA journal_mode=WAL")
+        for table in tables:
+            conn.execute(PIGLET_SCHEMA.format(table=table))
+        for sql in schema:
+            conn.execute(sql)
+        conn.commit()
+        conn.close()
+        _ready_shards.add(path)
+
+def herd_shard_path(db_path, key):
+    path = os.path.join(db_path, f"herd-{key}.db")
+    _init_shard(path, PIGLET_TABLES)
+    return path
+
+def herd_shard(db_path, location):
+    return herd_shard_path(db_path, shard_key(location))
+
+def herd_shards(db_path):
+    if not is_sharded(db_path):
+        return [db_path]
+    return sorted(glob.glob(os.path.join(glob.escape(db_path), "herd-*.db")))
+
+def barcode_index(db_path):
+    path = os.path.join(db_path, BARCODE_INDEX)
+    _init_shard(path, [], BARCODE_INDEX_SCHEMA)
+    return path
+
+def alert_shard(db_path, barcode):
+    if not is_sharded(db_path):
+        return db_path
+    return os.path.join(db_path, f"alerts-{alert_bucket(barcode)}.db")
+
+def alert_shards(db_path):
+    if not is_sharded(db_path):
+        return [db_path]
+    return [os.path.join(db_path, f"alerts-{n}.db") for n in range(ALERT_SHARDS)]
+
+# Every database file behind db_path, for per-file jobs such as backups
+def shard_files(db_path):
+    if not is_sharded(db_path):
+        return [db_path]
+    index = os.path.join(db_path, BARCODE_INDEX)
+    return (herd_shards(db_path) + ([index] if os.path.exists(index) else [])
+            + [path for path in alert_shards(db_path) if os.path.exists(path)])
+
+_pool = None
+_readers = threading.local()
+
+# A forked child inherits the pool object but none of its threads, and must
+# not reuse the parent's SQLite connections
+def _reset_after_fork():
+    global _pool, _readers
+    _pool = None
+    _readers = threading.local()
+os.register_at_fork(after_in_child=_reset_after_fork)
+
+# Per-thread read connection to a shard, kept open so point lookups across
+# every shard cost an index probe each rather than a connect
+def _reader(path):
+    conns = _readers.__dict__.setdefault("conns", {})
+    if path not in conns:
+        conns[path] = sqlite3.connect(path)
+        conns[path].row_factory = sqlite3.Row
+    return conns[path]
+
+# sqlite3 releases the GIL while a query runs, so threads read shards in parallel
+def fan_out(func, paths):
+    global _pool
+    if len(paths) <= 1:
+        return [func(path) for path in paths]
+    with _shards_lock:
+        if _pool is None:
+            _pool = ThreadPoolExecutor(max_workers=SHARD_THREADS, thread_name_prefix="shard")
+    return list(_pool.map(func, paths))
+
+# Copies the rows of table matching where from the database attached as
+# "src" into main. A missing table is created from the source's own DDL and
+# indexes, and columns main lacks (clip_path, say) are added first. Returns
+# the rows copied, or None when the source has no such table.
+def copy_rows(conn, table, where="1", params=()):
+    columns = [(row[1], row[2]) for row in conn.execute(f"PRAGMA src.table_info({table})")]
+    if not columns:
+        return None
+    if not conn.execute(f"PRAGMA main.table_info({table})").fetchall():
+        for (sql,) in conn.execute("SELECT sql FROM src.sqlite_master WHERE tbl_name = ? AND sql IS NOT NULL "
+                                   "AND type IN ('table', 'index') ORDER BY type = 'index'", (table,)).fetchall():
+            conn.execute(sql)
+    present = {row[1] for row in conn.execute(f"PRAGMA main.table_info({table})")}
+    for name, decl in columns:
+        if name not in present:
+            conn.execute(f"ALTER TABLE main.{table} ADD COLUMN {name} {decl}")
+    names = ", ".join(name for name, _ in columns)
+    return conn.execute(f"INSERT OR REPLACE INTO main.{table} ({names}) SELECT {names} FROM src.{table} WHERE {where}",
+                        params).rowcount
+
+# -----------------------------
+# Database Helper
+# -----------------------------
+def get_data(table_name, db_path=DB_PATH):
+    if is_sharded(db_path):
+        frames = fan_out(lambda path: get_data(table_name, path), herd_shards(db_path))
+        return pd.concat(frames, ignore_index=True) if frames else pd.DataFrame(columns=PIGLET_COLUMNS)
+    conn = sqlite3.connect(db_path)
+    df = pd.read_sql_query(f"SELECT * FROM {table_name}", conn)
+    conn.close()
+    return df
+
+def get_all_piglets(db_path=DB_PATH):
+    return pd.concat([get_data(t, db_path) for t in PIGLET_TABLES], ignore_index=True)
+
+def _find_in(conn, barcode):
+    for table in PIGLET_TABLES:
+        row = conn.execute(f"SELECT * FROM {table} WHERE barcode = ?", (barcode,)).fetchone()
+        if row is not None:
+            return table, dict(row)
+    return None, None
+
+# Returns (table_name, shard path, row dict) for a barcode in sharded storage,
+# or (None, None, None). BarcodeIndex names the shard; a pig it misses or
+# places wrongly (a move cut short by a crash, say) is still found by asking
+# every shard at once.
+def _locate(barcode, db_path):
+    entry = _reader(barcode_index(db_path)).execute(
+        "SELECT table_name, shard FROM BarcodeIndex WHERE barcode = ?", (barcode,)).fetchone()
+    if entry is not None:
+        path = os.path.join(db_path, entry["shard"])
+        row = _reader(path).execute(f"SELECT * FROM {entry['table_name']} WHERE barcode = ?", (barcode,)).fetchone()
+        if row is not None:
+            return entry["table_name"], path, dict(row)
+    paths = herd_shards(db_path)
+    hits = fan_out(lambda path: _find_in(_reader(path), barcode), paths)
+    return next(((table, path, row) for (table, row), path in zip(hits, paths) if table is not None),
+                (None, None, None))
+
+# Returns (table_name, shard path) for a barcode in sharded storage, or
+# (None, None): where the pig's per-pig rows and changes are written
+def piglet_shard(barcode, db_path=DB_PATH):
+    return _locate(barcode, db_path)[:2]
+
+# Returns (table_name, row dict) for a barcode, or (None, None)
+def find_piglet(barcode, db_path=DB_PATH):
+    if is_sharded(db_path):
+        return _locate(barcode, db_path)[::2]
+    conn = sqlite3.connect(db_path)
+    conn.row_factory = sqlite3.Row
+    try:
+        return _find_in(conn, barcode)
+    finally:
+        conn.close()
+
+def _next_id(index, table):
+    index.execute("INSERT INTO IdSequence VALUES (?, 1) ON CONFLICT (table_name) DO UPDATE SET seq = seq + 1",
+                  (table,))
+    return index.execute("SELECT seq FROM IdSequence WHERE table_name = ?", (table,)).fetchone()[0]
+
+# The barcode is registered in BarcodeIndex, taking its id, in one short write
+# transaction: the first writer of a barcode wins however many race, and the
+# index lock is not held while the barn shard commits. The entry is removed
+# again if the shard insert fails.
+def _add_sharded(table, values, db_path):
+    barcode, location = values[0], values[7]
+    path = herd_shard(db_path, location)
+    index = sqlite3.connect(barcode_index(db_path), isolation_level=None)
+    try:
+        index.execute("BEGIN IMMEDIATE")
+        piglet_id = _next_id(index, table)
+        try:
+            index.execute("INSERT INTO BarcodeIndex VALUES (?, ?, ?, ?)",
+                          (barcode, table, piglet_id, os.path.basename(path)))
+        except sqlite3.IntegrityError:
+            index.execute("ROLLBACK")
+            return False
+        index.execute("COMMIT")
+        conn = sqlite3.connect(path)
+        try:
+            with conn:
+                conn.execute(f"INSERT INTO {table} ({', '.join(PIGLET_COLUMNS)}) "
+                             f"VALUES ({', '.join('?' * len(PIGLET_COLUMNS))})", (piglet_id,) + values)
+            return True
+        except BaseException as e:
+            index.execute("DELETE FROM BarcodeIndex WHERE barcode = ? AND id = ?", (barcode, piglet_id))
+            if isinstance(e, sqlite3.IntegrityError):
+                return False
+            raise
+        finally:
+            conn.close()
+    finally:
+        index.close()
+
+def add_piglet(gender, barcode, birth_date, breed, weight, health_status, mother_id, father_id, location, notes, db_path=DB_PATH):
+    table = piglet_table(gender)
+    if is_sharded(db_path):
+        return _add_sharded(table, (barcode, birth_date, breed, weight, health_status, mother_id, father_id,
+                                    location, notes), db_path)
+    conn = sqlite3.connect(db_path)
+    try:
+        conn.execute(f'''
+        INSERT INTO {table} (barcode, birth_date, breed, weight, health_status, mother_id, father_id, location, notes)
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+        ''', (barcode, birth_date, breed, weight, health_status, mother_id, father_id, location, notes))
+        conn.commit()
+        return True
+    except sqlite3.IntegrityError:
+        return False
+    finally:
+        conn.close()
+
+# Sets a pig's location; returns False for an unknown barcode. In sharded
+# storage a pig whose barn changes is carried, with its MOVED_TABLES rows, to
+# the new barn's shard. The BarcodeIndex write lock is held throughout, so a
+# concurrent add or move of the same barcode waits for it.
+def move_piglet(barcode, location, db_path=DB_PATH):
+    if not is_sharded(db_path):
+        table, piglet = find_piglet(barcode, db_path)
+        if piglet is None:
+            return False
+        conn = sqlite3.connect(db_path)
+        with conn:
+            conn.execute(f"UPDATE {table} SET location = ? WHERE barcode = ?", (location, barcode))
+        conn.close()
+        return True
+    target = herd_shard(db_path, location)
+    index = sqlite3.connect(barcode_index(db_path), isolation_level=None)
+    try:
+        index.execute("BEGIN IMMEDIATE")
+        table, source, _ = _locate(barcode, db_path)
+        if table is None:
+            index.execute("ROLLBACK")
+            return False
+        conn = sqlite3.connect(target)
+        try:
+            with conn:
+                if source != target:
+                    conn.execute("ATTACH DATABASE ? AS src", (source,))
+                    copy_rows(conn, table, "barcode = ?", (barcode,))
+                    for side in MOVED_TABLES:
+                        if copy_rows(conn, side, "barcode = ?", (barcode,)) is not None:
+                            conn.execute(f"DELETE FROM src.{side} WHERE barcode = ?", (barcode,))
+                    conn.execute(f"DELETE FROM src.{table} WHERE barcode = ?", (barcode,))
+                conn.execute(f"UPDATE {table} SET location = ? WHERE barcode = ?", (location, barcode))
+                piglet_id = conn.execute(f"SELECT id FROM {table} WHERE barcode = ?", (barcode,)).fetchone()[0]
+        finally:
+            conn.close()
+        index.execute("INSERT OR REPLACE INTO BarcodeIndex VALUES (?, ?, ?, ?)",
+                      (barcode, table, piglet_id, os.path.basename(target)))
+        index.execute("COMMIT")
+        return True
+    except BaseException:
+        if index.in_transaction:
+            index.execute("ROLLBACK")
+        raise
+    finally:
+        index.close()
+
+# -----------------------------
+# Alert Bookkeeping
+# -----------------------------
+# AlertsSent holds one row per barcode with its current alert state:
+#   open          alerted; re-alerts once REALERT_SECONDS have passed
+#   acknowledged  a farmer has seen it; no re-alerts until resolved
+#   resolved      closed; the next sick reading alerts again
+# Camera-derived pseudo IDs (camera_x_y) get an expires_at TTL since the same
+# box position never identifies the same pig for long. compact_alerts() drops
+# expired rows and old resolved ones, so the table stays bounded, and
+# already_alerted() stays a single primary-key lookup.
+REALERT_SECONDS = float(os.environ.get("PIGLYTICS_REALERT_HOURS", "24")) * 3600
+CAMERA_ALERT_TTL = float(os.environ.get("PIGLYTICS_CAMERA_ALERT_TTL_MINUTES", "60")) * 60
+RESOLVED_RETENTION = float(os.environ.get("PIGLYTICS_ALERT_RETENTION_DAYS", "30")) * 86400
+COMPACT_INTERVAL = 600
+CAMERA_SOURCE = "CameraFeed"
+
+ALERT_COLUMNS = {
+    "state": "TEXT NOT NULL DEFAULT 'open'",
+    "last_alerted_at": "REAL",
+    "alert_count": "INTEGER NOT NULL DEFAULT 1",
+    "expires_at": "REAL",
+    "acknowledged_at": "REAL",
+    "resolved_at": "REAL",
+}
+
+def init_alerts_table(db_path=DB_PATH):
+    if is_sharded(db_path):
+        for path in alert_shards(db_path):
+            _init_shard(path, [])
+            init_alerts_table(path)
+        return
+    conn = sqlite3.connect(db_path)
+    cursor = conn.cursor()
+    cursor.execute("""
+    CREATE TABLE IF NOT EXISTS AlertsSent (
+        barcode TEXT PRIMARY KEY,
+        table_name TEXT,
+        alerted_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    )
+    """)
+    # Older databases only have the first three columns
+    columns = [row[1] for row in cursor.execute("PRAGMA table_info(AlertsSent)")]
+    for name, ddl in ALERT_COLUMNS.items():
+        if name not in columns:
+            cursor.execute(f"ALTER TABLE AlertsSent ADD COLUMN {name} {ddl}")
+    if "last_alerted_at" not in columns:
+        cursor.execute("UPDATE AlertsSent SET last_alerted_at = CAST(strftime('%s', alerted_at) AS REAL)")
+        cursor.execute("UPDATE AlertsSent SET expires_at = last_alerted_at + ? WHERE table_name = ? OR barcode LIKE 'camera\\_%' ESCAPE '\\'",
+                       (CAMERA_ALERT_TTL, CAMERA_SOURCE))
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_alerts_expires ON AlertsSent(expires_at) WHERE expires_at IS NOT NULL")
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_alerts_resolved ON AlertsSent(resolved_at) WHERE state = 'resolved'")
+    conn.commit()
+    conn.close()
+
+def is_camera_alert(barcode, table_name=None):
+    return table_name == CAMERA_SOURCE or str(barcode).startswith("camera_")
+
+def already_alerted(barcode, db_path=DB_PATH, now=None):
+    now = time.time() if now is None else now
+    conn = sqlite3.connect(alert_shard(db_path, barcode))
+    cursor = conn.cursor()
+    cursor.execute("""
+    SELECT 1 FROM AlertsSent
+    WHERE barcode = ?
+      AND (expires_at IS NULL OR expires_at > ?)
+      AND (state = 'acknowledged' OR (state = 'open' AND last_alerted_at > ?))
+    """, (barcode, now, now - REALERT_SECONDS))
+    exists = cursor.fetchone() is not None
+    conn.close()
+    return exists
+
+def mark_alerted(barcode, table_name, db_path=DB_PATH, now=None, ttl=None):
+    now = time.time() if now is None else now
+    if ttl is None and is_camera_alert(barcode, table_name):
+        ttl = CAMERA_ALERT_TTL
+    expires_at = now + ttl if ttl else None
+    conn = sqlite3.connect(alert_shard(db_path, barcode))
+    cursor = conn.cursor()
+    # A re-alert reopens the existing row instead of adding one
+    cursor.execute("""
+    INSERT INTO AlertsSent (barcode, table_name, state, last_alerted_at, alert_count, expires_at)
+    VALUES (?, ?, 'open', ?, 1, ?)
+    ON CONFLICT (barcode) DO UPDATE SET
+        table_name = excluded.table_name,
+        state = 'open',
+        last_alerted_at = excluded.last_alerted_at,
+        alert_count = alert_count + 1,
+        expires_at = excluded.expires_at,
+        acknowledged_at = NULL,
+        resolved_at = NULL
+    """, (barcode, table_name, now, expires_at))
+    conn.commit()
+    conn.close()
+    maybe_compact_alerts(db_path, now)
+
+def _set_alert_state(barcode, state, column, db_path, now):
+    now = time.time() if now is None else now
+    conn = sqlite3.connect(alert_shard(db_path, barcode))
+    cursor = conn.cursor()
+    cursor.execute(f"UPDATE AlertsSent SET state = ?, {column} = ? WHERE barcode = ?", (state, now, barcode))
+    changed = cursor.rowcount > 0
+    conn.commit()
+    conn.close()
+    return changed
+
+def acknowledge_alert(barcode, db_path=DB_PATH, now=None):
+    return _set_alert_state(barcode, "acknowledged", "acknowledged_at", db_path, now)
+
+def resolve_alert(barcode, db_path=DB_PATH, now=None):
+    return _set_alert_state(barcode, "resolved", "resolved_at", db_path, now)
+
+def get_alerts(db_path=DB_PATH, states=("open", "acknowledged")):
+    if is_sharded(db_path):
+        frames = fan_out(lambda path: get_alerts(path, states), alert_shards(db_path))
+        return pd.concat(frames, ignore_index=True).sort_values("last_alerted_at", ascending=False,
+                                                                ignore_index=True)
+    conn = sqlite3.connect(db_path)
+    placeholders = ", ".join("?" for _ in states)
+    df = pd.read_sql_query(f"SELECT * FROM AlertsSent WHERE state IN ({placeholders}) ORDER BY last_alerted_at DESC",
+                           conn, params=list(states))
+    conn.close()
+    return df
+
+# Deletes expired camera entries and resolved alerts past retention; returns rows removed
+def compact_alerts(db_path=DB_PATH, now=None):
+    now = time.time() if now is None else now
+    if is_sharded(db_path):
+        return sum(fan_out(lambda path: compact_alerts(path, now), alert_shards(db_path)))
+    conn = sqlite3.connect(db_path)
+    cursor = conn.cursor()
+    cursor.execute("DELETE FROM AlertsSent WHERE expires_at IS NOT NULL AND expires_at <= ?", (now,))
+    removed = cursor.rowcount
+    cursor.execute("DELETE FROM AlertsSent WHERE state = 'resolved' AND resolved_at <= ?", (now - RESOLVED_RETENTION,))
+    removed += cursor.rowcount
+    conn.commit()
+    conn.close()
+    return removed
+
+_last_compaction = {}
+
+# Process-wide throttle so the alert path compacts at most every COMPACT_INTERVAL
+def maybe_compact_alerts(db_path=DB_PATH, now=None):
+    now = time.time() if now is None else now
+    if now - _last_compaction.get(db_path, 0) < COMPACT_INTERVAL:
+        return 0
+    _last_compaction[db_path] = now
+    return compact_alerts(db_path, now)
+
+# -----------------------------
+# Filters
+# -----------------------------
+def filter_piglets(df, locations=None, health_statuses=None):
+    if locations: df = df[df["location"].isin(locations)]
+    if health_statuses: df = df[df["health_status"].isin(health_statuses)]
+    return df
@@ -0,0 +1,143 @@
+import argparse
+import re
+import sqlite3
+import pandas as pd
+
+from piglet_db import DB_PATH, PIGLET_TABLES, fan_out, herd_shards, is_sharded
+
+# -----------------------------
+# Settings
+# -----------------------------
+# PigletSearch is an FTS5 index over the text fields of both piglet tables.
+# Its rowid encodes the source row (id * 2 + table slot), so triggers can
+# update or delete an entry by rowid without scanning the index. In sharded
+# storage each herd shard indexes its own pigs and a search merges the best
+# hits of every shard by score.
+TABLE_SLOTS = {"MalePiglets": 0, "FemalePiglets": 1}
+INDEXED_COLUMNS = ["barcode", "breed", "location", "health_status", "notes"]
+# bm25 weights in INDEXED_COLUMNS order: a barcode hit outranks a notes hit
+COLUMN_WEIGHTS = [10.0, 2.0, 2.0, 1.5, 1.0]
+
+SEARCH_SCHEMA = f"""
+CREATE VIRTUAL TABLE IF NOT EXISTS PigletSearch USING fts5(
+    {', '.join(INDEXED_COLUMNS)},
+    tokenize = "unicode61 remove_diacritics 2"
+)
+"""
+
+def _rowid(table, id_expr):
+    return f"({id_expr}) * 2 + {TABLE_SLOTS[table]}"
+
+def trigger_sql(table):
+    columns = ", ".join(INDEXED_COLUMNS)
+    new_values = ", ".join(f"NEW.{c}" for c in INDEXED_COLUMNS)
+    return [
+        f"""CREATE TRIGGER IF NOT EXISTS {table}_search_insert AFTER INSERT ON {table} BEGIN
+    INSERT INTO PigletSearch (rowid, {columns}) VALUES ({_rowid(table, 'NEW.id')}, {new_values});
+END""",
+        f"""CREATE TRIGGER IF NOT EXISTS {table}_search_delete AFTER DELETE ON {table} BEGIN
+    DELETE FROM PigletSearch WHERE rowid = {_rowid(table, 'OLD.id')};
+END""",
+        f"""CREATE TRIGGER IF NOT EXISTS {table}_search_update AFTER UPDATE OF {columns} ON {table} BEGIN
+    DELETE FROM PigletSearch WHERE rowid = {_rowid(table, 'OLD.id')};
+    INSERT INTO PigletSearch (rowid, {columns}) VALUES ({_rowid(table, 'NEW.id')}, {new_values});
+END""",
+    ]
+
+# -----------------------------
+# Install / Rebuild
+# -----------------------------
+_installed = set()
+
+def install_search(db_path=DB_PATH):
+    if is_sharded(db_path):
+        for path in herd_shards(db_path):
+            install_search(path)
+        return
+    if db_path in _installed:
+        return
+    conn = sqlite3.connect(db_path)
+    with conn:
+        conn.execute(SEARCH_SCHEMA)
+        for table in PIGLET_TABLES:
+            for sql in trigger_sql(table):
+                conn.execute(sql)
+    empty = conn.execute("SELECT 1 FROM PigletSearch LIMIT 1").fetchone() is None
+    conn.close()
+    if empty:
+        rebuild_search(db_path)
+    _installed.add(db_path)
+
+def rebuild_search(db_path=DB_PATH):
+    if is_sharded(db_path):
+        for path in herd_shards(db_path):
+            rebuild_search(path)
+        return
+    columns = ", ".join(INDEXED_COLUMNS)
+    conn = sqlite3.connect(db_path)
+    with conn:
+        conn.execute("DELETE FROM PigletSearch")
+        for table in PIGLET_TABLES:
+            conn.execute(f"INSERT INTO PigletSearch (rowid, {columns}) SELECT {_rowid(table, 'id')}, {columns} FROM {table}")
+        conn.execute("INSERT INTO PigletSearch (PigletSearch) VALUES ('optimize')")
+    conn.close()
+
+# -----------------------------
+# Search
+# -----------------------------
+# Free text -> FTS5 query: every word must match, the last one as a prefix so
+# the box works while typing. Quoting each token keeps FTS syntax characters
+# in user input from being interpreted.
+def to_match_query(text):
+    tokens = re.findall(r"\w+", text, flags=re.UNICODE)
+    if not tokens:
+        return None
+    quoted = [f'"{t}"' for t in tokens]
+    quoted[-1] += "*"
+    return " ".join(quoted)
+
+def search_piglets(text, limit=100, db_path=DB_PATH):
+    match = to_match_query(text)
+    if match is None:
+        return pd.DataFrame()
+    if is_sharded(db_path):
+        install_search(db_path)
+        frames = [frame for frame in fan_out(lambda path: search_piglets(text, limit, path), herd_shards(db_path))
+                  if not frame.empty]
+        if not frames:
+            return pd.DataFrame()
+        return pd.concat(frames, ignore_index=True).sort_values("score", kind="stable", ignore_index=True).head(limit)
+    weights = ", ".join(str(w) for w in COLUMN_WEIGHTS)
+    selects = []
+    for table in PIGLET_TABLES:
+        slot = TABLE_SLOTS[table]
+        selects.append(f"""
+        SELECT '{table}' AS table_name, p.*, s.score, s.snippet FROM hits s
+        JOIN {table} p ON p.id = s.rowid / 2 WHERE s.rowid % 2 = {slot}""")
+    sql = f"""
+    WITH hits AS (
+        SELECT rowid, bm25(PigletSearch, {weights}) AS score,
+               snippet(PigletSearch, -1, '[', ']', '…', 8) AS snippet
+        FROM PigletSearch WHERE PigletSearch MATCH ? ORDER BY score LIMIT ?
+    )
+    {' UNION ALL '.join(selects)}
+    ORDER BY score
+    """
+    conn = sqlite3.connect(db_path)
+    df = pd.read_sql_query(sql, conn, params=(match, limit))
+    conn.close()
+    return df
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Search piglet notes and metadata")
+    parser.add_argument("query", nargs="?")
+    parser.add_argument("--db", default=DB_PATH)
+    parser.add_argument("--rebuild", action="store_true", help="Rebuild the search index")
+    args = parser.parse_args()
+
+    install_search(args.db)
+    if args.rebuild:
+        rebuild_search(args.db)
+    if args.query:
+        results = search_piglets(args.query, db_path=args.db)
+        print(results[["barcode", "location", "health_status", "snippet"]].to_string(index=False) if not results.empty else "No matches.")
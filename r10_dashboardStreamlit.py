@@ -1,57 +1,42 @@
-import sqlite3
 import pandas as pd
 import streamlit as st
-import plotly.express as px
+import streamlit.components.v1 as components
 import smtplib
 from email.mime.text import MIMEText
-from twilio.rest import Client
 from streamlit_autorefresh import st_autorefresh
-import cv2
-from pyzbar import pyzbar
-from ultralytics import YOLO
-import numpy as np
+import os
+import json
 import time
+from resources import lazy_import
+from piglet_db import (PIGLET_TABLES, get_data, init_alerts_table, already_alerted, mark_alerted, filter_piglets,
+                       get_alerts, acknowledge_alert, resolve_alert)
+from piglet_search import install_search, search_piglets
+from clip_buffer import init_clip_column
+from vision import is_sick
+from camera_monitor import camera_monitor
+from mjpeg_stream import stream_hub, start_stream_server, embed_html
+from growth import install_growth, get_forecasts, TARGET_WEIGHT
+from analytics import analytics_engine
+from reports import PERIODS, latest_report
+import metrics
+
+# -----------------------------
+# Instrumentation
+# -----------------------------
+rerun_start = time.perf_counter()
+metrics.configure_from_env()
+rerun_seconds = metrics.histogram("rerun_seconds", "Dashboard script rerun duration")
+alerts_sent = metrics.counter("alerts_sent_total", "Sick piglet alerts sent")
 
 # -----------------------------
 # Database Helper
 # -----------------------------
-def get_data(table_name):
-    conn = sqlite3.connect("piglets.db")
-    df = pd.read_sql_query(f"SELECT * FROM {table_name}", conn)
-    conn.close()
-    return df
-
-def init_alerts_table():
-    conn = sqlite3.connect("piglets.db")
-    cursor = conn.cursor()
-    cursor.execute("""
-    CREATE TABLE IF NOT EXISTS AlertsSent (
-        barcode TEXT PRIMARY KEY,
-        table_name TEXT,
-        alerted_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-    )
-    """)
-    conn.commit()
-    conn.close()
-
-def already_alerted(barcode):
-    conn = sqlite3.connect("piglets.db")
-    cursor = conn.cursor()
-    cursor.execute("SELECT 1 FROM AlertsSent WHERE barcode=?", (barcode,))
-    exists = cursor.fetchone() is not None
-    conn.close()
-    return exists
-
-def mark_alerted(barcode, table_name):
-    conn = sqlite3.connect("piglets.db")
-    cursor = conn.cursor()
-    cursor.execute("INSERT OR IGNORE INTO AlertsSent (barcode, table_name) VALUES (?, ?)", (barcode, table_name))
-    conn.commit()
-    conn.close()
+get_data = metrics.timed("db_query_seconds", "get_data query latency")(get_data)
 
 # -----------------------------
 # Alert Functions
 # -----------------------------
+@metrics.timed("alert_send_seconds", "Alert delivery latency", channel="email")
 def send_email_alert(piglet_info):
     sender = "your_email@gmail.com"
     password = "your_app_password"
@@ -79,9 +64,11 @@ Notes: {notes_safe}
     except Exception as e:
         st.error(f"❌ Email failed: {e}")
 
+@metrics.timed("alert_send_seconds", "Alert delivery latency", channel="sms")
 def send_sms_alert(piglet_info):
     account_sid = "your_twilio_sid"
     auth_token = "your_twilio_auth_token"
+    Client = lazy_import("twilio.rest").Client
     client = Client(account_sid, auth_token)
     try:
         message = client.messages.create(
@@ -98,6 +85,9 @@ def send_sms_alert(piglet_info):
 # -----------------------------
 st.set_page_config(page_title="Piglets Monitoring Dashboard", layout="wide")
 init_alerts_table()
+install_search()
+init_clip_column()
+install_growth()
 
 # -----------------------------
 # Custom CSS for Colors & Layout
@@ -126,6 +116,70 @@ refresh_interval = st.sidebar.slider("Auto-refresh interval (seconds)", 5, 300,
 auto_refresh_enabled = st.sidebar.checkbox("Enable Auto-Refresh", value=True)
 if auto_refresh_enabled:
     st_autorefresh(interval=refresh_interval * 1000, key="refresh")
+multiprocess_vision = st.sidebar.checkbox("Multi-process vision", value=False,
+                                          help="Run capture, barcode decoding and YOLO in separate processes")
+mjpeg_video = st.sidebar.checkbox("Stream video as MJPEG", value=True,
+                                  help="Encode each annotated frame once and serve it to every viewer")
+stream_width = st.sidebar.select_slider("Stream width", [320, 480, 640, 960], value=640)
+stream_fps = st.sidebar.slider("Stream frame rate", 1, 30, 10)
+view = st.sidebar.radio("View", ["Live", "Reports"], horizontal=True)
+
+# -----------------------------
+# Reports
+# -----------------------------
+# Cohort and breed reports come from the columnar analytics engine, which keeps
+# its own incrementally refreshed copy of the herd; this view stops before the
+# live page loads any tables.
+REPORT_GROUPS = ["breed", "location", "gender", "health_status", "birth_week"]
+REPORT_METRICS = {"pigs": ("barcode", "count"), "adg_kg": ("adg", "mean"), "last_weight": ("last_weight", "mean"),
+                  "sick_rate": ("sick", "mean"), "weighings": ("weighings", "sum")}
+
+if view == "Reports":
+    engine = analytics_engine()
+    st.markdown("<h1 style='color:#2196F3'>📈 Herd Reports</h1>", unsafe_allow_html=True)
+    filters = {}
+    col1, col2, col3 = st.columns(3)
+    report_breeds = col1.multiselect("Breeds", engine.dimensions("breed"))
+    report_locations = col2.multiselect("Locations", engine.dimensions("location"))
+    group_by = col3.multiselect("Group by", REPORT_GROUPS, default=["breed", "location", "birth_week"])
+    if report_breeds:
+        filters["breed"] = report_breeds
+    if report_locations:
+        filters["location"] = report_locations
+
+    st.markdown("<h2 style='color:#2196F3'>🐷 Cohorts</h2>", unsafe_allow_html=True)
+    cohorts = engine.query("piglets", group_by, REPORT_METRICS, filters)
+    st.dataframe(cohorts.round(3), width="stretch", hide_index=True)
+
+    col1, col2 = st.columns(2)
+    with col1:
+        st.markdown("**Average daily gain by birth week (kg/day)**")
+        adg = engine.query("piglets", ["birth_week", "breed"], {"adg_kg": ("adg", "mean")}, filters)
+        if not adg.empty:
+            st.line_chart(adg.pivot(index="birth_week", columns="breed", values="adg_kg"))
+    with col2:
+        st.markdown("**Weekly mean weight, 4-week rolling (kg)**")
+        trend = engine.trend("weight", "breed", freq="W", window=4, filters=filters)
+        if not trend.empty:
+            st.line_chart(trend.pivot(index="period", columns="breed", values="weight_rolling"))
+    st.caption(f"{len(engine.piglets)} pigs, {len(engine.weighings)} weighings; analytics version {engine.version}")
+
+    # Rendered by the reports worker; this only reads the files
+    st.markdown("<h2 style='color:#2196F3'>🗓️ Scheduled Reports</h2>", unsafe_allow_html=True)
+    period = st.radio("Report", list(PERIODS), horizontal=True, format_func=str.capitalize)
+    report, report_html = latest_report(period)
+    if report is None:
+        st.info(f"No {period} report yet; the reports worker renders them in the background.")
+    else:
+        with open(report_html, encoding="utf-8") as f:
+            html_text = f.read()
+        col1, col2 = st.columns(2)
+        col1.download_button("Download HTML", html_text, file_name=os.path.basename(report_html), mime="text/html")
+        col2.download_button("Download JSON", json.dumps(report, indent=2),
+                             file_name=os.path.basename(report_html)[:-len("html")] + "json", mime="application/json")
+        components.html(html_text, height=900, scrolling=True)
+    rerun_seconds.observe(time.perf_counter() - rerun_start)
+    st.stop()
 
 # -----------------------------
 # Load & Filter Data
@@ -133,32 +187,38 @@ if auto_refresh_enabled:
 st.markdown("<h1 style='color:#2196F3'>🐖 Piglytics Monitoring Dashboard</h1>", unsafe_allow_html=True)
 table_name = st.selectbox("Select Piglet Table", ["<All Piglets>", "MalePiglets", "FemalePiglets"], index=0)
 if table_name == "<All Piglets>":
-    df = pd.concat([get_data("MalePiglets"), get_data("FemalePiglets")], ignore_index=True)
+    df = pd.concat([get_data(t) for t in PIGLET_TABLES], ignore_index=True)
 else:
     df = get_data(table_name)
 
+search_text = st.text_input("🔎 Search notes, breed, location or barcode", placeholder="e.g. diarrhea pen 4")
+if search_text:
+    hits = search_piglets(search_text, limit=1000)
+    df = df[df["barcode"].isin(hits["barcode"])] if not hits.empty else df.iloc[0:0]
+
 locations = st.multiselect("Filter by Location", sorted(df["location"].dropna().unique()))
 health_statuses = st.multiselect("Filter by Health Status", sorted(df["health_status"].dropna().unique()))
-if locations: df = df[df["location"].isin(locations)]
-if health_statuses: df = df[df["health_status"].isin(health_statuses)]
+df = filter_piglets(df, locations, health_statuses)
 
 # -----------------------------
 # Session State
 # -----------------------------
 if 'monitoring_active' not in st.session_state: st.session_state.monitoring_active=False
 if 'recent_barcode_alerts' not in st.session_state: st.session_state.recent_barcode_alerts=[]
-if 'cap_camera' not in st.session_state: st.session_state.cap_camera=cv2.VideoCapture(0)
-if 'model' not in st.session_state: st.session_state.model=YOLO("yolov8n.pt")
 
 # -----------------------------
 # Alerts for Sick Piglets
 # -----------------------------
-for piglet in df[df["health_status"]=="Sick"].to_dict("records"):
-    if not already_alerted(piglet["barcode"]):
-        send_email_alert(piglet)
-        send_sms_alert(piglet)
-        mark_alerted(piglet["barcode"], table_name)
-        st.session_state.recent_barcode_alerts.append(piglet)
+# Under launcher.py the alerts worker scans the tables and delivers with the
+# configured credentials; sessions only do it when running on their own.
+if os.environ.get("PIGLYTICS_ALERTS_WORKER") != "1":
+    for piglet in df[df["health_status"]=="Sick"].to_dict("records"):
+        if not already_alerted(piglet["barcode"]):
+            send_email_alert(piglet)
+            send_sms_alert(piglet)
+            mark_alerted(piglet["barcode"], table_name)
+            alerts_sent.inc(source="table")
+            st.session_state.recent_barcode_alerts.append(piglet)
 
 # -----------------------------
 # Dynamic Sidebar Color
@@ -169,37 +229,96 @@ else:
     st.markdown("""<style>.css-1d391kg { background-color: #f0f8ff !important; color: #333333 !important; }</style>""", unsafe_allow_html=True)
 
 # -----------------------------
-# Charts (Flashing Sick Piglets)
+# Charts (Pulsing Sick Piglets)
 # -----------------------------
+# Figures are built from small aggregates and cached on them, so an unchanged
+# herd reuses the same figures on every rerun and the browser only receives
+# per-bar counts instead of every row. Sick bars and slices are always the
+# last trace or slice; the pulse itself is a CSS animation on those elements,
+# so nothing is rebuilt to toggle it. A chart only gets its pulsing container
+# key while it has a Sick series, so no other series ever pulses.
+HEALTH_COLORS = {"Healthy": "#4CAF50", "Sick": "#F44336", "Unknown": "#FFC107"}
+WEIGHT_BINS = 30
+
+st.markdown("""<style>
+@keyframes sick-pulse { from { opacity: 1; } to { opacity: 0.35; } }
+.st-key-breed-chart .barlayer .trace:last-of-type path,
+.st-key-weight-chart .barlayer .trace:last-of-type path,
+.st-key-health-chart-alerting .slice:last-of-type path {
+    animation: sick-pulse 0.5s ease-in-out infinite alternate;
+}
+@keyframes banner-pulse { from { background-color: #ff1744; } to { background-color: #FF5252; } }
+.sick-banner { animation: banner-pulse 0.5s steps(1) infinite alternate; padding:10px; border-radius:5px;
+               color:white; font-weight:bold; }
+</style>""", unsafe_allow_html=True)
+
+@st.cache_data(max_entries=32, show_spinner=False)
+def breed_figure(breeds, total_counts, sick_counts):
+    go = lazy_import("plotly.graph_objects")
+    fig = go.Figure([
+        go.Bar(x=breeds, y=[t - s for t, s in zip(total_counts, sick_counts)], name="Other", marker_color="#90CAF9"),
+        go.Bar(x=breeds, y=sick_counts, name="Sick", marker_color="#D32F2F"),
+    ])
+    fig.update_layout(barmode="stack", title="Breed Distribution (Pulsing Sick)", xaxis_title="breed",
+                      yaxis_title="count")
+    return fig
+
+@st.cache_data(max_entries=32, show_spinner=False)
+def weight_figure(centers, width, counts_by_status):
+    go = lazy_import("plotly.graph_objects")
+    # Sick last so the CSS pulse picks it up
+    statuses = sorted(counts_by_status, key=lambda status: status == "Sick")
+    fig = go.Figure([go.Bar(x=centers, y=counts_by_status[status], width=width, name=status, opacity=0.75,
+                            marker_color=HEALTH_COLORS.get(status, "#9E9E9E")) for status in statuses])
+    fig.update_layout(barmode="overlay", title="Weight Distribution (Pulsing Sick)", xaxis_title="weight",
+                      yaxis_title="count")
+    return fig
+
+@st.cache_data(max_entries=32, show_spinner=False)
+def health_figure(statuses, counts):
+    go = lazy_import("plotly.graph_objects")
+    fig = go.Figure(go.Pie(labels=statuses, values=counts, sort=False,
+                           marker_colors=[HEALTH_COLORS.get(status, "#9E9E9E") for status in statuses]))
+    fig.update_layout(title="Health Status Breakdown")
+    return fig
+
+def weight_histogram(df):
+    np = lazy_import("numpy")
+    weights = pd.to_numeric(df["weight"], errors="coerce")
+    valid = weights.notna()
+    if not valid.any():
+        return (), 1.0, {}
+    edges = np.histogram_bin_edges(weights[valid], bins=WEIGHT_BINS)
+    counts = {status: tuple(int(c) for c in np.histogram(weights[valid & (df["health_status"] == status)], edges)[0])
+              for status in df.loc[valid, "health_status"].dropna().unique()}
+    centers = tuple(float(c) for c in (edges[:-1] + edges[1:]) / 2)
+    return centers, float(edges[1] - edges[0]), counts
+
 st.markdown("<h2 style='color:#2196F3'>📊 Charts Overview</h2>", unsafe_allow_html=True)
 col1, col2, col3 = st.columns(3)
-flash_frame = int(time.time()*2) % 2  # alternates 0/1 every 0.5s
 
 if not df.empty:
-    # Breed chart flashing
-    df_breed = df.copy()
-    df_breed['flash'] = 0
-    df_breed.loc[df_breed['health_status']=='Sick','flash'] = flash_frame
-    breed_colors = {b:"#D32F2F" if df_breed[(df_breed['breed']==b)&(df_breed['flash']==1)].shape[0]>0 else "#90CAF9" for b in df_breed['breed'].unique()}
-    col1.plotly_chart(px.histogram(df_breed, x="breed", color="breed", color_discrete_map=breed_colors,
-                                   title="Breed Distribution (Flashing Sick)"), use_container_width=True)
-
-    # Weight chart flashing
-    df_weight = df.copy()
-    df_weight['flash'] = 0
-    df_weight.loc[df_weight['health_status']=='Sick','flash'] = flash_frame
-    weight_colors = {"Healthy":"#4CAF50","Sick":"#F44336","Unknown":"#FFC107"}
-    if st.session_state.recent_barcode_alerts:
-        weight_colors["Sick"] = "#D32F2F" if flash_frame==1 else "#F44336"
-    col2.plotly_chart(px.histogram(df_weight, x="weight", color="health_status", barmode="overlay",
-                                   color_discrete_map=weight_colors, title="Weight Distribution (Flashing Sick)"),
-                      use_container_width=True)
-
-    # Health Status pie chart
-    color_map={"Healthy":"#4CAF50","Sick":"#F44336","Unknown":"#FFC107"}
-    if st.session_state.recent_barcode_alerts: color_map["Sick"]="#D32F2F" if flash_frame==1 else "#F44336"
-    col3.plotly_chart(px.pie(df, names="health_status", color="health_status", color_discrete_map=color_map,
-                             title="Health Status Breakdown"), use_container_width=True)
+    sick = df["health_status"] == "Sick"
+    breed_totals = df["breed"].value_counts().sort_index()
+    breed_sick = df.loc[sick, "breed"].value_counts().reindex(breed_totals.index, fill_value=0)
+    with col1.container(key="breed-chart" if sick.any() else "breed-chart-static"):
+        st.plotly_chart(breed_figure(tuple(breed_totals.index), tuple(int(c) for c in breed_totals),
+                                     tuple(int(c) for c in breed_sick)), use_container_width=True)
+
+    centers, bin_width, weight_counts = weight_histogram(df)
+    # Only pulse the Sick weights while there are unacknowledged alerts
+    weight_alerting = st.session_state.recent_barcode_alerts and "Sick" in weight_counts
+    weight_key = "weight-chart" if weight_alerting else "weight-chart-static"
+    with col2.container(key=weight_key):
+        st.plotly_chart(weight_figure(centers, bin_width, weight_counts), use_container_width=True)
+
+    status_counts = df["health_status"].value_counts()
+    statuses = sorted(status_counts.index, key=lambda status: status == "Sick")
+    health_alerting = st.session_state.recent_barcode_alerts and "Sick" in status_counts.index
+    health_key = "health-chart-alerting" if health_alerting else "health-chart"
+    with col3.container(key=health_key):
+        st.plotly_chart(health_figure(tuple(statuses), tuple(int(status_counts[s]) for s in statuses)),
+                        use_container_width=True)
 
 # -----------------------------
 # Table Highlighting
@@ -220,15 +339,64 @@ if not df.empty:
 else:
     st.warning("No records found with current filters.")
 
+# -----------------------------
+# Market Weight Forecast
+# -----------------------------
+# Fitted by the ingest worker; the dashboard only reads the forecasts
+forecasts = get_forecasts()
+if not forecasts.empty:
+    st.markdown(f"<h2 style='color:#2196F3'>📈 Market Forecast ({TARGET_WEIGHT:.0f} kg)</h2>", unsafe_allow_html=True)
+    forecasts = forecasts[forecasts["barcode"].isin(df["barcode"])]
+    forecasts["target_date"] = pd.to_datetime(forecasts["target_date"])
+    upcoming = forecasts[forecasts["target_date"] >= pd.Timestamp.today().normalize()]
+    fc1, fc2 = st.columns(2)
+    weekly = upcoming.groupby(upcoming["target_date"].dt.to_period("W").dt.start_time).size()
+    fc1.bar_chart(weekly.rename("pigs reaching market weight"))
+    fc2.dataframe(upcoming.head(50)[["barcode", "last_weight", "target_date", "model"]], width="stretch", hide_index=True)
+
 # -----------------------------
 # Alert Banner Pulsing
 # -----------------------------
 if st.session_state.recent_barcode_alerts:
-    banner_color = "#ff1744" if flash_frame==1 else "#FF5252"
-    st.markdown(f"""<div style="background-color:{banner_color};padding:10px;border-radius:5px;color:white;font-weight:bold">
+    st.markdown(f"""<div class="sick-banner">
         🚨 {len(st.session_state.recent_barcode_alerts)} New Sick Piglet Alert(s)!
     </div>""", unsafe_allow_html=True)
 
+# -----------------------------
+# Open Alerts
+# -----------------------------
+# Acknowledged alerts stay quiet until resolved; resolved pigs alert again
+# the next time they are seen sick.
+with st.sidebar.expander("🔔 Open Alerts"):
+    open_alerts = get_alerts()
+    if open_alerts.empty:
+        st.caption("No open alerts.")
+    else:
+        st.dataframe(open_alerts[["barcode", "state", "alert_count"]], width="stretch", hide_index=True)
+        chosen = st.selectbox("Alert", open_alerts["barcode"], key="alert_choice")
+        ack_col, resolve_col = st.columns(2)
+        if ack_col.button("Acknowledge", key="ack_alert"):
+            acknowledge_alert(chosen)
+            st.rerun()
+        if resolve_col.button("Resolve", key="resolve_alert"):
+            resolve_alert(chosen)
+            st.session_state.recent_barcode_alerts = [a for a in st.session_state.recent_barcode_alerts
+                                                      if a["barcode"] != chosen]
+            st.rerun()
+
+# -----------------------------
+# Performance Panel
+# -----------------------------
+# Recorded here because the monitoring loop below never returns while active
+rerun_seconds.observe(time.perf_counter() - rerun_start)
+if metrics.ENABLED:
+    with st.sidebar.expander("⏱️ Performance"):
+        perf_rows = metrics.performance_rows()
+        if perf_rows:
+            st.dataframe(pd.DataFrame(perf_rows).round(2), width="stretch")
+        else:
+            st.caption("No measurements yet.")
+
 # -----------------------------
 # Camera Monitoring
 # -----------------------------
@@ -240,57 +408,69 @@ with col1:
 with col2:
     if st.button("🛑 Stop Monitoring", key="stop"):
         st.session_state.monitoring_active=False
-        if st.session_state.cap_camera: st.session_state.cap_camera.release()
 
 camera_display=st.empty()
+camera_status=st.empty()
 alert_panel=st.empty()
 
-def process_frame(frame):
-    alerts=[]
-    if frame is None: return frame, alerts
-    for barcode in pyzbar.decode(frame):
-        x, y, w, h = barcode.rect
+# Drawn by the camera monitor thread: no st.* calls in here
+def draw_detections(frame, barcodes, fused, labels):
+    cv2 = lazy_import("cv2")
+    for data, (x, y, w, h) in barcodes:
         cv2.rectangle(frame,(x,y),(x+w,y+h),(0,255,0),2)
-        data = barcode.data.decode("utf-8")
         cv2.putText(frame,data,(x,y-10),cv2.FONT_HERSHEY_SIMPLEX,0.5,(0,255,0),2)
-        if not already_alerted(data):
-            record=df[df["barcode"]==data].to_dict("records")
-            if record:
-                send_email_alert(record[0])
-                send_sms_alert(record[0])
-                mark_alerted(data, table_name)
-                alerts.append(record[0])
-    try:
-        results=st.session_state.model(frame)
-        if results:
-            for box, cls_id, conf in zip(results[0].boxes.xyxy, results[0].boxes.cls, results[0].boxes.conf):
-                x1,y1,x2,y2=map(int,box)
-                color=(0,0,255) if time.time()%1>0.5 else (0,100,255)
-                label=f"Sick ({conf:.2f})" if cls_id==1 and conf>0.5 else f"Healthy ({conf:.2f})"
-                cv2.rectangle(frame,(x1,y1),(x2,y2),color,2)
-                cv2.putText(frame,label,(x1,y1-10),cv2.FONT_HERSHEY_SIMPLEX,0.5,color,2)
-                if cls_id==1 and conf>0.5:
-                    pig_id=f"camera_{x1}_{y1}"
-                    if not already_alerted(pig_id):
-                        info={"barcode":pig_id,"breed":"Unknown","weight":"Unknown","location":"Camera Area","health_status":"Sick","notes":""}
-                        send_email_alert(info)
-                        send_sms_alert(info)
-                        mark_alerted(pig_id,"CameraFeed")
-                        alerts.append(info)
-    except Exception as e:
-        st.error(f"YOLO prediction failed: {e}")
-    return frame, alerts
-
-if st.session_state.monitoring_active:
-    while st.session_state.monitoring_active:
-        ret, frame = st.session_state.cap_camera.read()
-        if not ret or frame is None:
-            st.warning("⚠️ Unable to read from camera.")
-            time.sleep(0.1)
-            continue
-        annotated_frame, alerts = process_frame(frame)
-        camera_display.image(annotated_frame, channels="BGR")
-        if alerts:
-            st.session_state.recent_barcode_alerts.extend(alerts)
-            alert_panel.table(pd.DataFrame(st.session_state.recent_barcode_alerts))
-        time.sleep(0.01)
+    for (detection, _), barcode in zip(fused, labels):
+        x1,y1,x2,y2,cls_id,conf=detection
+        color=(0,0,255) if time.time()%1>0.5 else (0,100,255)
+        label=f"Sick ({conf:.2f})" if is_sick(detection) else f"Healthy ({conf:.2f})"
+        if barcode:
+            label=f"{barcode} {label}"
+        cv2.rectangle(frame,(x1,y1),(x2,y2),color,2)
+        cv2.putText(frame,label,(x1,y1-10),cv2.FONT_HERSHEY_SIMPLEX,0.5,color,2)
+    return frame
+
+# Under launcher.py with the vision worker, that worker already watches the
+# camera, raises alerts and serves the annotated stream for every process.
+# Otherwise this process's camera monitor does, once for all its sessions.
+vision_worker = os.environ.get("PIGLYTICS_VISION_WORKER") == "1"
+
+if st.session_state.monitoring_active and (vision_worker or mjpeg_video):
+    if not vision_worker:
+        try:
+            start_stream_server()
+        except OSError:
+            pass  # another process already serves the stream port
+    # The browser pulls frames straight from the stream endpoint at its own
+    # rate, so the Streamlit websocket carries only this one <img> tag.
+    with camera_display.container():
+        components.html(embed_html(0, stream_width, stream_fps), height=round(stream_width * 3 / 4) + 10)
+
+if st.session_state.monitoring_active and not vision_worker:
+    # The first session to start monitoring picks multi-process or in-process
+    # vision for everyone; the last to stop releases the camera.
+    with camera_monitor(0, weights="yolov8n.pt", multiprocess=multiprocess_vision, draw=draw_detections) as monitor:
+        hub = stream_hub(0)
+        last_frame = 0
+        seen_alerts = monitor.alert_total
+        while st.session_state.monitoring_active:
+            if mjpeg_video:
+                time.sleep(0.5)
+            else:
+                last_frame = hub.wait_newer(last_frame, timeout=0.5)
+                if hub.frame is not None:
+                    camera_display.image(hub.frame, channels="BGR")
+            if monitor.error:
+                camera_status.error(f"❌ Camera monitoring stopped: {monitor.error}")
+                st.session_state.monitoring_active = False
+                break
+            # One status element, updated in place, however long the camera is
+            # down. Writing it every pass also lets Streamlit stop this run
+            # when the user presses Stop, as a loop with no st.* call can't be.
+            if monitor.status:
+                camera_status.warning(f"⚠️ {monitor.status}")
+            else:
+                camera_status.empty()
+            seen_alerts, alerts = monitor.recent_alerts(seen_alerts)
+            if alerts:
+                st.session_state.recent_barcode_alerts.extend(alerts)
+                alert_panel.table(pd.DataFrame(st.session_state.recent_barcode_alerts))
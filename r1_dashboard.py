@@ -6,6 +6,8 @@ import plotly.express as px
 import smtplib
 from email.mime.text import MIMEText
 from twilio.rest import Client
+from piglet_search import install_search, search_piglets
+from piglet_db import init_alerts_table, already_alerted, mark_alerted
 
 # -----------------------------
 # Database Helper
@@ -16,34 +18,6 @@ def get_data(table_name):
     conn.close()
     return df
 
-def init_alerts_table():
-    conn = sqlite3.connect("piglets.db")
-    cursor = conn.cursor()
-    cursor.execute("""
-    CREATE TABLE IF NOT EXISTS AlertsSent (
-        barcode TEXT PRIMARY KEY,
-        table_name TEXT,
-        alerted_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-    )
-    """)
-    conn.commit()
-    conn.close()
-
-def already_alerted(barcode):
-    conn = sqlite3.connect("piglets.db")
-    cursor = conn.cursor()
-    cursor.execute("SELECT 1 FROM AlertsSent WHERE barcode=?", (barcode,))
-    exists = cursor.fetchone() is not None
-    conn.close()
-    return exists
-
-def mark_alerted(barcode, table_name):
-    conn = sqlite3.connect("piglets.db")
-    cursor = conn.cursor()
-    cursor.execute("INSERT OR IGNORE INTO AlertsSent (barcode, table_name) VALUES (?, ?)", (barcode, table_name))
-    conn.commit()
-    conn.close()
-
 # -----------------------------
 # Alert Functions
 # -----------------------------
@@ -96,6 +70,7 @@ def send_sms_alert(piglet_info):
 # Dashboard App
 # -----------------------------
 init_alerts_table()
+install_search()
 app = Dash(__name__, external_stylesheets=[dbc.themes.BOOTSTRAP])
 
 app.layout = dbc.Container([
@@ -123,6 +98,16 @@ app.layout = dbc.Container([
             placeholder="Filter by Health Status",
             multi=True
         ), md=4),
+    ], className="mb-2"),
+
+    dbc.Row([
+        dbc.Col(dcc.Input(
+            id="search-box",
+            type="search",
+            placeholder="🔎 Search notes, breed, location or barcode (e.g. diarrhea pen 4)",
+            debounce=True,
+            style={"width": "100%"}
+        ), md=12),
     ], className="mb-4"),
 
     dbc.Row([
@@ -176,11 +161,18 @@ def update_filters(table_name):
      Output("records-table", "columns")],
     [Input("table-selector", "value"),
      Input("location-filter", "value"),
-     Input("health-filter", "value")]
+     Input("health-filter", "value"),
+     Input("search-box", "value")]
 )
-def update_dashboard(table_name, locations, health_statuses):
+def update_dashboard(table_name, locations, health_statuses, search_text):
     df = get_data(table_name)
 
+    # Full-text search narrows the table before the dropdown filters
+    if search_text:
+        hits = search_piglets(search_text, limit=1000)
+        matched = hits[hits["table_name"] == table_name]["barcode"] if not hits.empty else []
+        df = df[df["barcode"].isin(matched)]
+
     # Apply filters
     if locations:
         df = df[df["location"].isin(locations)]
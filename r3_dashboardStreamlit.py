@@ -1,52 +1,21 @@
-import sqlite3
+import os
 import pandas as pd
 import streamlit as st
+import streamlit.components.v1 as components
 import plotly.express as px
 import smtplib
 from email.mime.text import MIMEText
-from twilio.rest import Client
 from streamlit_autorefresh import st_autorefresh
-import cv2
-from pyzbar import pyzbar
-from ultralytics import YOLO
-import numpy as np
+from resources import lazy_import, resource_manager
+from piglet_db import PIGLET_TABLES, get_data, init_alerts_table, already_alerted, mark_alerted, filter_piglets
+from summary_tables import install_summary, get_kpis, get_breakdown
+from piglet_search import install_search, search_piglets
+from camera_monitor import camera_monitor
+from mjpeg_stream import embed_html, stream_hub
 
-# -----------------------------
-# Database Helper
-# -----------------------------
-def get_data(table_name):
-    conn = sqlite3.connect("piglets.db")
-    df = pd.read_sql_query(f"SELECT * FROM {table_name}", conn)
-    conn.close()
-    return df
-
-def init_alerts_table():
-    conn = sqlite3.connect("piglets.db")
-    cursor = conn.cursor()
-    cursor.execute("""
-    CREATE TABLE IF NOT EXISTS AlertsSent (
-        barcode TEXT PRIMARY KEY,
-        table_name TEXT,
-        alerted_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-    )
-    """)
-    conn.commit()
-    conn.close()
-
-def already_alerted(barcode):
-    conn = sqlite3.connect("piglets.db")
-    cursor = conn.cursor()
-    cursor.execute("SELECT 1 FROM AlertsSent WHERE barcode=?", (barcode,))
-    exists = cursor.fetchone() is not None
-    conn.close()
-    return exists
-
-def mark_alerted(barcode, table_name):
-    conn = sqlite3.connect("piglets.db")
-    cursor = conn.cursor()
-    cursor.execute("INSERT OR IGNORE INTO AlertsSent (barcode, table_name) VALUES (?, ?)", (barcode, table_name))
-    conn.commit()
-    conn.close()
+# Under launcher.py these workers own the alert scan and the camera
+alerts_worker = os.environ.get("PIGLYTICS_ALERTS_WORKER") == "1"
+vision_worker = os.environ.get("PIGLYTICS_VISION_WORKER") == "1"
 
 # -----------------------------
 # Alert Functions
@@ -85,6 +54,7 @@ Notes: {notes_safe}
 def send_sms_alert(piglet_info):
     account_sid = "your_twilio_sid"
     auth_token = "your_twilio_auth_token"
+    Client = lazy_import("twilio.rest").Client
     client = Client(account_sid, auth_token)
 
     try:
@@ -102,6 +72,8 @@ def send_sms_alert(piglet_info):
 # -----------------------------
 st.set_page_config(page_title="Piglets Monitoring Dashboard", layout="wide")
 init_alerts_table()
+install_summary()
+install_search()
 
 # Sidebar
 st.sidebar.header("Dashboard Settings")
@@ -116,33 +88,52 @@ st.title("🐖 Piglets Monitoring Dashboard")
 # Table selection
 table_name = st.selectbox("Select Piglet Table", ["<All Piglets>", "MalePiglets", "FemalePiglets"], index=0)
 
+# Header KPIs (read from the summary table, no table scan)
+kpis = get_kpis(table_name=table_name)
+kpi1, kpi2, kpi3 = st.columns(3)
+kpi1.metric("🐷 Piglets", kpis["piglets"])
+kpi2.metric("🤒 Sick", kpis["sick"])
+kpi3.metric("⚠️ Alerts", kpis["alerts"])
+
 # Load data
 if table_name == "<All Piglets>":
-    df = pd.concat([get_data("MalePiglets"), get_data("FemalePiglets")], ignore_index=True)
+    df = pd.concat([get_data(t) for t in PIGLET_TABLES], ignore_index=True)
 else:
     df = get_data(table_name)
 
 # Filters
+search_text = st.text_input("🔎 Search notes, breed, location or barcode", placeholder="e.g. diarrhea pen 4")
+if search_text:
+    hits = search_piglets(search_text, limit=1000)
+    df = df[df["barcode"].isin(hits["barcode"])] if not hits.empty else df.iloc[0:0]
+
 locations = st.multiselect("Filter by Location", sorted(df["location"].dropna().unique()))
 health_statuses = st.multiselect("Filter by Health Status", sorted(df["health_status"].dropna().unique()))
-if locations: df = df[df["location"].isin(locations)]
-if health_statuses: df = df[df["health_status"].isin(health_statuses)]
+df = filter_piglets(df, locations, health_statuses)
 
 # Alerts for sick piglets from table
-for piglet in df[df["health_status"]=="Sick"].to_dict("records"):
-    if not already_alerted(piglet["barcode"]):
-        send_email_alert(piglet)
-        send_sms_alert(piglet)
-        mark_alerted(piglet["barcode"], table_name)
+if not alerts_worker:
+    for piglet in df[df["health_status"]=="Sick"].to_dict("records"):
+        if not already_alerted(piglet["barcode"]):
+            send_email_alert(piglet)
+            send_sms_alert(piglet)
+            mark_alerted(piglet["barcode"], table_name)
 
 # -----------------------------
 # Charts
 # -----------------------------
 col1, col2, col3 = st.columns(3)
 if not df.empty:
-    col1.plotly_chart(px.histogram(df, x="breed", title="Breed Distribution"), width="stretch")
+    if locations or health_statuses or search_text:
+        col1.plotly_chart(px.histogram(df, x="breed", title="Breed Distribution"), width="stretch")
+        col3.plotly_chart(px.pie(df, names="health_status", title="Health Status Breakdown"), width="stretch")
+    else:
+        # Unfiltered breakdowns are precomputed
+        breed_df = pd.DataFrame(get_breakdown("breed", table_name=table_name), columns=["breed", "count"])
+        health_df = pd.DataFrame(get_breakdown("health_status", table_name=table_name), columns=["health_status", "count"])
+        col1.plotly_chart(px.bar(breed_df, x="breed", y="count", title="Breed Distribution"), width="stretch")
+        col3.plotly_chart(px.pie(health_df, names="health_status", values="count", title="Health Status Breakdown"), width="stretch")
     col2.plotly_chart(px.histogram(df, x="weight", nbins=10, title="Weight Distribution (kg)"), width="stretch")
-    col3.plotly_chart(px.pie(df, names="health_status", title="Health Status Breakdown"), width="stretch")
 
 # Top 5 heaviest
 st.subheader("🏋️ Top 5 Heaviest Piglets")
@@ -165,61 +156,60 @@ else:
 # -----------------------------
 # Real-time Barcode Scanner
 # -----------------------------
-st.subheader("📹 Live Barcode Monitoring")
-barcode_frame = st.image([])
-cap_barcode = cv2.VideoCapture(0)
-if st.button("Start Barcode Scanner"):
-    for _ in range(200):
-        ret, frame = cap_barcode.read()
-        if not ret: break
-        for barcode in pyzbar.decode(frame):
-            x,y,w,h = barcode.rect
-            cv2.rectangle(frame,(x,y),(x+w,y+h),(0,255,0),2)
-            data = barcode.data.decode("utf-8")
-            cv2.putText(frame,data,(x,y-10),cv2.FONT_HERSHEY_SIMPLEX,0.5,(0,255,0),2)
-            if not already_alerted(data):
-                record = df[df["barcode"]==data].to_dict("records")
-                if record:
-                    send_email_alert(record[0])
-                    send_sms_alert(record[0])
-                    mark_alerted(data, table_name)
-        barcode_frame.image(frame, channels="BGR")
+# With the vision worker running, its annotated stream (tags, detections and
+# alerts) replaces both camera loops below
+if vision_worker:
+    st.subheader("📹 Live Monitoring")
+    components.html(embed_html(0), height=490)
+else:
+    st.subheader("📹 Live Barcode Monitoring")
+    barcode_frame = st.image([])
+    if st.button("Start Barcode Scanner"):
+        cv2 = lazy_import("cv2")
+        pyzbar = lazy_import("pyzbar.pyzbar")
+        with resource_manager().subscribe_camera(0) as cap_barcode:
+            for _ in range(200):
+                ret, frame = cap_barcode.read()
+                if not ret: break
+                frame = frame.copy()
+                for barcode in pyzbar.decode(frame):
+                    x,y,w,h = barcode.rect
+                    cv2.rectangle(frame,(x,y),(x+w,y+h),(0,255,0),2)
+                    data = barcode.data.decode("utf-8")
+                    cv2.putText(frame,data,(x,y-10),cv2.FONT_HERSHEY_SIMPLEX,0.5,(0,255,0),2)
+                    if not already_alerted(data):
+                        record = df[df["barcode"]==data].to_dict("records")
+                        if record:
+                            send_email_alert(record[0])
+                            send_sms_alert(record[0])
+                            mark_alerted(data, table_name)
+                barcode_frame.image(frame, channels="BGR")
 
 # -----------------------------
 # YOLOv8 Visual Detection with Health Overlay
 # -----------------------------
-st.subheader("📹 Live Visual Piglet Monitoring (Object Detection)")
-visual_frame = st.image([])
-model = YOLO("yolov8n.pt")  # replace with custom model for health status
-cap_yolo = cv2.VideoCapture(0)
-alert_panel = st.empty()  # panel to show live alerts
-
-recent_alerts = []
-
-if st.button("Start Visual Monitoring"):
-    for _ in range(200):
-        ret, frame = cap_yolo.read()
-        if not ret: break
-        results = model(frame)
-        annotated_frame = frame.copy()
-        for box, cls_id, conf in zip(results[0].boxes.xyxy, results[0].boxes.cls, results[0].boxes.conf):
-            x1,y1,x2,y2 = map(int,box)
-            if cls_id == 1 and conf>0.5:  # sick piglet class
-                color = (0,0,255)  # red
-                label = f"Sick ({conf:.2f})"
-                pig_id = f"camera_{x1}_{y1}"
-                if not already_alerted(pig_id):
-                    info = {"barcode": pig_id,"breed":"Unknown","weight":"Unknown","location":"Camera Area","health_status":"Sick","notes":""}
-                    send_email_alert(info)
-                    send_sms_alert(info)
-                    mark_alerted(pig_id,"CameraFeed")
-                    recent_alerts.append(info)
-            else:
-                color = (0,255,0)
-                label = f"Healthy ({conf:.2f})"
-            cv2.rectangle(annotated_frame,(x1,y1),(x2,y2),color,2)
-            cv2.putText(annotated_frame,label,(x1,y1-10),cv2.FONT_HERSHEY_SIMPLEX,0.5,color,2)
-        visual_frame.image(annotated_frame, channels="BGR")
-        if recent_alerts:
-            alert_panel.table(pd.DataFrame(recent_alerts))
-            
+if not vision_worker:
+    st.subheader("📹 Live Visual Piglet Monitoring (Object Detection)")
+    visual_frame = st.image([])
+    alert_panel = st.empty()  # panel to show live alerts
+
+    recent_alerts = []
+
+    if st.button("Start Visual Monitoring"):
+        # This process's camera monitor runs detection and alerts once for
+        # every session; this one shows what it publishes
+        with camera_monitor(0) as monitor:
+            hub = stream_hub(0)
+            last_frame = 0
+            seen_alerts = monitor.alert_total
+            for _ in range(200):
+                last_frame = hub.wait_newer(last_frame, timeout=1.0)
+                if monitor.error:
+                    st.error(f"❌ Camera monitoring stopped: {monitor.error}")
+                    break
+                if hub.frame is not None:
+                    visual_frame.image(hub.frame, channels="BGR")
+                seen_alerts, alerts = monitor.recent_alerts(seen_alerts)
+                recent_alerts.extend(alerts)
+                if recent_alerts:
+                    alert_panel.table(pd.DataFrame(recent_alerts))
@@ -0,0 +1,192 @@
+import os
+import sqlite3
+import tempfile
+import time
+
+from api import install_api, apply_scans
+from backup import online_copy
+from events import FRAME, SCAN, SENSOR, KIND_NAMES, EventRecorder, merge_events, recorded_logs
+from fusion import BarcodeFusion, PigletCache, frame_alerts
+from piglet_db import DB_PATH, init_alerts_table, already_alerted, mark_alerted
+from sensors import SensorProcessor
+from vision import decode_barcodes
+
+# -----------------------------
+# Replay
+# -----------------------------
+# Feeds a recorded event log through the same stages as production: frames go
+# through barcode decoding, detection, fusion and frame_alerts; scans through
+# api.apply_scans; sensor readings through a SensorProcessor. It runs against a
+# scratch copy of the database, and alerts are only marked there, never sent.
+#
+# speed is a multiple of the recorded rate (1, 10, ...) or 0 for as fast as
+# possible. Alert latency runs from when an event was due to when its alert was
+# decided, so it includes any time the replay spent falling behind schedule.
+def percentile(values, q):
+    if not values:
+        return None
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(q * (len(ordered) - 1))))]
+
+class Replayer:
+    def __init__(self, db_path, detector=None):
+        self.db_path = db_path
+        self.detector = detector
+        init_alerts_table(db_path)
+        install_api(db_path)
+        self.conn = sqlite3.connect(db_path)
+        self.fusions = {}
+        self.cache = PigletCache(db_path)
+        self.processor = SensorProcessor()
+        self.processor.listeners.append(self._sensor_alert)
+        self.counts = {name: 0 for name in KIND_NAMES.values()}
+        self.latencies = {"barcode": [], "camera": [], "scan": [], "sensor": []}
+        self.due = 0.0
+        self.max_lag = 0.0
+
+    def _alerted(self, source):
+        self.latencies[source].append(time.perf_counter() - self.due)
+
+    def _sensor_alert(self, alert):
+        self._alerted("sensor")
+
+    def _frame(self, camera_index, frame):
+        fusion = self.fusions.get(camera_index)
+        if fusion is None:
+            fusion = self.fusions[camera_index] = BarcodeFusion(camera_index, self.db_path, self.cache)
+        barcodes = decode_barcodes(frame)
+        detections = self.detector.detect(frame) if self.detector is not None else []
+        fused = fusion.update(barcodes, detections)
+        tagged = {data for data, _ in barcodes}
+        for piglet, table in frame_alerts(fusion, barcodes, fused, self.db_path):
+            mark_alerted(piglet["barcode"], table, self.db_path)
+            self._alerted("barcode" if piglet["barcode"] in tagged else "camera")
+
+    # A scan that marks a pig sick alerts straight away, as the alerts worker
+    # would on its next table scan
+    def _scan(self, scan):
+        with self.conn:
+            results = apply_scans(self.conn, [scan], scan.get("device"))
+        if results[0]["status"] in ("applied", "created") and scan.get("health_status") == "Sick":
+            if not already_alerted(scan["barcode"], self.db_path):
+                table = self.cache.get(scan["barcode"])[0]
+                mark_alerted(scan["barcode"], table, self.db_path)
+                self._alerted("scan")
+
+    # log_path is one log, or a PIGLYTICS_RECORD path whose per-process logs
+    # are replayed together in timestamp order
+    def run(self, log_path, speed=1.0, limit=None):
+        paths = recorded_logs(log_path)
+        if not paths:
+            raise FileNotFoundError(f"No event logs recorded for {log_path}")
+        start = time.perf_counter()
+        first = None
+        for n, (stamp, kind, payload) in enumerate(merge_events(paths)):
+            if limit is not None and n >= limit:
+                break
+            first = stamp if first is None else first
+            self.due = start + (stamp - first) / speed if speed else time.perf_counter()
+            wait = self.due - time.perf_counter()
+            if wait > 0:
+                time.sleep(wait)
+            else:
+                self.max_lag = max(self.max_lag, -wait)
+            if kind == FRAME:
+                self._frame(*payload)
+            elif kind == SCAN:
+                self._scan(payload)
+            elif kind == SENSOR:
+                # Recorded timestamps keep the windows and rates in recorded time
+                self.processor.ingest(*payload, stamp=stamp)
+            self.counts[KIND_NAMES[kind]] += 1
+        return self.report(time.perf_counter() - start)
+
+    def report(self, seconds):
+        events = sum(self.counts.values())
+        report = {"seconds": seconds, "events": events, "events_per_s": events / seconds if seconds else None,
+                  "frames_per_s": self.counts["frame"] / seconds if seconds else None, "counts": self.counts,
+                  "max_lag_s": self.max_lag, "alerts": {}}
+        for source, values in self.latencies.items():
+            if values:
+                report["alerts"][source] = {"count": len(values), "p50_ms": percentile(values, 0.5) * 1000,
+                                            "p95_ms": percentile(values, 0.95) * 1000,
+                                            "max_ms": max(values) * 1000}
+        return report
+
+    def close(self):
+        self.conn.close()
+
+def replay(log_path, db_path=DB_PATH, speed=1.0, weights=None, limit=None, keep_db=None):
+    scratch = keep_db or os.path.join(tempfile.mkdtemp(prefix="piglytics-replay-"), "replay.db")
+    online_copy(db_path, scratch)
+    detector = None
+    if weights:
+        from detectors import create_detector
+        detector = create_detector(weights)
+    replayer = Replayer(scratch, detector)
+    try:
+        return replayer.run(log_path, speed, limit)
+    finally:
+        replayer.close()
+        if keep_db is None:
+            os.remove(scratch)
+            os.rmdir(os.path.dirname(scratch))
+
+# -----------------------------
+# Synthetic Logs
+# -----------------------------
+# Builds a log from the benchmark herd generator (tagged frames at fps), scans
+# and simulated barn sensors, for load testing without a camera
+def synthesize(log_path, db_path=DB_PATH, seconds=60, fps=10, barns=6, scans_per_minute=30, seed=7):
+    import random
+    from benchmarks.herd_generator import generate_frames
+
+    rng = random.Random(seed)
+    conn = sqlite3.connect(db_path)
+    barcodes = [row[0] for row in conn.execute("SELECT barcode FROM MalePiglets UNION ALL SELECT barcode FROM FemalePiglets "
+                                               "LIMIT 500")]
+    conn.close()
+    recorder = EventRecorder(log_path, max_fps=0)
+    start = time.time()
+    frames = generate_frames(barcodes, int(seconds * fps), seed=seed)
+    scan_every = 60.0 / scans_per_minute if scans_per_minute else None
+    next_scan = 0.0
+    for i, (frame, _) in enumerate(frames):
+        t = i / fps
+        recorder.frame(frame, start + t)
+        if i % fps == 0:
+            for barn in range(1, barns + 1):
+                recorder.sensor(barn, "temperature", 24 + barn * 0.3 + rng.gauss(0, 0.3) + (8 if t > seconds * 0.8 else 0),
+                                start + t)
+                recorder.sensor(barn, "humidity", 68 + rng.gauss(0, 1.0), start + t)
+        if scan_every and t >= next_scan:
+            recorder.scan({"scan_id": f"synthetic-{i}", "barcode": rng.choice(barcodes), "scanned_at": start + t,
+                           "weight": round(rng.uniform(5, 110), 1),
+                           "health_status": "Sick" if rng.random() < 0.1 else "Healthy"}, start + t)
+            next_scan += scan_every
+    recorder.close()
+    return recorder.events
+
+if __name__ == "__main__":
+    import argparse
+    import json
+
+    parser = argparse.ArgumentParser(description="Replay recorded camera, scan and sensor events")
+    parser.add_argument("--db", default=DB_PATH, help="Database to copy as the replay's starting state")
+    commands = parser.add_subparsers(dest="command", required=True)
+    run = commands.add_parser("run", help="Replay a log and report throughput and alert latency")
+    run.add_argument("log", help="An event log, or the PIGLYTICS_RECORD path to replay every process's log")
+    run.add_argument("--speed", type=float, default=1.0, help="1, 10, ... times real time; 0 for max speed")
+    run.add_argument("--weights", help="Detector weights; without them only barcodes are processed")
+    run.add_argument("--limit", type=int)
+    run.add_argument("--keep-db", help="Keep the replayed database at this path")
+    synth = commands.add_parser("synthesize", help="Write a synthetic log from the herd generator")
+    synth.add_argument("log")
+    synth.add_argument("--seconds", type=int, default=60)
+    synth.add_argument("--fps", type=int, default=10)
+    args = parser.parse_args()
+
+    if args.command == "run":
+        print(json.dumps(replay(args.log, args.db, args.speed, args.weights, args.limit, args.keep_db), indent=2))
+    else:
+        print(f"Wrote {synthesize(args.log, args.db, args.seconds, args.fps)} events to {args.log}")
@@ -0,0 +1,233 @@
+import glob
+import html
+import json
+import os
+import sqlite3
+import time
+from datetime import date, datetime, timedelta
+
+import pandas as pd
+
+from analytics import analytics_engine
+from changes import install_changes
+from growth import get_forecasts, install_growth
+from piglet_db import DB_PATH, alert_shards, fan_out, herd_shards, init_alerts_table, is_sharded
+
+# -----------------------------
+# Settings
+# -----------------------------
+# Daily and weekly herd reports, rendered by the reports worker (workers.py)
+# into REPORT_DIR as <period>-<start date>.html/.json. A report is re-rendered
+# only when the data fingerprint changes, and at most every RENDER_INTERVAL,
+# so dashboards and the API just read the newest files.
+REPORT_DIR = os.environ.get("PIGLYTICS_REPORT_DIR", "reports")
+PERIODS = {"daily": 1, "weekly": 7}
+RENDER_INTERVAL = int(os.environ.get("PIGLYTICS_REPORT_MINUTES", "5")) * 60
+TOP_HEAVIEST = 5
+MAX_ALERT_ROWS = 50
+MARKET_ROWS = 20
+TOP_COLUMNS = ["barcode", "breed", "weight", "location", "health_status"]
+
+# -----------------------------
+# Data Fingerprint
+# -----------------------------
+# Changes whenever a report input changes: the herd (HerdChanges version),
+# weighings, alert states and growth forecasts. Every part is an indexed
+# lookup or a scan of a small table. In sharded storage it joins the herd
+# parts of every herd shard and the alert part of every alert shard.
+HERD_PARTS = ["(SELECT IFNULL(MAX(version), 0) FROM HerdChanges)",
+              "(SELECT IFNULL(MAX(rowid), 0) || '.' || COUNT(*) FROM WeightHistory)",
+              "(SELECT COUNT(*) || '.' || IFNULL(MAX(fitted_at), 0) FROM GrowthForecast)"]
+ALERT_PART = """(SELECT COUNT(*) || '.' || IFNULL(MAX(MAX(IFNULL(last_alerted_at, 0), IFNULL(acknowledged_at, 0),
+                                                 IFNULL(resolved_at, 0))), 0) FROM AlertsSent)"""
+
+def _parts(path, parts):
+    conn = sqlite3.connect(path)
+    try:
+        return "-".join(str(part) for part in conn.execute(f"SELECT {', '.join(parts)}").fetchone())
+    finally:
+        conn.close()
+
+def data_version(db_path=DB_PATH):
+    if not is_sharded(db_path):
+        return _parts(db_path, HERD_PARTS[:2] + [ALERT_PART] + HERD_PARTS[2:])
+    # A barn shard created since the last call gets its change and growth tables
+    install_changes(db_path)
+    install_growth(db_path)
+    herd = fan_out(lambda path: _parts(path, HERD_PARTS), herd_shards(db_path))
+    alerts = fan_out(lambda path: _parts(path, [ALERT_PART]), alert_shards(db_path))
+    return ",".join(herd) + "/" + ",".join(alerts)
+
+def period_start(period, today=None):
+    today = today or date.today()
+    return today - timedelta(days=today.weekday()) if period == "weekly" else today
+
+# -----------------------------
+# Report Contents
+# -----------------------------
+def _records(frame):
+    frame = frame.astype(object).where(frame.notna(), None)
+    return [{k: (v.isoformat() if isinstance(v, (pd.Timestamp, datetime, date)) else v) for k, v in row.items()}
+            for row in frame.to_dict("records")]
+
+# Alert states touched since `since`, and the alerts raised since, of one
+# database or alert shard
+def _alert_rows(path, since):
+    conn = sqlite3.connect(path)
+    try:
+        counts = conn.execute("""
+        SELECT state, COUNT(*) FROM AlertsSent
+        WHERE MAX(IFNULL(last_alerted_at, 0), IFNULL(acknowledged_at, 0), IFNULL(resolved_at, 0)) >= ?
+        GROUP BY state""", (since,)).fetchall()
+        alerts = pd.read_sql_query("""
+        SELECT barcode, table_name, state, alert_count, datetime(last_alerted_at, 'unixepoch', 'localtime') AS last_alerted
+        FROM AlertsSent WHERE last_alerted_at >= ? ORDER BY last_alerted_at DESC LIMIT ?""",
+                                   conn, params=(since, MAX_ALERT_ROWS))
+        return counts, alerts
+    finally:
+        conn.close()
+
+def build_report(period, db_path=DB_PATH, today=None):
+    start = period_start(period, today)
+    end = start + timedelta(days=PERIODS[period])
+    init_alerts_table(db_path)
+    engine = analytics_engine(db_path)
+    engine.refresh(force=True)
+    version = data_version(db_path)
+    since = time.mktime(start.timetuple())
+    alert_counts = {}
+    recent = []
+    for counts, frame in fan_out(lambda path: _alert_rows(path, since), alert_shards(db_path)):
+        for state, count in counts:
+            alert_counts[state] = alert_counts.get(state, 0) + count
+        recent.append(frame)
+    alerts = pd.concat(recent, ignore_index=True).sort_values("last_alerted", ascending=False, kind="stable") \
+        .head(MAX_ALERT_ROWS)
+
+    piglets = engine.piglets
+    weighings = engine.weighings
+    in_period = weighings[weighings["weighed_on"] >= pd.Timestamp(start)]
+    health = engine.query("piglets", ["health_status"], {"pigs": ("barcode", "count"),
+                                                         "mean_weight": ("weight", "mean")})
+    growth = engine.query("piglets", ["breed"], {"pigs": ("barcode", "count"), "adg_kg": ("adg", "mean"),
+                                                 "last_weight": ("last_weight", "mean")})
+    market = get_forecasts(db_path, within_days=PERIODS[period])
+    market = market[["barcode", "target_date", "last_weight", "daily_gain", "model"]].head(MARKET_ROWS) \
+        if not market.empty else market
+    return {
+        "period": period,
+        "start": start.isoformat(),
+        "end": end.isoformat(),
+        "generated_at": time.time(),
+        "data_version": version,
+        "herd": {"pigs": len(piglets), "sick": int((piglets["health_status"] == "Sick").sum()),
+                 "mean_weight": None if piglets.empty else float(piglets["weight"].mean())},
+        "health": _records(health.round(2)),
+        "top_heaviest": _records(piglets.nlargest(TOP_HEAVIEST, "weight")[TOP_COLUMNS]),
+        "alerts": {"raised": int(alert_counts.get("open", 0)), "acknowledged": int(alert_counts.get("acknowledged", 0)),
+                   "resolved": int(alert_counts.get("resolved", 0)), "recent": _records(alerts)},
+        "growth": {"weighings": len(in_period), "pigs_weighed": int(in_period["barcode"].nunique()),
+                   "by_breed": _records(growth.round(3)), "market_ready": _records(market)},
+    }
+
+# -----------------------------
+# HTML Rendering
+# -----------------------------
+def _table(rows):
+    if not rows:
+        return "<p class='empty'>None</p>"
+    head = "".join(f"<th>{html.escape(str(column))}</th>" for column in rows[0])
+    body = "".join("<tr>" + "".join(f"<td>{html.escape('' if v is None else str(v))}</td>" for v in row.values())
+                   + "</tr>" for row in rows)
+    return f"<table><thead><tr>{head}</tr></thead><tbody>{body}</tbody></table>"
+
+def render_html(report):
+    herd, alerts, growth = report["herd"], report["alerts"], report["growth"]
+    title = f"Piglytics {report['period']} report, {report['start']}"
+    generated = datetime.fromtimestamp(report["generated_at"]).strftime("%Y-%m-%d %H:%M")
+    mean_weight = "n/a" if herd["mean_weight"] is None else f"{herd['mean_weight']:.1f} kg"
+    return f"""<!DOCTYPE html>
+<html><head><meta charset="utf-8"><title>{html.escape(title)}</title>
+<style>
+body {{ font-family: sans-serif; margin: 24px; color: #333; }}
+h1 {{ color: #2196F3; }} h2 {{ color: #FF5722; margin-top: 28px; }}
+table {{ border-collapse: collapse; }} th, td {{ border: 1px solid #ddd; padding: 4px 10px; text-align: left; }}
+th {{ background: #f0f8ff; }} .empty {{ color: #999; }}
+</style></head><body>
+<h1>🐖 {html.escape(title)}</h1>
+<p>{report['start']} to {report['end']} · generated {generated} · data version {html.escape(report['data_version'])}</p>
+<p><b>{herd['pigs']}</b> pigs · <b>{herd['sick']}</b> sick · mean weight {mean_weight}</p>
+<h2>Health Breakdown</h2>{_table(report['health'])}
+<h2>Top {TOP_HEAVIEST} Heaviest</h2>{_table(report['top_heaviest'])}
+<h2>Alerts</h2>
+<p>{alerts['raised']} open · {alerts['acknowledged']} acknowledged · {alerts['resolved']} resolved</p>
+{_table(alerts['recent'])}
+<h2>Growth</h2>
+<p>{growth['weighings']} weighings of {growth['pigs_weighed']} pigs this period</p>
+{_table(growth['by_breed'])}
+<h2>Reaching Market Weight</h2>{_table(growth['market_ready'])}
+</body></html>
+"""
+
+# -----------------------------
+# Cache
+# -----------------------------
+def report_path(period, start, report_dir=REPORT_DIR, ext="json"):
+    return os.path.join(report_dir, f"{period}-{start}.{ext}")
+
+def _write(path, text):
+    with open(path + ".tmp", "w", encoding="utf-8") as f:
+        f.write(text)
+    os.replace(path + ".tmp", path)
+
+def _load(path):
+    try:
+        with open(path, encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+# Returns (report, rendered). The cached report is kept while the data version
+# matches, or while it is younger than RENDER_INTERVAL.
+def render(period, db_path=DB_PATH, report_dir=REPORT_DIR, force=False, today=None):
+    start = period_start(period, today).isoformat()
+    cached = _load(report_path(period, start, report_dir))
+    if cached is not None and not force:
+        if time.time() - cached["generated_at"] < RENDER_INTERVAL:
+            return cached, False
+        if data_version(db_path) == cached["data_version"]:
+            return cached, False
+    report = build_report(period, db_path, today)
+    os.makedirs(report_dir, exist_ok=True)
+    # HTML first: a JSON file present means its HTML is too
+    _write(report_path(period, start, report_dir, "html"), render_html(report))
+    _write(report_path(period, start, report_dir), json.dumps(report, separators=(",", ":")))
+    return report, True
+
+def render_due(db_path=DB_PATH, report_dir=REPORT_DIR):
+    return [period for period in PERIODS if render(period, db_path, report_dir)[1]]
+
+# Newest rendered report of a period as (report, html_path), or (None, None);
+# just file reads, for dashboards and the API
+def latest_report(period, report_dir=REPORT_DIR):
+    paths = sorted(glob.glob(os.path.join(glob.escape(report_dir), f"{period}-*.json")))
+    report = _load(paths[-1]) if paths else None
+    if report is None:
+        return None, None
+    return report, paths[-1][:-len("json")] + "html"
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Render daily and weekly herd reports")
+    parser.add_argument("--db", default=DB_PATH)
+    parser.add_argument("--dir", default=REPORT_DIR)
+    parser.add_argument("--period", choices=sorted(PERIODS), action="append")
+    parser.add_argument("--force", action="store_true", help="Render even if the data is unchanged")
+    args = parser.parse_args()
+
+    for period in args.period or PERIODS:
+        started = time.perf_counter()
+        report, rendered = render(period, args.db, args.dir, args.force)
+        state = f"rendered in {time.perf_counter() - started:.2f}s" if rendered else "up to date"
+        print(f"{period}: {report_path(period, report['start'], args.dir, 'html')} {state}")
@@ -0,0 +1,240 @@
+import importlib
+import threading
+import time
+
+# -----------------------------
+# Lazy Imports
+# -----------------------------
+# Heavy dependencies (cv2, ultralytics, pyzbar, twilio) are only imported the
+# first time a dashboard actually needs them, so a plain page load never pays
+# for them.
+def lazy_import(name):
+    return importlib.import_module(name)
+
+# -----------------------------
+# Shared Model
+# -----------------------------
+# One loaded detector per weight file, built by detectors.create_detector so the
+# configured backend (ultralytics or ONNX Runtime) is used. Inference is
+# serialised with a lock because neither predictor is safe to call from several
+# sessions at once.
+class SharedModel:
+    def __init__(self, weights):
+        from detectors import create_detector
+        self.weights = weights
+        self.detector = create_detector(weights)
+        self.lock = threading.Lock()
+
+    def detect(self, frame):
+        with self.lock:
+            return self.detector.detect(frame)
+
+# -----------------------------
+# Camera Feed
+# -----------------------------
+# One capture per device. A reader thread grabs frames and publishes the latest
+# one; every subscriber sees the same frame object, so adding viewers does not
+# add frame buffers. Subscribers must copy a frame before drawing on it.
+class CameraFeed:
+    def __init__(self, index, listeners=()):
+        self.index = index
+        self.listeners = listeners
+        self.cap = None
+        self.frame = None
+        self.seq = 0
+        self.running = False
+        self.thread = None
+        self.cond = threading.Condition()
+
+    def start(self):
+        cv2 = lazy_import("cv2")
+        self.cap = cv2.VideoCapture(self.index)
+        self.running = True
+        self.thread = threading.Thread(target=self._run, name=f"camera-{self.index}", daemon=True)
+        self.thread.start()
+
+    def _run(self):
+        while self.running:
+            ret, frame = self.cap.read()
+            with self.cond:
+                self.frame = frame if ret else None
+                self.seq += 1
+                self.cond.notify_all()
+            if not ret:
+                time.sleep(0.1)
+                continue
+            # Listeners run on the reader thread and must return quickly
+            stamp = time.time()
+            for listener in self.listeners:
+                try:
+                    listener(frame, stamp)
+                except Exception:
+                    pass
+
+    def read(self, last_seq, timeout=1.0):
+        with self.cond:
+            self.cond.wait_for(lambda: self.seq != last_seq or not self.running, timeout)
+            return self.seq, self.frame
+
+    def stop(self):
+        self.running = False
+        with self.cond:
+            self.cond.notify_all()
+        if self.thread is not None:
+            self.thread.join(timeout=2)
+        if self.cap is not None:
+            self.cap.release()
+
+class CameraSubscription:
+    def __init__(self, manager, index, feed):
+        self.manager = manager
+        self.index = index
+        self.feed = feed
+        self.last_seq = 0
+        self.closed = False
+
+    # Same contract as cv2.VideoCapture.read(): (ret, frame)
+    def read(self, timeout=1.0):
+        seq, frame = self.feed.read(self.last_seq, timeout)
+        if seq == self.last_seq:
+            return False, None
+        self.last_seq = seq
+        return frame is not None, frame
+
+    def close(self):
+        if not self.closed:
+            self.closed = True
+            self.manager.unsubscribe_camera(self.index)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+# -----------------------------
+# Resource Manager
+# -----------------------------
+# Process-wide singleton with reference counting. Module globals live for the
+# whole Streamlit server process, so every rerun and browser session shares the
+# same models and captures. When the last user lets go, the resource is freed
+# after `idle_timeout` seconds unless someone picks it up again.
+class ResourceManager:
+    _instance = None
+    _instance_lock = threading.Lock()
+
+    def __init__(self, idle_timeout=30.0):
+        self.idle_timeout = idle_timeout
+        self.lock = threading.Lock()
+        self.models = {}
+        self.model_refs = {}
+        self.cameras = {}
+        self.camera_refs = {}
+        self.frame_listeners = {}
+        self.idle_since = {}
+
+    @classmethod
+    def instance(cls):
+        with cls._instance_lock:
+            if cls._instance is None:
+                cls._instance = cls()
+            return cls._instance
+
+    # ---------- Models ----------
+    def acquire_model(self, weights="yolov8n.pt"):
+        with self.lock:
+            model = self.models.get(weights)
+            if model is None:
+                model = SharedModel(weights)
+                self.models[weights] = model
+            self.model_refs[weights] = self.model_refs.get(weights, 0) + 1
+            self.idle_since.pop(("model", weights), None)
+            return model
+
+    def release_model(self, weights="yolov8n.pt"):
+        with self.lock:
+            refs = self.model_refs.get(weights, 0) - 1
+            self.model_refs[weights] = max(refs, 0)
+            if refs <= 0:
+                self.idle_since[("model", weights)] = time.monotonic()
+        self._schedule_reap()
+
+    def lease_model(self, weights="yolov8n.pt"):
+        return ModelLease(self, weights)
+
+    # ---------- Cameras ----------
+    def subscribe_camera(self, index=0):
+        with self.lock:
+            feed = self.cameras.get(index)
+            if feed is None:
+                feed = CameraFeed(index, self.frame_listeners.setdefault(index, []))
+                feed.start()
+                self.cameras[index] = feed
+            self.camera_refs[index] = self.camera_refs.get(index, 0) + 1
+            self.idle_since.pop(("camera", index), None)
+            return CameraSubscription(self, index, feed)
+
+    # Called with (frame, timestamp) for every frame read from the device,
+    # once per camera no matter how many sessions are watching
+    def add_frame_listener(self, index, listener):
+        with self.lock:
+            listeners = self.frame_listeners.setdefault(index, [])
+            if listener not in listeners:
+                listeners.append(listener)
+
+    def unsubscribe_camera(self, index=0):
+        with self.lock:
+            refs = self.camera_refs.get(index, 0) - 1
+            self.camera_refs[index] = max(refs, 0)
+            if refs <= 0:
+                self.idle_since[("camera", index)] = time.monotonic()
+        self._schedule_reap()
+
+    # ---------- Idle Release ----------
+    def _schedule_reap(self):
+        timer = threading.Timer(self.idle_timeout, self.reap_idle)
+        timer.daemon = True
+        timer.start()
+
+    def reap_idle(self, now=None):
+        now = time.monotonic() if now is None else now
+        released = []
+        with self.lock:
+            for key, since in list(self.idle_since.items()):
+                if now - since < self.idle_timeout:
+                    continue
+                kind, name = key
+                del self.idle_since[key]
+                if kind == "model" and self.model_refs.get(name, 0) == 0:
+                    self.models.pop(name, None)
+                    self.model_refs.pop(name, None)
+                elif kind == "camera" and self.camera_refs.get(name, 0) == 0:
+                    feed = self.cameras.pop(name, None)
+                    self.camera_refs.pop(name, None)
+                    if feed is not None:
+                        released.append(feed)
+        # Joining the reader thread happens outside the lock
+        for feed in released:
+            feed.stop()
+
+    def stats(self):
+        with self.lock:
+            return {
+                "models": dict(self.model_refs),
+                "cameras": dict(self.camera_refs),
+                "idle": len(self.idle_since),
+            }
+
+class ModelLease:
+    def __init__(self, manager, weights):
+        self.manager = manager
+        self.weights = weights
+
+    def __enter__(self):
+        return self.manager.acquire_model(self.weights)
+
+    def __exit__(self, *exc):
+        self.manager.release_model(self.weights)
+
+def resource_manager():
+    return ResourceManager.instance()
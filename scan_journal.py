@@ -0,0 +1,260 @@
+import gzip
+import json
+import os
+import socket
+import sqlite3
+import threading
+import time
+import urllib.error
+import urllib.request
+import uuid
+
+# -----------------------------
+# Settings
+# -----------------------------
+# Offline-first scanning: every scan is committed to a local SQLite journal
+# first and pushed to the central API (api.py) whenever the link is up.
+JOURNAL_PATH = os.environ.get("PIGLYTICS_SCAN_JOURNAL", "scan_journal.db")
+API_URL = os.environ.get("PIGLYTICS_API_URL")          # e.g. http://barn-server:8095
+API_TOKEN = os.environ.get("PIGLYTICS_API_TOKEN")
+SYNC_BATCH = 500
+SYNC_TIMEOUT = 20
+SYNC_INTERVAL = 30
+MAX_BACKOFF = 600
+MAX_SCAN_ATTEMPTS = 5       # server errors on one scan before it is set aside as rejected
+
+# -----------------------------
+# Local Journal
+# -----------------------------
+# Journal   append-only scans; synced_at stays NULL until the server has them,
+#           or has rejected them (status "invalid" or "rejected")
+# HerdCache the central herd as of the last sync, for lookups while offline
+# SyncState device id and the herd version the cache is at
+class ScanJournal:
+    def __init__(self, path=JOURNAL_PATH):
+        self.path = path
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.lock = threading.Lock()
+        with self.conn:
+            # A scan is only acknowledged once it is on disk
+            self.conn.execute("PRAGMA journal_mode=WAL")
+            self.conn.execute("PRAGMA synchronous=FULL")
+            self.conn.execute("""
+            CREATE TABLE IF NOT EXISTS Journal (
+                seq INTEGER PRIMARY KEY AUTOINCREMENT,
+                scan_id TEXT UNIQUE NOT NULL,
+                barcode TEXT NOT NULL,
+                scanned_at REAL NOT NULL,
+                payload TEXT NOT NULL,
+                synced_at REAL,
+                status TEXT
+            )""")
+            if "attempts" not in {row[1] for row in self.conn.execute("PRAGMA table_info(Journal)")}:
+                self.conn.execute("ALTER TABLE Journal ADD COLUMN attempts INTEGER NOT NULL DEFAULT 0")
+            self.conn.execute("CREATE INDEX IF NOT EXISTS idx_journal_pending ON Journal(seq) WHERE synced_at IS NULL")
+            self.conn.execute("CREATE INDEX IF NOT EXISTS idx_journal_barcode ON Journal(barcode, scanned_at)")
+            self.conn.execute("CREATE TABLE IF NOT EXISTS HerdCache (barcode TEXT PRIMARY KEY, record TEXT NOT NULL) WITHOUT ROWID")
+            self.conn.execute("CREATE TABLE IF NOT EXISTS SyncState (key TEXT PRIMARY KEY, value TEXT) WITHOUT ROWID")
+            self.conn.execute("INSERT OR IGNORE INTO SyncState VALUES ('device', ?)", (f"{socket.gethostname()}-{uuid.uuid4().hex[:6]}",))
+            self.conn.execute("INSERT OR IGNORE INTO SyncState VALUES ('herd_version', '0')")
+
+    def _state(self, key):
+        with self.lock:
+            return self.conn.execute("SELECT value FROM SyncState WHERE key = ?", (key,)).fetchone()[0]
+
+    @property
+    def device(self):
+        return self._state("device")
+
+    # Returns the scan as stored, with its scan_id and scanned_at filled in
+    def record(self, barcode, **fields):
+        scan = {k: v for k, v in fields.items() if v is not None}
+        scan.update(barcode=barcode, scan_id=scan.get("scan_id") or f"{self.device}-{uuid.uuid4().hex}",
+                    scanned_at=scan.get("scanned_at") or time.time())
+        with self.lock, self.conn:
+            self.conn.execute("INSERT INTO Journal (scan_id, barcode, scanned_at, payload) VALUES (?, ?, ?, ?)",
+                              (scan["scan_id"], barcode, scan["scanned_at"], json.dumps(scan, separators=(",", ":"))))
+        return scan
+
+    def pending(self, limit=SYNC_BATCH):
+        with self.lock:
+            rows = self.conn.execute("SELECT payload FROM Journal WHERE synced_at IS NULL ORDER BY seq LIMIT ?",
+                                     (limit,)).fetchall()
+        return [json.loads(payload) for (payload,) in rows]
+
+    def pending_count(self):
+        with self.lock:
+            return self.conn.execute("SELECT COUNT(*) FROM Journal WHERE synced_at IS NULL").fetchone()[0]
+
+    def rejected_count(self):
+        with self.lock:
+            return self.conn.execute("SELECT COUNT(*) FROM Journal WHERE status IN ('invalid', 'rejected')").fetchone()[0]
+
+    # Counts a server error against one scan; returns the attempts so far
+    def _attempt(self, scan_id):
+        with self.lock, self.conn:
+            self.conn.execute("UPDATE Journal SET attempts = attempts + 1 WHERE scan_id = ?", (scan_id,))
+            return self.conn.execute("SELECT attempts FROM Journal WHERE scan_id = ?", (scan_id,)).fetchone()[0]
+
+    # The last synced herd record with this device's unsynced scans applied on
+    # top, so the handheld shows its own edits while offline
+    def lookup(self, barcode):
+        with self.lock:
+            row = self.conn.execute("SELECT record FROM HerdCache WHERE barcode = ?", (barcode,)).fetchone()
+            local = self.conn.execute("SELECT payload FROM Journal WHERE barcode = ? AND synced_at IS NULL "
+                                      "ORDER BY scanned_at", (barcode,)).fetchall()
+        record = json.loads(row[0]) if row else None
+        for (payload,) in local:
+            scan = json.loads(payload)
+            if record is None and not scan.get("gender"):
+                continue
+            record = dict(record or {}, **{k: v for k, v in scan.items() if k not in ("scan_id", "scanned_at")})
+        return record
+
+    # Applies one sync round trip's results: journal statuses and the herd delta
+    def _apply(self, results, herd):
+        now = time.time()
+        with self.lock, self.conn:
+            self.conn.executemany("UPDATE Journal SET synced_at = ?, status = ? WHERE scan_id = ?",
+                                  [(now, r["status"], r["scan_id"]) for r in results])
+            if herd is not None:
+                columns = herd["columns"]
+                self.conn.executemany("INSERT OR REPLACE INTO HerdCache (barcode, record) VALUES (?, ?)",
+                                      [(row[0], json.dumps(dict(zip(columns, row)), separators=(",", ":")))
+                                       for row in herd["rows"]])
+                self.conn.executemany("DELETE FROM HerdCache WHERE barcode = ?", [(b,) for b in herd["deleted"]])
+                self.conn.execute("UPDATE SyncState SET value = ? WHERE key = 'herd_version'", (str(herd["version"]),))
+
+    # -----------------------------
+    # Sync
+    # -----------------------------
+    # Each round trip is one gzip-compressed /api/batch carrying up to
+    # SYNC_BATCH pending scans and a herd delta since the cached version, so a
+    # sync costs time in proportion to what changed on either side. Scans the
+    # server reports as "stale" lost to a newer scan of the same pig from
+    # another device; the herd delta brings the winning record down. Scans
+    # the server reports "invalid" are marked synced with that status and
+    # never resent.
+    def sync(self, url=API_URL, token=API_TOKEN, batch=SYNC_BATCH):
+        if not url:
+            raise ValueError("No API URL; set PIGLYTICS_API_URL")
+        totals = {"sent": 0, "herd_rows": 0, "round_trips": 0, "bytes_sent": 0, "bytes_received": 0}
+        while True:
+            scans = self.pending(batch)
+            requests = [{"op": "herd", "since": self._state("herd_version"), "limit": batch * 4}]
+            if scans:
+                requests.insert(0, {"op": "scans", "scans": scans, "device": self.device})
+            responses = self._post(url, token, requests, totals)
+            results = []
+            if scans:
+                if responses[0]["status"] == 200:
+                    results = responses[0]["body"]["results"]
+                else:
+                    results = self._push_scans(scans, url, token, totals)
+                    # The herd pull may have failed with the scans; ask again on its own
+                    if responses[-1]["status"] != 200:
+                        responses = self._post(url, token, requests[-1:], totals)
+            if responses[-1]["status"] != 200:
+                self._apply(results, None)
+                raise RuntimeError(f"Herd pull rejected: {responses[-1]['body']}")
+            herd = responses[-1]["body"]
+            self._apply(results, herd)
+            totals["sent"] += len(scans)
+            totals["herd_rows"] += len(herd["rows"]) + len(herd["deleted"])
+            if len(scans) < batch and not herd["more"]:
+                return totals
+
+    # One /api/batch round trip; returns its responses. A whole batch the
+    # server refuses (400, 413, 5xx) comes back as that status for every
+    # request, so the caller handles it like a per-request failure.
+    def _post(self, url, token, requests, totals):
+        body = gzip.compress(json.dumps({"requests": requests}, separators=(",", ":")).encode("utf-8"))
+        headers = {"Content-Type": "application/json", "Content-Encoding": "gzip", "Accept-Encoding": "gzip"}
+        if token:
+            headers["Authorization"] = f"Bearer {token}"
+        request = urllib.request.Request(f"{url.rstrip('/')}/api/batch", data=body, headers=headers)
+        totals["round_trips"] += 1
+        totals["bytes_sent"] += len(body)
+        try:
+            with urllib.request.urlopen(request, timeout=SYNC_TIMEOUT) as response:
+                raw = response.read()
+                data = gzip.decompress(raw) if response.headers.get("Content-Encoding") == "gzip" else raw
+        except urllib.error.HTTPError as e:
+            if e.code not in (400, 413) and e.code < 500:
+                raise
+            totals["bytes_received"] += len(e.read() or b"")
+            return [{"status": e.code, "body": {"error": e.reason}}] * len(requests)
+        totals["bytes_received"] += len(raw)
+        return json.loads(data)["responses"]
+
+    # Uploads scans the server refused as a batch, halving the batch until
+    # the scans it can't take are alone, so one poison scan doesn't hold up
+    # the queue behind it. A lone scan refused with a 4xx is marked
+    # "rejected" at once; one hitting server errors is retried on later syncs
+    # and set aside after MAX_SCAN_ATTEMPTS. Halves the server accepts are
+    # recorded as they go.
+    def _push_scans(self, scans, url, token, totals):
+        response = self._post(url, token, [{"op": "scans", "scans": scans, "device": self.device}], totals)[0]
+        if response["status"] == 200:
+            # Recorded now, in case a later half fails the sync
+            self._apply(response["body"]["results"], None)
+            return response["body"]["results"]
+        if len(scans) > 1:
+            half = len(scans) // 2
+            return (self._push_scans(scans[:half], url, token, totals)
+                    + self._push_scans(scans[half:], url, token, totals))
+        scan_id = scans[0]["scan_id"]
+        if response["status"] >= 500 and self._attempt(scan_id) < MAX_SCAN_ATTEMPTS:
+            raise RuntimeError(f"Sync failed on scan {scan_id}: {response['body']}")
+        print(f"Scan {scan_id} rejected by the server: {response['body']}", flush=True)
+        return [{"scan_id": scan_id, "status": "rejected"}]
+
+    # Background sync with exponential backoff while the link is down. Any
+    # error backs off the same way, so a bad response can't end the thread.
+    def start_background_sync(self, url=API_URL, token=API_TOKEN, interval=SYNC_INTERVAL, stop_event=None):
+        stop_event = stop_event or threading.Event()
+
+        def loop():
+            delay = interval
+            while not stop_event.is_set():
+                try:
+                    self.sync(url, token)
+                    delay = interval
+                except (OSError, urllib.error.URLError, RuntimeError) as e:
+                    print(f"Scan sync failed, {self.pending_count()} scans queued: {e}", flush=True)
+                    delay = min(delay * 2, MAX_BACKOFF)
+                except Exception as e:
+                    print(f"Scan sync error, {self.pending_count()} scans queued: {type(e).__name__}: {e}", flush=True)
+                    delay = min(delay * 2, MAX_BACKOFF)
+                stop_event.wait(delay)
+
+        threading.Thread(target=loop, name="scan-sync", daemon=True).start()
+        return stop_event
+
+    def close(self):
+        self.conn.close()
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Offline scan journal for handheld scanners")
+    parser.add_argument("--journal", default=JOURNAL_PATH)
+    parser.add_argument("--url", default=API_URL)
+    commands = parser.add_subparsers(dest="command", required=True)
+    commands.add_parser("sync", help="Push queued scans and pull herd changes now")
+    commands.add_parser("status", help="Show queued scans and cached herd size")
+    args = parser.parse_args()
+
+    journal = ScanJournal(args.journal)
+    if args.command == "sync":
+        start = time.perf_counter()
+        totals = journal.sync(args.url)
+        print(f"Synced {totals['sent']} scans and {totals['herd_rows']} herd changes in {totals['round_trips']} "
+              f"round trips ({totals['bytes_sent'] / 1e3:.1f} KB up, {totals['bytes_received'] / 1e3:.1f} KB down, "
+              f"{time.perf_counter() - start:.2f}s)")
+    else:
+        cached = journal.conn.execute("SELECT COUNT(*) FROM HerdCache").fetchone()[0]
+        print(f"device {journal.device}: {journal.pending_count()} scans queued, {journal.rejected_count()} rejected, "
+              f"{cached} pigs cached "
+              f"at herd version {journal._state('herd_version')}")
+    journal.close()
@@ -0,0 +1,378 @@
+import json
+import math
+import os
+import random
+import threading
+import time
+from collections import deque
+from urllib.parse import urlparse, parse_qs
+
+from resources import lazy_import
+
+# -----------------------------
+# Settings
+# -----------------------------
+# PIGLYTICS_SENSOR_SOURCE selects where readings come from:
+#   mqtt://localhost:1883/piglytics/+/+   topics piglytics/<barn>/<metric>
+#   serial:///dev/ttyUSB0?baud=9600       lines "barn,metric,value[,timestamp]"
+#   simulate                              synthetic barns for demos
+# Unset means no source; the dashboards then show no live readings.
+WINDOW_SECONDS = 300
+BUCKET_SECONDS = 1.0
+RATE_MIN_SPAN = 30        # seconds of data needed before rate-of-change alerts fire
+ALERT_COOLDOWN = 300      # per barn/metric/kind
+MAX_ALERTS = 100
+
+# metric -> (low, high, max change per minute)
+THRESHOLDS = {
+    "temperature": (18.0, 30.0, 1.5),
+    "humidity": (50.0, 80.0, 10.0),
+}
+UNITS = {"temperature": "°C", "humidity": "%"}
+
+# -----------------------------
+# Sliding Window
+# -----------------------------
+# Readings are folded into fixed time buckets holding sum, count, min and max,
+# so a reading costs O(1) and memory is bounded by WINDOW_SECONDS / BUCKET_SECONDS
+# however fast sensors report. Window min/max come from monotonic deques of the
+# sealed buckets plus the open one.
+class SlidingWindow:
+    def __init__(self, seconds=WINDOW_SECONDS, resolution=BUCKET_SECONDS):
+        self.seconds = seconds
+        self.resolution = resolution
+        self.buckets = deque()   # [start, sum, count, min, max]
+        self.mins = deque()      # (start, min) with increasing mins
+        self.maxs = deque()      # (start, max) with decreasing maxes
+        self.sum = 0.0
+        self.count = 0
+        self.last = None
+        self.last_time = None
+
+    def add(self, value, stamp):
+        start = stamp - stamp % self.resolution
+        current = self.buckets[-1] if self.buckets else None
+        if current is None or start > current[0]:
+            if current is not None:
+                self._seal(current)
+            current = [start, 0.0, 0, value, value]
+            self.buckets.append(current)
+        current[1] += value
+        current[2] += 1
+        current[3] = min(current[3], value)
+        current[4] = max(current[4], value)
+        self.sum += value
+        self.count += 1
+        self.last = value
+        self.last_time = stamp
+        self._evict(stamp - self.seconds)
+
+    def _seal(self, bucket):
+        while self.mins and self.mins[-1][1] >= bucket[3]:
+            self.mins.pop()
+        self.mins.append((bucket[0], bucket[3]))
+        while self.maxs and self.maxs[-1][1] <= bucket[4]:
+            self.maxs.pop()
+        self.maxs.append((bucket[0], bucket[4]))
+
+    def _evict(self, cutoff):
+        while len(self.buckets) > 1 and self.buckets[0][0] <= cutoff:
+            old = self.buckets.popleft()
+            self.sum -= old[1]
+            self.count -= old[2]
+        first = self.buckets[0][0]
+        while self.mins and self.mins[0][0] < first:
+            self.mins.popleft()
+        while self.maxs and self.maxs[0][0] < first:
+            self.maxs.popleft()
+
+    @property
+    def mean(self):
+        return self.sum / self.count if self.count else None
+
+    @property
+    def min(self):
+        if not self.buckets:
+            return None
+        current = self.buckets[-1][3]
+        return min(self.mins[0][1], current) if self.mins else current
+
+    @property
+    def max(self):
+        if not self.buckets:
+            return None
+        current = self.buckets[-1][4]
+        return max(self.maxs[0][1], current) if self.maxs else current
+
+    # Change per minute between the oldest and newest bucket means
+    def rate(self):
+        if len(self.buckets) < 2:
+            return None
+        first, last = self.buckets[0], self.buckets[-1]
+        span = last[0] - first[0]
+        if span < RATE_MIN_SPAN:
+            return None
+        return (last[1] / last[2] - first[1] / first[2]) / span * 60
+
+    def series(self):
+        return [(start, total / count) for start, total, count, _, _ in self.buckets]
+
+# -----------------------------
+# Stream Processor
+# -----------------------------
+class SensorProcessor:
+    def __init__(self, window_seconds=WINDOW_SECONDS, thresholds=None):
+        self.window_seconds = window_seconds
+        self.thresholds = THRESHOLDS if thresholds is None else thresholds
+        self.windows = {}
+        self.alerts = deque(maxlen=MAX_ALERTS)
+        self.last_alert = {}
+        self.listeners = []
+        self.readings = 0
+        self.lock = threading.Lock()
+
+    def ingest(self, barn, metric, value, stamp=None):
+        stamp = time.time() if stamp is None else stamp
+        key = (str(barn), metric)
+        with self.lock:
+            window = self.windows.get(key)
+            if window is None:
+                window = self.windows[key] = SlidingWindow(self.window_seconds)
+            window.add(float(value), stamp)
+            self.readings += 1
+            fired = self._check(key, window, stamp)
+        for alert in fired:
+            for listener in self.listeners:
+                try:
+                    listener(alert)
+                except Exception:
+                    pass
+
+    def _check(self, key, window, stamp):
+        limits = self.thresholds.get(key[1])
+        if limits is None:
+            return []
+        low, high, max_rate = limits
+        unit = UNITS.get(key[1], "")
+        candidates = []
+        if window.last > high:
+            candidates.append(("high", "red", f"Barn {key[0]} {key[1]} high: {window.last:.1f}{unit}"))
+        elif window.last < low:
+            candidates.append(("low", "orange", f"Barn {key[0]} {key[1]} low: {window.last:.1f}{unit}"))
+        rate = window.rate()
+        if rate is not None and abs(rate) > max_rate:
+            direction = "rising" if rate > 0 else "falling"
+            candidates.append(("rate", "orange", f"Barn {key[0]} {key[1]} {direction} {abs(rate):.1f}{unit}/min"))
+        fired = []
+        for kind, severity, message in candidates:
+            if stamp - self.last_alert.get(key + (kind,), -math.inf) < ALERT_COOLDOWN:
+                continue
+            self.last_alert[key + (kind,)] = stamp
+            alert = {"barn": key[0], "metric": key[1], "kind": kind, "severity": severity,
+                     "message": message, "value": window.last, "at": stamp}
+            self.alerts.append(alert)
+            fired.append(alert)
+        return fired
+
+    # {barn: {metric: {"last", "mean", "min", "max", "rate", "updated"}}}
+    def snapshot(self):
+        with self.lock:
+            snapshot = {}
+            for (barn, metric), window in self.windows.items():
+                snapshot.setdefault(barn, {})[metric] = {
+                    "last": window.last, "mean": window.mean, "min": window.min, "max": window.max,
+                    "rate": window.rate(), "updated": window.last_time,
+                }
+            return snapshot
+
+    # Herd-wide mean of each barn's window mean, with the mean per-minute rate
+    def kpi(self, metric):
+        values, rates = [], []
+        for metrics in self.snapshot().values():
+            stats = metrics.get(metric)
+            if stats and stats["mean"] is not None:
+                values.append(stats["mean"])
+                if stats["rate"] is not None:
+                    rates.append(stats["rate"])
+        if not values:
+            return None, None
+        return sum(values) / len(values), (sum(rates) / len(rates) if rates else None)
+
+    # Per-bucket means for charting: [(barn, metric, timestamp, mean), ...]
+    def history(self):
+        with self.lock:
+            return [(barn, metric, start, mean) for (barn, metric), window in self.windows.items()
+                    for start, mean in window.series()]
+
+    def active_alerts(self, within=ALERT_COOLDOWN):
+        now = time.time()
+        with self.lock:
+            return [alert for alert in self.alerts if now - alert["at"] <= within]
+
+# -----------------------------
+# Sources
+# -----------------------------
+def parse_line(line):
+    parts = line.strip().split(",")
+    if len(parts) < 3:
+        return None
+    try:
+        stamp = float(parts[3]) if len(parts) > 3 else None
+        return parts[0], parts[1], float(parts[2]), stamp
+    except ValueError:
+        return None
+
+def serial_source(processor, port, baud=9600, stop_event=None):
+    serial = lazy_import("serial")
+    with serial.Serial(port, baud, timeout=1) as device:
+        while stop_event is None or not stop_event.is_set():
+            reading = parse_line(device.readline().decode("ascii", errors="ignore"))
+            if reading is not None:
+                processor.ingest(*reading)
+
+# Payload is a bare number or JSON {"value": ..., "ts": ...}
+def mqtt_source(processor, host="localhost", port=1883, topic="piglytics/+/+", stop_event=None):
+    mqtt = lazy_import("paho.mqtt.client")
+
+    def on_message(client, userdata, message):
+        parts = message.topic.split("/")
+        if len(parts) < 3:
+            return
+        try:
+            payload = json.loads(message.payload)
+        except ValueError:
+            return
+        if isinstance(payload, dict):
+            value, stamp = payload.get("value"), payload.get("ts")
+        else:
+            value, stamp = payload, None
+        if isinstance(value, (int, float)):
+            processor.ingest(parts[-2], parts[-1], value, stamp)
+
+    client = mqtt.Client(mqtt.CallbackAPIVersion.VERSION2) if hasattr(mqtt, "CallbackAPIVersion") else mqtt.Client()
+    client.on_message = on_message
+    client.on_connect = lambda client, *args: client.subscribe(topic)
+    client.connect(host, port)
+    client.loop_start()
+    try:
+        while stop_event is None or not stop_event.is_set():
+            time.sleep(1)
+    finally:
+        client.loop_stop()
+        client.disconnect()
+
+def simulated_source(processor, barns=6, interval=1.0, stop_event=None):
+    rng = random.Random(7)
+    while stop_event is None or not stop_event.is_set():
+        now = time.time()
+        day = math.sin(now / 86400 * 2 * math.pi)
+        for barn in range(1, barns + 1):
+            processor.ingest(barn, "temperature", 24 + 4 * day + barn * 0.3 + rng.gauss(0, 0.3), now)
+            processor.ingest(barn, "humidity", 68 - 6 * day + rng.gauss(0, 1.0), now)
+        time.sleep(interval)
+
+def start_source(processor, source):
+    url = urlparse(source)
+    if url.scheme == "mqtt":
+        target, kwargs = mqtt_source, {"host": url.hostname or "localhost", "port": url.port or 1883,
+                                       "topic": url.path.lstrip("/") or "piglytics/+/+"}
+    elif url.scheme == "serial":
+        baud = int(parse_qs(url.query).get("baud", ["9600"])[0])
+        target, kwargs = serial_source, {"port": url.path, "baud": baud}
+    elif source == "simulate":
+        target, kwargs = simulated_source, {}
+    else:
+        raise ValueError(f"Unknown sensor source: {source}")
+    thread = threading.Thread(target=target, args=(processor,), kwargs=kwargs, name="sensor-source", daemon=True)
+    thread.start()
+    return thread
+
+# -----------------------------
+# Cross-process Snapshot
+# -----------------------------
+# When an ingestion worker owns the source, it writes its aggregates to
+# PIGLYTICS_SENSOR_SNAPSHOT every few seconds and dashboard processes read
+# that file through SnapshotView, which has the same read methods as
+# SensorProcessor.
+SNAPSHOT_INTERVAL = 2.0
+
+def write_snapshot(processor, path):
+    with processor.lock:
+        alerts = list(processor.alerts)
+    payload = {"snapshot": processor.snapshot(), "history": processor.history(),
+               "alerts": alerts, "written": time.time()}
+    tmp = f"{path}.tmp"
+    with open(tmp, "w") as f:
+        json.dump(payload, f)
+    os.replace(tmp, path)
+
+class SnapshotView:
+    def __init__(self, path):
+        self.path = path
+        self.mtime = None
+        self.payload = {"snapshot": {}, "history": [], "alerts": []}
+        self.lock = threading.Lock()
+
+    def _load(self):
+        with self.lock:
+            try:
+                mtime = os.path.getmtime(self.path)
+                if mtime != self.mtime:
+                    with open(self.path) as f:
+                        self.payload = json.load(f)
+                    self.mtime = mtime
+            except (OSError, ValueError):
+                pass
+            return self.payload
+
+    def snapshot(self):
+        return self._load()["snapshot"]
+
+    def history(self):
+        return [tuple(row) for row in self._load()["history"]]
+
+    def kpi(self, metric):
+        return SensorProcessor.kpi(self, metric)
+
+    def active_alerts(self, within=ALERT_COOLDOWN):
+        now = time.time()
+        return [alert for alert in self._load()["alerts"] if now - alert["at"] <= within]
+
+# -----------------------------
+# Process-wide Processor
+# -----------------------------
+_processor = None
+_processor_lock = threading.Lock()
+
+# Shared by every dashboard session; the configured source starts on first use.
+# Without a source but with a snapshot path, the snapshot is read instead.
+def sensor_processor():
+    global _processor
+    with _processor_lock:
+        if _processor is None:
+            source = os.environ.get("PIGLYTICS_SENSOR_SOURCE")
+            snapshot_path = os.environ.get("PIGLYTICS_SENSOR_SNAPSHOT")
+            if not source and snapshot_path:
+                _processor = SnapshotView(snapshot_path)
+            else:
+                _processor = SensorProcessor()
+                if source:
+                    start_source(_processor, source)
+        return _processor
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Measure sensor ingest throughput")
+    parser.add_argument("--readings", type=int, default=1_000_000)
+    parser.add_argument("--barns", type=int, default=6)
+    args = parser.parse_args()
+
+    processor = SensorProcessor()
+    base = time.time()
+    start = time.perf_counter()
+    for i in range(args.readings):
+        # 5000 readings per simulated second
+        processor.ingest(i % args.barns, "temperature" if i % 2 else "humidity", 25 + (i % 97) / 50, base + i / 5000)
+    elapsed = time.perf_counter() - start
+    print(f"{args.readings / elapsed:,.0f} readings/s ({1e6 * elapsed / args.readings:.2f} us per reading)")
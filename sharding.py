@@ -0,0 +1,148 @@
+import argparse
+import os
+import sqlite3
+
+from changes import install_changes
+from growth import install_growth
+from piglet_db import (PIGLET_TABLES, PER_PIG_TABLES, UNASSIGNED_SHARD, alert_bucket, alert_shards, barcode_index,
+                       copy_rows, herd_shard_path, herd_shards, init_alerts_table, shard_key)
+
+# -----------------------------
+# Settings
+# -----------------------------
+# Splits a single-file database into a shard directory (see piglet_db) and
+# rebuilds the BarcodeIndex. Pigs keep their ids, and their per-pig rows go
+# with them to their barn's shard. The summary, search and pedigree tables
+# below are derived from the piglet tables and are left behind: readers build
+# the summary and search tables per shard on first install, and the pedigree
+# tools need a single file. Any other table holding rows stops the split
+# rather than being dropped.
+DERIVED_TABLES = {"HerdSummary", "PedigreeClosure", "Inbreeding"}
+DERIVED_PREFIXES = ("sqlite_", "PigletSearch")
+
+# -----------------------------
+# Split
+# -----------------------------
+def _unplaced_tables(source):
+    placed = set(PIGLET_TABLES) | set(PER_PIG_TABLES) | {"AlertsSent"} | DERIVED_TABLES
+    names = [name for (name,) in source.execute("SELECT name FROM sqlite_master WHERE type = 'table'")]
+    return [name for name in names if name not in placed and not name.startswith(DERIVED_PREFIXES)
+            and source.execute(f'SELECT 1 FROM "{name}" LIMIT 1').fetchone() is not None]
+
+def _pig_barcodes(schema):
+    return " UNION ALL ".join(f"SELECT barcode FROM {schema}.{table}" for table in PIGLET_TABLES)
+
+# Returns the number of pigs moved; the source is left untouched
+def shard_database(source_path, shard_dir):
+    source = sqlite3.connect(source_path)
+    try:
+        unplaced = _unplaced_tables(source)
+        if unplaced:
+            raise ValueError(f"{source_path} has rows in {', '.join(unplaced)}, which have no place in a shard")
+        missing = [table for table in PIGLET_TABLES if not source.execute(
+            "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?", (table,)).fetchone()]
+        if missing:
+            raise ValueError(f"{source_path} has no {', '.join(missing)} table")
+        shared = source.execute(" INTERSECT ".join(f"SELECT barcode FROM {table}" for table in PIGLET_TABLES)
+                                + " LIMIT 5").fetchall()
+        if shared:
+            raise ValueError(f"{source_path} has barcodes in more than one piglet table: "
+                             f"{', '.join(barcode for (barcode,) in shared)}")
+        source.create_function("shard_key", 1, shard_key, deterministic=True)
+        keys = {key for table in PIGLET_TABLES
+                for (key,) in source.execute(f"SELECT DISTINCT shard_key(location) FROM {table}")}
+        # Per-pig rows whose pig is gone still need a shard
+        if any(source.execute(f"SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = '{table}'").fetchone()
+               and source.execute(f"SELECT 1 FROM {table} WHERE barcode NOT IN ({_pig_barcodes('main')}) LIMIT 1")
+               .fetchone() for table in PER_PIG_TABLES):
+            keys.add(UNASSIGNED_SHARD)
+        sequences = dict(source.execute("SELECT name, seq FROM sqlite_sequence WHERE name IN "
+                                        f"({', '.join('?' * len(PIGLET_TABLES))})", PIGLET_TABLES).fetchall())
+    finally:
+        source.close()
+    os.makedirs(shard_dir, exist_ok=True)
+    if herd_shards(shard_dir):
+        raise ValueError(f"{shard_dir} already holds herd shards")
+
+    moved = 0
+    for key in sorted(keys):
+        path = herd_shard_path(shard_dir, key)
+        conn = sqlite3.connect(path)
+        conn.create_function("shard_key", 1, shard_key, deterministic=True)
+        conn.execute("ATTACH DATABASE ? AS src", (source_path,))
+        with conn:
+            for table in PIGLET_TABLES:
+                moved += copy_rows(conn, table, "shard_key(location) = ?", (key,))
+            here = f"barcode IN ({_pig_barcodes('main')})"
+            if key == UNASSIGNED_SHARD:
+                here += f" OR barcode NOT IN ({_pig_barcodes('src')})"
+            for table in PER_PIG_TABLES:
+                copy_rows(conn, table, here)
+        conn.close()
+        # Triggers are not copied; these put back the growth and change ones
+        install_growth(path)
+        install_changes(path)
+
+    init_alerts_table(shard_dir)
+    for bucket, path in enumerate(alert_shards(shard_dir)):
+        conn = sqlite3.connect(path)
+        conn.create_function("alert_bucket", 1, alert_bucket, deterministic=True)
+        conn.execute("ATTACH DATABASE ? AS src", (source_path,))
+        with conn:
+            copy_rows(conn, "AlertsSent", "alert_bucket(barcode) = ?", (bucket,))
+        conn.close()
+
+    index_shards(shard_dir, sequences)
+    return moved
+
+# -----------------------------
+# BarcodeIndex Rebuild
+# -----------------------------
+# Re-registers every pig from the herd shards, and moves each IdSequence past
+# the highest id in use (or the floors given). Run it with the scanner
+# stopped, e.g. after a crash left a pig in a shard but not in the index.
+# Returns the (barcode, shard) pairs that clash with one already registered,
+# for an operator to resolve.
+def index_shards(shard_dir, sequences=None):
+    sequences = dict(sequences or {})
+    index = sqlite3.connect(barcode_index(shard_dir))
+    duplicates = []
+    with index:
+        sequences.update({table: max(seq, sequences.get(table, 0))
+                          for table, seq in index.execute("SELECT table_name, seq FROM IdSequence")})
+        index.execute("DELETE FROM BarcodeIndex")
+        for path in herd_shards(shard_dir):
+            conn = sqlite3.connect(path)
+            for table in PIGLET_TABLES:
+                for barcode, piglet_id in conn.execute(f"SELECT barcode, id FROM {table} ORDER BY id"):
+                    added = index.execute("INSERT OR IGNORE INTO BarcodeIndex VALUES (?, ?, ?, ?)",
+                                          (barcode, table, piglet_id, os.path.basename(path))).rowcount
+                    if not added:
+                        duplicates.append((barcode, os.path.basename(path)))
+                    sequences[table] = max(sequences.get(table, 0), piglet_id)
+            conn.close()
+        index.executemany("INSERT OR REPLACE INTO IdSequence VALUES (?, ?)", sequences.items())
+    index.close()
+    return duplicates
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Split a piglet database into per-barn shards")
+    commands = parser.add_subparsers(dest="command", required=True)
+    split = commands.add_parser("split", help="Shard a single-file database; the source is left untouched")
+    split.add_argument("source", help="Single-file database, e.g. piglets.db")
+    split.add_argument("shard_dir", help="Directory to create the shards in")
+    reindex = commands.add_parser("reindex", help="Rebuild the BarcodeIndex of a shard directory")
+    reindex.add_argument("shard_dir")
+    args = parser.parse_args()
+
+    if args.command == "split":
+        try:
+            moved = shard_database(args.source, args.shard_dir)
+        except ValueError as e:
+            parser.error(str(e))
+        print(f"Moved {moved} piglets into {len(herd_shards(args.shard_dir))} barn shards in {args.shard_dir}")
+    else:
+        duplicates = index_shards(args.shard_dir)
+        for barcode, shard in duplicates:
+            print(f"{barcode} in {shard} clashes with an indexed pig")
+        print(f"Indexed {args.shard_dir} ({len(duplicates)} clashes)")
@@ -0,0 +1,321 @@
+import multiprocessing as mp
+import queue
+import threading
+import time
+import uuid
+from multiprocessing import shared_memory
+
+from resources import lazy_import, resource_manager
+
+# -----------------------------
+# Settings
+# -----------------------------
+DEFAULT_SLOTS = 8
+# Results kept waiting for their other half; older ones are dropped
+PENDING_RESULTS = 8
+DEFAULT_SHAPE = (480, 640, 3)
+# Header: write_seq, slots, height, width, channels, closed
+HEADER_FIELDS = 6
+WRITE_SEQ, SLOTS, HEIGHT, WIDTH, CHANNELS, CLOSED = range(HEADER_FIELDS)
+
+# -----------------------------
+# Shared Frame Ring
+# -----------------------------
+# One SharedMemory block laid out as
+#   [header int64 x 6][slot seq int64 x N][slot time float64 x N][N BGR uint8 frames]
+# with NumPy views over each part. The single writer stamps a slot's sequence
+# number to -1 while filling it and to the frame's sequence when done, so a
+# reader can take a view with no copy and afterwards call valid(seq) to make
+# sure the writer did not lap it while it was being used (a seqlock). With N
+# slots a reader has N - 1 frame periods before its view is overwritten.
+class SharedFrameRing:
+    def __init__(self, name=None, slots=DEFAULT_SLOTS, shape=DEFAULT_SHAPE, create=False):
+        np = lazy_import("numpy")
+        if create:
+            name = name or f"piglytics-{uuid.uuid4().hex[:12]}"
+            frame_bytes = int(np.prod(shape))
+            size = 8 * (HEADER_FIELDS + 2 * slots) + slots * frame_bytes
+            self.shm = shared_memory.SharedMemory(name=name, create=True, size=size)
+        else:
+            self.shm = shared_memory.SharedMemory(name=name)
+        self.name = self.shm.name
+        self.owner = create
+        self.header = np.ndarray((HEADER_FIELDS,), dtype=np.int64, buffer=self.shm.buf)
+        if create:
+            self.header[:] = [0, slots, shape[0], shape[1], shape[2], 0]
+        slots = int(self.header[SLOTS])
+        self.slots = slots
+        self.shape = (int(self.header[HEIGHT]), int(self.header[WIDTH]), int(self.header[CHANNELS]))
+        offset = 8 * HEADER_FIELDS
+        self.slot_seqs = np.ndarray((slots,), dtype=np.int64, buffer=self.shm.buf, offset=offset)
+        self.slot_stamps = np.ndarray((slots,), dtype=np.float64, buffer=self.shm.buf, offset=offset + 8 * slots)
+        self.frames = np.ndarray((slots,) + self.shape, dtype=np.uint8, buffer=self.shm.buf,
+                                 offset=offset + 16 * slots)
+        if create:
+            self.slot_seqs[:] = -1
+
+    # ---------- Writer ----------
+    # Zero-copy capture: cap.read(image=ring.reserve()) decodes straight into
+    # shared memory, then commit() publishes it.
+    def reserve(self):
+        seq = int(self.header[WRITE_SEQ])
+        slot = seq % self.slots
+        self.slot_seqs[slot] = -1
+        return self.frames[slot]
+
+    def commit(self, stamp=None):
+        seq = int(self.header[WRITE_SEQ])
+        slot = seq % self.slots
+        self.slot_stamps[slot] = time.time() if stamp is None else stamp
+        self.slot_seqs[slot] = seq
+        self.header[WRITE_SEQ] = seq + 1
+        return seq
+
+    def publish(self, frame, stamp=None):
+        self.reserve()[...] = frame
+        return self.commit(stamp)
+
+    # ---------- Readers ----------
+    def latest_seq(self):
+        return int(self.header[WRITE_SEQ]) - 1
+
+    def get(self, seq):
+        slot = seq % self.slots
+        if seq < 0 or self.slot_seqs[slot] != seq:
+            return None, None
+        return self.frames[slot], float(self.slot_stamps[slot])
+
+    def valid(self, seq):
+        return seq >= 0 and self.slot_seqs[seq % self.slots] == seq
+
+    # Blocks until a frame newer than after_seq is published; returns its seq or None
+    def wait_newer(self, after_seq, timeout=1.0, poll=0.001):
+        deadline = time.monotonic() + timeout
+        while True:
+            seq = self.latest_seq()
+            if seq > after_seq:
+                return seq
+            if self.closed or time.monotonic() > deadline:
+                return None
+            time.sleep(poll)
+
+    @property
+    def closed(self):
+        return bool(self.header[CLOSED])
+
+    def close(self):
+        if self.owner:
+            self.header[CLOSED] = 1
+        # Drop the NumPy views before closing the mapping they point into
+        self.header = self.slot_seqs = self.slot_stamps = self.frames = None
+        self.shm.close()
+        if self.owner:
+            self.shm.unlink()
+
+# -----------------------------
+# Pipeline Workers
+# -----------------------------
+# Each stage is its own process attached to the same ring. Frames never leave
+# shared memory; only small result tuples go through the results queue.
+# Inference leads: it announces each frame it takes in `target`, and decode
+# follows, reading barcodes from that same frame, so every detection result
+# has a barcode result of the same seq to be paired with.
+def capture_worker(ring_name, camera_index, stop_event):
+    cv2 = lazy_import("cv2")
+    np = lazy_import("numpy")
+    ring = SharedFrameRing(ring_name)
+    cap = cv2.VideoCapture(camera_index)
+    cap.set(cv2.CAP_PROP_FRAME_HEIGHT, ring.shape[0])
+    cap.set(cv2.CAP_PROP_FRAME_WIDTH, ring.shape[1])
+    try:
+        while not stop_event.is_set():
+            slot = ring.reserve()
+            ok, frame = cap.read(slot)
+            if not ok:
+                time.sleep(0.1)
+                continue
+            # cv2 only decodes in place when the camera honours the ring's shape
+            if frame.shape != slot.shape:
+                cv2.resize(frame, (ring.shape[1], ring.shape[0]), dst=slot)
+            elif not np.shares_memory(frame, slot):
+                slot[...] = frame
+            ring.commit()
+    finally:
+        cap.release()
+        ring.close()
+
+def _next_target(ring, target, last, lead):
+    if lead:
+        seq = ring.wait_newer(last, timeout=0.5)
+        if seq is not None:
+            target.value = seq
+        return seq
+    deadline = time.monotonic() + 0.5
+    while target.value <= last:
+        if ring.closed or time.monotonic() > deadline:
+            return None
+        time.sleep(0.001)
+    return target.value
+
+def _stage_worker(ring_name, kind, process, results, stop_event, target, lead):
+    ring = SharedFrameRing(ring_name)
+    last = -1
+    try:
+        while not stop_event.is_set():
+            seq = _next_target(ring, target, last, lead)
+            if seq is None:
+                continue
+            last = seq
+            frame, _ = ring.get(seq)
+            output = process(frame) if frame is not None else None
+            # Results computed on a lapped slot are dropped; None tells the
+            # collector this seq's pair will not arrive
+            results.put((kind, seq, output if frame is not None and ring.valid(seq) else None))
+    finally:
+        ring.close()
+
+def decode_worker(ring_name, results, stop_event, target):
+    from vision import decode_barcodes
+    _stage_worker(ring_name, "barcodes", decode_barcodes, results, stop_event, target, lead=False)
+
+def inference_worker(ring_name, weights, results, stop_event, target):
+    from detectors import create_detector
+    from vision import detect_objects
+    model = create_detector(weights)
+    _stage_worker(ring_name, "detections", lambda frame: detect_objects(model, frame), results, stop_event,
+                  target, lead=True)
+
+# -----------------------------
+# Vision Pipeline
+# -----------------------------
+# Capture, barcode decode and YOLO inference in three processes. The parent
+# pairs the barcodes and detections computed from the same frame and keeps
+# the newest pair; latest() hands back a private copy of the newest frame
+# together with that pair and the seq of the frame it came from. A caller
+# feeding fusion should do so only when that result seq changes, since the
+# pair is repeated for every frame captured while the next one is computed.
+class VisionPipeline:
+    def __init__(self, camera_index=0, weights="yolov8n.pt", slots=DEFAULT_SLOTS, shape=DEFAULT_SHAPE):
+        self.camera_index = camera_index
+        self.weights = weights
+        self.ring = SharedFrameRing(slots=slots, shape=shape, create=True)
+        self.ctx = mp.get_context("spawn")
+        self.stop_event = self.ctx.Event()
+        self.results = self.ctx.Queue()
+        # seq of the frame inference is working on, which decode follows
+        self.target = self.ctx.Value("q", -1, lock=False)
+        self.pending = {}
+        self.result = (-1, [], [])
+        self.processes = []
+        self.collector = None
+
+    def start(self):
+        targets = [
+            (capture_worker, (self.ring.name, self.camera_index, self.stop_event)),
+            (decode_worker, (self.ring.name, self.results, self.stop_event, self.target)),
+            (inference_worker, (self.ring.name, self.weights, self.results, self.stop_event, self.target)),
+        ]
+        for target, args in targets:
+            process = self.ctx.Process(target=target, args=args, daemon=True)
+            process.start()
+            self.processes.append(process)
+        self.collector = threading.Thread(target=self._collect, name="vision-results", daemon=True)
+        self.collector.start()
+        return self
+
+    def _collect(self):
+        while not self.stop_event.is_set():
+            try:
+                kind, seq, output = self.results.get(timeout=0.5)
+            except queue.Empty:
+                continue
+            if seq <= self.result[0]:
+                continue
+            halves = self.pending.setdefault(seq, {})
+            halves[kind] = output
+            if len(halves) < 2:
+                if len(self.pending) > PENDING_RESULTS:
+                    del self.pending[min(self.pending)]
+                continue
+            del self.pending[seq]
+            if halves["barcodes"] is not None and halves["detections"] is not None:
+                self.result = (seq, halves["barcodes"], halves["detections"])
+            for older in [s for s in self.pending if s < seq]:
+                del self.pending[older]
+
+    # Returns (seq, frame, result_seq, barcodes, detections) or None
+    def latest(self, after_seq=-1, timeout=1.0):
+        seq = self.ring.wait_newer(after_seq, timeout)
+        if seq is None:
+            return None
+        frame, _ = self.ring.get(seq)
+        if frame is None:
+            return None
+        frame = frame.copy()
+        if not self.ring.valid(seq):
+            return None
+        result_seq, barcodes, detections = self.result
+        return seq, frame, result_seq, barcodes, detections
+
+    def alive(self):
+        return all(p.is_alive() for p in self.processes)
+
+    def stop(self):
+        self.stop_event.set()
+        for process in self.processes:
+            process.join(timeout=5)
+        self.ring.close()
+
+_pipelines = {}
+_pipeline_refs = {}
+_pipelines_lock = threading.Lock()
+
+# Process-wide, like ResourceManager: every session shares one pipeline per
+# camera. Returns the running pipeline, replacing a dead one.
+def vision_pipeline(camera_index=0, weights="yolov8n.pt"):
+    with _pipelines_lock:
+        return _running_pipeline(camera_index, weights)
+
+def _running_pipeline(camera_index, weights):
+    pipeline = _pipelines.get(camera_index)
+    if pipeline is None or not pipeline.alive():
+        if pipeline is not None:
+            pipeline.stop()
+        else:
+            # An in-process camera feed left idle would keep the device open
+            resource_manager().reap_idle(now=float("inf"))
+        pipeline = VisionPipeline(camera_index, weights).start()
+        _pipelines[camera_index] = pipeline
+    return pipeline
+
+# Refcounted like ResourceManager's cameras: the last release stops the
+# pipeline, so its capture process lets go of the camera once no session
+# is monitoring.
+def acquire_pipeline(camera_index=0, weights="yolov8n.pt"):
+    with _pipelines_lock:
+        pipeline = _running_pipeline(camera_index, weights)
+        _pipeline_refs[camera_index] = _pipeline_refs.get(camera_index, 0) + 1
+        return pipeline
+
+def release_pipeline(camera_index=0):
+    with _pipelines_lock:
+        refs = _pipeline_refs.get(camera_index, 0) - 1
+        _pipeline_refs[camera_index] = max(refs, 0)
+        pipeline = _pipelines.pop(camera_index, None) if refs <= 0 else None
+    # Joining the stage processes happens outside the lock
+    if pipeline is not None:
+        pipeline.stop()
+
+class PipelineLease:
+    def __init__(self, camera_index, weights):
+        self.camera_index = camera_index
+        self.weights = weights
+
+    def __enter__(self):
+        return acquire_pipeline(self.camera_index, self.weights)
+
+    def __exit__(self, *exc):
+        release_pipeline(self.camera_index)
+
+def pipeline_lease(camera_index=0, weights="yolov8n.pt"):
+    return PipelineLease(camera_index, weights)
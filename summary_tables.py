@@ -0,0 +1,222 @@
+import argparse
+import sqlite3
+
+from piglet_db import DB_PATH, PIGLET_TABLES, alert_shards, fan_out, herd_shards, init_alerts_table, is_sharded
+
+# -----------------------------
+# Settings
+# -----------------------------
+# HerdSummary holds one count per (table, dimension, value), e.g.
+# ('MalePiglets', 'breed', 'Duroc', 42). The 'total' dimension counts rows.
+# Triggers keep it current, so the dashboard header reads a handful of rows
+# instead of scanning the piglet tables on every rerun. For AlertsSent the
+# 'total' row counts only alerts still needing attention (ACTIVE_ALERT_STATES).
+DIMENSIONS = ["breed", "health_status", "location"]
+ALERTS_TABLE = "AlertsSent"
+ACTIVE_ALERT_STATES = "('open', 'acknowledged')"
+# Earlier versions counted every AlertsSent row under these triggers
+LEGACY_ALERT_TRIGGERS = [f"{ALERTS_TABLE}_summary_insert", f"{ALERTS_TABLE}_summary_delete"]
+
+SUMMARY_SCHEMA = """
+CREATE TABLE IF NOT EXISTS HerdSummary (
+    table_name TEXT NOT NULL,
+    dimension TEXT NOT NULL,
+    value TEXT NOT NULL,
+    count INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY (table_name, dimension, value)
+)
+"""
+
+# -----------------------------
+# Trigger SQL
+# -----------------------------
+def _bump(table, dimension, value_expr, delta):
+    return (
+        f"INSERT INTO HerdSummary (table_name, dimension, value, count) "
+        f"VALUES ('{table}', '{dimension}', {value_expr}, {delta}) "
+        f"ON CONFLICT(table_name, dimension, value) DO UPDATE SET count = count + ({delta});"
+    )
+
+def _cleanup(table):
+    return f"DELETE FROM HerdSummary WHERE table_name = '{table}' AND count <= 0;"
+
+def trigger_sql(table):
+    insert_body = [_bump(table, "total", "''", 1)]
+    insert_body += [_bump(table, d, f"IFNULL(NEW.{d}, '')", 1) for d in DIMENSIONS]
+    delete_body = [_bump(table, "total", "''", -1)]
+    delete_body += [_bump(table, d, f"IFNULL(OLD.{d}, '')", -1) for d in DIMENSIONS]
+    delete_body.append(_cleanup(table))
+    update_body = []
+    for d in DIMENSIONS:
+        update_body.append(_bump(table, d, f"IFNULL(OLD.{d}, '')", -1))
+        update_body.append(_bump(table, d, f"IFNULL(NEW.{d}, '')", 1))
+    update_body.append(_cleanup(table))
+    body = lambda statements: "\n    ".join(statements)
+    return [
+        f"CREATE TRIGGER IF NOT EXISTS {table}_summary_insert AFTER INSERT ON {table} BEGIN\n    {body(insert_body)}\nEND",
+        f"CREATE TRIGGER IF NOT EXISTS {table}_summary_delete AFTER DELETE ON {table} BEGIN\n    {body(delete_body)}\nEND",
+        f"CREATE TRIGGER IF NOT EXISTS {table}_summary_update AFTER UPDATE OF {', '.join(DIMENSIONS)} ON {table} "
+        f"BEGIN\n    {body(update_body)}\nEND",
+    ]
+
+def alert_trigger_sql():
+    name = f"{ALERTS_TABLE}_summary_active"
+    insert_body = _bump(ALERTS_TABLE, "total", "''", 1)
+    delete_body = _bump(ALERTS_TABLE, "total", "''", -1) + "\n    " + _cleanup(ALERTS_TABLE)
+    # Resolving an alert takes it off the count; a re-alert puts it back
+    delta = f"(NEW.state IN {ACTIVE_ALERT_STATES}) - (OLD.state IN {ACTIVE_ALERT_STATES})"
+    update_body = _bump(ALERTS_TABLE, "total", "''", delta) + "\n    " + _cleanup(ALERTS_TABLE)
+    return [
+        f"CREATE TRIGGER IF NOT EXISTS {name}_insert AFTER INSERT ON {ALERTS_TABLE} "
+        f"WHEN NEW.state IN {ACTIVE_ALERT_STATES} BEGIN\n    {insert_body}\nEND",
+        f"CREATE TRIGGER IF NOT EXISTS {name}_delete AFTER DELETE ON {ALERTS_TABLE} "
+        f"WHEN OLD.state IN {ACTIVE_ALERT_STATES} BEGIN\n    {delete_body}\nEND",
+        f"CREATE TRIGGER IF NOT EXISTS {name}_update AFTER UPDATE OF state ON {ALERTS_TABLE} "
+        f"WHEN {delta} <> 0 BEGIN\n    {update_body}\nEND",
+    ]
+
+# -----------------------------
+# Install / Rebuild
+# -----------------------------
+_installed = set()
+
+# (path, piglet tables, counts alerts) for every file holding summary rows. In
+# sharded storage each herd shard counts its own pigs and each alert shard its
+# own alerts; reads add them up.
+def _summary_files(db_path):
+    if not is_sharded(db_path):
+        return [(db_path, PIGLET_TABLES, True)]
+    return ([(path, PIGLET_TABLES, False) for path in herd_shards(db_path)]
+            + [(path, [], True) for path in alert_shards(db_path)])
+
+# Idempotent; after the first call per process it is a set lookup per file, so
+# a herd shard added since the last call is picked up
+def install_summary(db_path=DB_PATH):
+    init_alerts_table(db_path)
+    for path, tables, alerts in _summary_files(db_path):
+        if path not in _installed:
+            _install(path, tables, alerts)
+            _installed.add(path)
+
+def _install(path, tables, alerts):
+    conn = sqlite3.connect(path)
+    legacy = 0
+    with conn:
+        conn.execute(SUMMARY_SCHEMA)
+        for table in tables:
+            for sql in trigger_sql(table):
+                conn.execute(sql)
+        if alerts:
+            legacy = conn.execute("SELECT COUNT(*) FROM sqlite_master WHERE type = 'trigger' AND name IN (?, ?)",
+                                  LEGACY_ALERT_TRIGGERS).fetchone()[0]
+            for name in LEGACY_ALERT_TRIGGERS:
+                conn.execute(f"DROP TRIGGER IF EXISTS {name}")
+            for sql in alert_trigger_sql():
+                conn.execute(sql)
+    empty = conn.execute("SELECT 1 FROM HerdSummary LIMIT 1").fetchone() is None
+    conn.close()
+    # The legacy alert count included resolved alerts
+    if empty or legacy:
+        _rebuild(path, tables, alerts)
+
+def _recompute(conn, tables=PIGLET_TABLES, alerts=True):
+    counts = {}
+    for table in tables:
+        total = conn.execute(f"SELECT COUNT(*) FROM {table}").fetchone()[0]
+        if total:
+            counts[(table, "total", "")] = total
+        for d in DIMENSIONS:
+            for value, count in conn.execute(f"SELECT IFNULL({d}, ''), COUNT(*) FROM {table} GROUP BY 1"):
+                counts[(table, d, value)] = count
+    if alerts:
+        active = conn.execute(f"SELECT COUNT(*) FROM {ALERTS_TABLE} WHERE state IN {ACTIVE_ALERT_STATES}").fetchone()[0]
+        if active:
+            counts[(ALERTS_TABLE, "total", "")] = active
+    return counts
+
+def rebuild_summary(db_path=DB_PATH):
+    for path, tables, alerts in _summary_files(db_path):
+        _rebuild(path, tables, alerts)
+
+def _rebuild(path, tables, alerts):
+    conn = sqlite3.connect(path)
+    with conn:
+        # BEGIN IMMEDIATE keeps writers out while the counts are recomputed
+        conn.execute("BEGIN IMMEDIATE")
+        counts = _recompute(conn, tables, alerts)
+        conn.execute("DELETE FROM HerdSummary")
+        conn.executemany(
+            "INSERT INTO HerdSummary (table_name, dimension, value, count) VALUES (?, ?, ?, ?)",
+            [key + (count,) for key, count in counts.items()])
+    conn.close()
+
+# Returns a list of (table, dimension, value, stored, actual) rows that disagree
+def check_summary(db_path=DB_PATH):
+    mismatches = []
+    for path, tables, alerts in _summary_files(db_path):
+        conn = sqlite3.connect(path)
+        actual = _recompute(conn, tables, alerts)
+        stored = {(t, d, v): c for t, d, v, c in
+                  conn.execute("SELECT table_name, dimension, value, count FROM HerdSummary")}
+        conn.close()
+        for key in sorted(set(actual) | set(stored)):
+            if actual.get(key, 0) != stored.get(key, 0):
+                mismatches.append(key + (stored.get(key, 0), actual.get(key, 0)))
+    return mismatches
+
+# -----------------------------
+# Reads
+# -----------------------------
+def _sum_rows(db_path, sql, params):
+    def read(path):
+        conn = sqlite3.connect(path)
+        try:
+            return conn.execute(sql, params).fetchall()
+        except sqlite3.OperationalError:
+            # A herd shard no reader has installed the summary on yet
+            return []
+        finally:
+            conn.close()
+    totals = {}
+    for rows in fan_out(read, [path for path, _, _ in _summary_files(db_path)]):
+        for key, count in rows:
+            totals[key] = totals.get(key, 0) + count
+    return totals
+
+def get_kpis(db_path=DB_PATH, table_name=None):
+    tables = [table_name] if table_name in PIGLET_TABLES else PIGLET_TABLES
+    placeholders = ", ".join("?" * len(tables))
+    totals = _sum_rows(db_path, f"""
+        SELECT CASE WHEN table_name = ? THEN 'alerts' WHEN dimension = 'total' THEN 'piglets' ELSE 'sick' END,
+               SUM(count) FROM HerdSummary
+        WHERE (table_name = ? AND dimension = 'total')
+           OR (table_name IN ({placeholders}) AND (dimension = 'total'
+               OR (dimension = 'health_status' AND value IN ('Sick', 'sick'))))
+        GROUP BY 1""", [ALERTS_TABLE, ALERTS_TABLE] + tables)
+    return {"piglets": totals.get("piglets", 0), "sick": totals.get("sick", 0), "alerts": totals.get("alerts", 0)}
+
+def get_breakdown(dimension, db_path=DB_PATH, table_name=None):
+    tables = [table_name] if table_name in PIGLET_TABLES else PIGLET_TABLES
+    placeholders = ", ".join("?" * len(tables))
+    totals = _sum_rows(db_path,
+                       f"SELECT value, SUM(count) FROM HerdSummary WHERE dimension = ? AND table_name IN ({placeholders}) "
+                       f"GROUP BY value", [dimension] + tables)
+    return sorted(totals.items())
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Check or rebuild the herd summary tables")
+    parser.add_argument("--db", default=DB_PATH)
+    parser.add_argument("--rebuild", action="store_true", help="Recompute the summary from scratch")
+    args = parser.parse_args()
+
+    install_summary(args.db)
+    if args.rebuild:
+        rebuild_summary(args.db)
+        print("Summary rebuilt.")
+    mismatches = check_summary(args.db)
+    if mismatches:
+        print("Summary is out of sync:")
+        for table, dimension, value, stored, actual in mismatches:
+            print(f"  {table}.{dimension}={value!r}: stored {stored}, actual {actual}")
+    else:
+        print("Summary is consistent.")
@@ -0,0 +1,43 @@
+import os
+import sqlite3
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from piglet_db import PIGLET_SCHEMA, PIGLET_TABLES, add_piglet  # noqa: E402
+
+# (gender, barcode, location, health_status)
+PIGS = [
+    ("Male", "PIG-001", "Barn 1 Pen 2", "Healthy"),
+    ("Female", "PIG-002", "Barn 1 Pen 3", "Sick"),
+    ("Male", "PIG-003", "Barn 2 Pen 1", "Healthy"),
+    ("Female", "PIG-004", "Barn 2 Pen 4", "Healthy"),
+    ("Male", "PIG-005", "Quarantine", "Sick"),
+]
+
+def add_pigs(db_path, pigs=PIGS):
+    for gender, barcode, location, health_status in pigs:
+        assert add_piglet(gender, barcode, "2026-01-05", "Duroc", 12.5, health_status, None, None, location, "",
+                          db_path)
+
+# A single-file herd database with the piglet tables and PIGS
+@pytest.fixture
+def herd_db(tmp_path):
+    path = str(tmp_path / "piglets.db")
+    conn = sqlite3.connect(path)
+    for table in PIGLET_TABLES:
+        conn.execute(PIGLET_SCHEMA.format(table=table))
+    conn.commit()
+    conn.close()
+    add_pigs(path)
+    return path
+
+# The same herd in sharded storage
+@pytest.fixture
+def shard_dir(tmp_path):
+    path = str(tmp_path / "shards")
+    os.makedirs(path)
+    add_pigs(path)
+    return path
@@ -0,0 +1,58 @@
+import sqlite3
+
+import pytest
+
+from piglet_db import (CAMERA_ALERT_TTL, REALERT_SECONDS, RESOLVED_RETENTION, acknowledge_alert, alert_shard,
+                       already_alerted, compact_alerts, get_alerts, init_alerts_table, mark_alerted, resolve_alert)
+
+@pytest.fixture(params=["herd_db", "shard_dir"])
+def db_path(request):
+    path = request.getfixturevalue(request.param)
+    init_alerts_table(path)
+    return path
+
+def _row(db_path, barcode):
+    conn = sqlite3.connect(alert_shard(db_path, barcode))
+    conn.row_factory = sqlite3.Row
+    row = conn.execute("SELECT * FROM AlertsSent WHERE barcode = ?", (barcode,)).fetchone()
+    conn.close()
+    return row
+
+def test_open_alert_realerts_after_interval(db_path):
+    mark_alerted("PIG-002", "FemalePiglets", db_path, now=1000.0)
+    assert already_alerted("PIG-002", db_path, now=1000.0 + REALERT_SECONDS - 1)
+    assert not already_alerted("PIG-002", db_path, now=1000.0 + REALERT_SECONDS + 1)
+
+def test_acknowledged_alert_is_quiet_until_resolved(db_path):
+    mark_alerted("PIG-002", "FemalePiglets", db_path, now=1000.0)
+    assert acknowledge_alert("PIG-002", db_path, now=1010.0)
+    assert already_alerted("PIG-002", db_path, now=1000.0 + 10 * REALERT_SECONDS)
+    assert resolve_alert("PIG-002", db_path, now=1020.0)
+    assert not already_alerted("PIG-002", db_path, now=1030.0)
+    assert get_alerts(db_path).empty
+    assert list(get_alerts(db_path, states=("resolved",))["barcode"]) == ["PIG-002"]
+
+def test_realert_reopens_the_same_row(db_path):
+    mark_alerted("PIG-002", "FemalePiglets", db_path, now=1000.0)
+    acknowledge_alert("PIG-002", db_path, now=1010.0)
+    resolve_alert("PIG-002", db_path, now=1020.0)
+    mark_alerted("PIG-002", "FemalePiglets", db_path, now=1030.0)
+    row = _row(db_path, "PIG-002")
+    assert row["state"] == "open"
+    assert row["alert_count"] == 2
+    assert row["acknowledged_at"] is None and row["resolved_at"] is None
+
+def test_unknown_barcode_state_change_is_reported(db_path):
+    assert not acknowledge_alert("PIG-404", db_path)
+    assert not resolve_alert("PIG-404", db_path)
+
+def test_compaction_drops_expired_camera_and_old_resolved_alerts(db_path):
+    mark_alerted("camera_3_4", "CameraFeed", db_path, now=1000.0)
+    mark_alerted("PIG-002", "FemalePiglets", db_path, now=1000.0)
+    mark_alerted("PIG-005", "MalePiglets", db_path, now=1000.0)
+    resolve_alert("PIG-005", db_path, now=1000.0)
+    assert already_alerted("camera_3_4", db_path, now=1000.0 + CAMERA_ALERT_TTL - 1)
+    assert not already_alerted("camera_3_4", db_path, now=1000.0 + CAMERA_ALERT_TTL + 1)
+    assert compact_alerts(db_path, now=1000.0 + RESOLVED_RETENTION + 1) == 2
+    assert _row(db_path, "camera_3_4") is None and _row(db_path, "PIG-005") is None
+    assert _row(db_path, "PIG-002")["state"] == "open"
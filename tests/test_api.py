@@ -0,0 +1,98 @@
+import sqlite3
+import time
+
+import pytest
+
+from api import Connections, apply_scans, install_api, op_alerts, op_batch, op_herd, op_piglet, op_scans
+from piglet_db import mark_alerted, resolve_alert
+
+@pytest.fixture
+def db(herd_db):
+    install_api(herd_db)
+    db = Connections(herd_db)
+    yield db
+    db.close()
+
+def _weighings(db_path, barcode):
+    conn = sqlite3.connect(db_path)
+    rows = conn.execute("SELECT weighed_on, weight FROM WeightHistory WHERE barcode = ?", (barcode,)).fetchall()
+    conn.close()
+    return rows
+
+def test_retried_upload_is_reported_duplicate(db, herd_db):
+    scans = [{"scan_id": "d1-1", "barcode": "PIG-001", "weight": 20.0, "scanned_at": 1000.0}]
+    assert op_scans(db, {"scans": scans})[1]["results"] == [{"scan_id": "d1-1", "status": "applied"}]
+    assert op_scans(db, {"scans": scans})[1]["results"] == [{"scan_id": "d1-1", "status": "duplicate"}]
+    assert len(_weighings(herd_db, "PIG-001")) == 1
+
+def test_invalid_scan_does_not_fail_its_upload(db):
+    scans = [{"barcode": "PIG-001"}, {"scan_id": "d1-2", "barcode": "PIG-001", "scanned_at": "yesterday"},
+             {"scan_id": "d1-3", "barcode": "PIG-001", "health_status": "Sick"}]
+    results = op_scans(db, {"scans": scans})[1]["results"]
+    assert [r["status"] for r in results] == ["invalid", "invalid", "applied"]
+    assert results[1]["scan_id"] == "d1-2"
+
+def test_stale_scan_keeps_its_weighing_but_not_its_record(db, herd_db):
+    conn = db()
+    with conn:
+        apply_scans(conn, [{"scan_id": "new", "barcode": "PIG-003", "weight": 30.0, "scanned_at": 2 * 86400.0}])
+    with conn:
+        result = apply_scans(conn, [{"scan_id": "old", "barcode": "PIG-003", "weight": 25.0,
+                                     "scanned_at": 86400.0}])
+    assert result == [{"scan_id": "old", "status": "stale"}]
+    assert op_piglet(db, {"barcode": "PIG-003"})[1]["weight"] == 30.0
+    assert len(_weighings(herd_db, "PIG-003")) == 2
+
+def test_unknown_barcode_is_created_only_with_a_gender(db):
+    results = op_scans(db, {"scans": [{"scan_id": "u1", "barcode": "PIG-100", "weight": 2.0},
+                                      {"scan_id": "u2", "barcode": "PIG-101", "gender": "female",
+                                       "location": "Barn 3", "weight": 2.0}]})[1]["results"]
+    assert [r["status"] for r in results] == ["unknown_barcode", "created"]
+    assert op_piglet(db, {"barcode": "PIG-101"})[1]["gender"] == "Female"
+
+def test_herd_delta_carries_changes_and_tombstones_since_a_version(db, herd_db):
+    status, body, etag = op_herd(db, {})
+    assert status == 200 and not body["more"]
+    assert sorted(row[0] for row in body["rows"]) == ["PIG-001", "PIG-002", "PIG-003", "PIG-004", "PIG-005"]
+    version = body["version"]
+    assert op_herd(db, {"since": version})[1]["rows"] == []
+
+    op_scans(db, {"scans": [{"scan_id": "h1", "barcode": "PIG-004", "weight": 40.0}]})
+    conn = sqlite3.connect(herd_db)
+    with conn:
+        conn.execute("DELETE FROM MalePiglets WHERE barcode = 'PIG-005'")
+    conn.close()
+    body = op_herd(db, {"since": version, "fields": "weight"})[1]
+    assert body["columns"] == ["barcode", "weight"]
+    assert body["rows"] == [["PIG-004", 40.0]]
+    assert body["deleted"] == ["PIG-005"]
+    assert op_herd(db, {"since": version})[2] != etag
+
+def test_herd_delta_pages_by_limit(db):
+    first = op_herd(db, {"limit": 2})[1]
+    assert len(first["rows"]) == 2 and first["more"]
+    rest = op_herd(db, {"since": first["version"], "limit": 10})[1]
+    assert len(rest["rows"]) == 3 and not rest["more"]
+
+def test_alert_delta_reports_resolved_alerts(db, herd_db):
+    mark_alerted("PIG-002", "FemalePiglets", herd_db, now=1000.0)
+    mark_alerted("PIG-005", "MalePiglets", herd_db, now=1001.0)
+    full = op_alerts(db, {})[1]
+    assert [row[0] for row in full["rows"]] == ["PIG-005", "PIG-002"]
+    resolve_alert("PIG-002", herd_db, now=2000.0)
+    delta = op_alerts(db, {"since": 1500.0})[1]
+    assert [row[:3] for row in delta["rows"]] == [["PIG-002", "FemalePiglets", "resolved"]]
+    assert [row[0] for row in op_alerts(db, {})[1]["rows"]] == ["PIG-005"]
+
+def test_batch_answers_304_for_a_held_etag(db):
+    _, body, etag = op_piglet(db, {"barcode": "PIG-001"})
+    responses = op_batch(db, {"requests": [{"op": "piglet", "barcode": "PIG-001", "etag": etag},
+                                           {"op": "piglet", "barcode": "PIG-404"},
+                                           {"op": "nope"}]})[1]["responses"]
+    assert [r["status"] for r in responses] == [304, 404, 400]
+
+def test_scans_answer_with_the_new_herd_version(db):
+    before = op_herd(db, {})[1]["version"]
+    body = op_scans(db, {"scans": [{"scan_id": "v1", "barcode": "PIG-001", "weight": 21.0,
+                                    "scanned_at": time.time()}]})[1]
+    assert body["version"] > before
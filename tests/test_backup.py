@@ -0,0 +1,44 @@
+import os
+import sqlite3
+
+from backup import list_snapshots, restore, snapshot
+
+def _weights(db_path):
+    conn = sqlite3.connect(db_path)
+    rows = dict(conn.execute("SELECT barcode, weight FROM MalePiglets"))
+    conn.close()
+    return rows
+
+def _set_weight(db_path, barcode, weight):
+    conn = sqlite3.connect(db_path)
+    with conn:
+        conn.execute("UPDATE MalePiglets SET weight = ? WHERE barcode = ?", (weight, barcode))
+    conn.close()
+
+def test_unchanged_database_is_not_snapshotted_twice(herd_db, tmp_path):
+    backups = str(tmp_path / "backups")
+    first = snapshot(herd_db, backups)
+    assert first is not None and os.path.exists(first["path"])
+    assert snapshot(herd_db, backups) is None
+    assert snapshot(herd_db, backups, force=True) is not None
+
+def test_restore_brings_back_the_snapshot_and_keeps_the_current_state(herd_db, tmp_path):
+    backups = str(tmp_path / "backups")
+    snapshot(herd_db, backups, label="before")
+    original = _weights(herd_db)
+    # Held open across the restore, like a dashboard process
+    reader = sqlite3.connect(herd_db)
+    _set_weight(herd_db, "PIG-001", 99.0)
+    restore("before", herd_db, backups)
+    assert _weights(herd_db) == original
+    assert reader.execute("SELECT weight FROM MalePiglets WHERE barcode = 'PIG-001'").fetchone()[0] == 12.5
+    reader.close()
+    labels = [s["label"] for s in list_snapshots(backups, herd_db)]
+    assert "pre-restore" in labels
+    restore("pre-restore", herd_db, backups)
+    assert _weights(herd_db)["PIG-001"] == 99.0
+
+def test_restore_of_an_unknown_snapshot_fails(herd_db, tmp_path):
+    import pytest
+    with pytest.raises(FileNotFoundError):
+        restore("nope", herd_db, str(tmp_path / "backups"))
@@ -0,0 +1,71 @@
+import json
+import sqlite3
+
+import pytest
+
+import api
+from piglet_db import is_sharded, piglet_shard
+from scan_journal import ScanJournal
+
+# A real API server on a free port over the given database; start_api_server
+# is process-wide, so each test gets its own
+@pytest.fixture(params=["herd_db", "shard_dir"])
+def server(request, monkeypatch):
+    db_path = request.getfixturevalue(request.param)
+    monkeypatch.setattr(api, "_server", None)
+    server = api.start_api_server(0, host="127.0.0.1", db_path=db_path)
+    yield f"http://127.0.0.1:{server.server_address[1]}", db_path
+    server.shutdown()
+    server.server_close()
+
+@pytest.fixture
+def journal(tmp_path):
+    journal = ScanJournal(str(tmp_path / "journal.db"))
+    yield journal
+    journal.conn.close()
+
+def _cached(journal):
+    return {barcode: json.loads(record) for barcode, record in
+            journal.conn.execute("SELECT barcode, record FROM HerdCache")}
+
+def test_sync_pulls_the_herd_then_only_changes(server, journal):
+    url, _ = server
+    totals = journal.sync(url)
+    assert totals["herd_rows"] == 5 and totals["sent"] == 0
+    assert set(_cached(journal)) == {"PIG-001", "PIG-002", "PIG-003", "PIG-004", "PIG-005"}
+    assert journal.sync(url)["herd_rows"] == 0
+
+def test_recorded_scan_is_applied_once(server, journal):
+    url, _ = server
+    journal.sync(url)
+    scan = journal.record("PIG-003", weight=33.0)
+    totals = journal.sync(url)
+    assert totals["sent"] == 1
+    assert journal.pending() == []
+    assert _cached(journal)["PIG-003"]["weight"] == 33.0
+    # A lost acknowledgement: the scan goes again and the server knows it
+    with journal.conn:
+        journal.conn.execute("UPDATE Journal SET synced_at = NULL, status = NULL WHERE scan_id = ?",
+                             (scan["scan_id"],))
+    journal.sync(url)
+    assert journal.conn.execute("SELECT status FROM Journal").fetchone()[0] == "duplicate"
+
+def test_a_move_between_barns_is_not_a_delete(server, journal):
+    url, db_path = server
+    journal.sync(url)
+    journal.record("PIG-001", location="Barn 2 Pen 9")
+    journal.sync(url)
+    cached = _cached(journal)
+    assert cached["PIG-001"]["location"] == "Barn 2 Pen 9"
+    assert len(cached) == 5
+
+def test_server_deletes_reach_the_cache(server, journal):
+    url, db_path = server
+    journal.sync(url)
+    path = piglet_shard("PIG-004", db_path)[1] if is_sharded(db_path) else db_path
+    conn = sqlite3.connect(path)
+    with conn:
+        conn.execute("DELETE FROM FemalePiglets WHERE barcode = 'PIG-004'")
+    conn.close()
+    journal.sync(url)
+    assert "PIG-004" not in _cached(journal)
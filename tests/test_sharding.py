@@ -0,0 +1,87 @@
+import os
+import sqlite3
+
+from api import Connections, install_api, op_herd, op_piglet, op_scans
+from growth import install_growth, record_weight
+from piglet_db import (PIGLET_TABLES, add_piglet, find_piglet, get_all_piglets, get_data, herd_shards, move_piglet,
+                       piglet_shard)
+from sharding import index_shards, shard_database
+from summary_tables import get_kpis, install_summary
+
+def _shard(path):
+    return os.path.basename(path)
+
+def test_pigs_are_routed_to_their_barn(shard_dir):
+    assert [_shard(p) for p in herd_shards(shard_dir)] == ["herd-barn-1.db", "herd-barn-2.db",
+                                                           "herd-unassigned.db"]
+    assert _shard(piglet_shard("PIG-003", shard_dir)[1]) == "herd-barn-2.db"
+    assert _shard(piglet_shard("PIG-005", shard_dir)[1]) == "herd-unassigned.db"
+    table, piglet = find_piglet("PIG-002", shard_dir)
+    assert table == "FemalePiglets" and piglet["location"] == "Barn 1 Pen 3"
+    assert find_piglet("PIG-404", shard_dir) == (None, None)
+
+def test_barcodes_and_ids_are_unique_across_shards(shard_dir):
+    assert not add_piglet("Male", "PIG-001", "2026-01-05", "Duroc", 1.0, "Healthy", None, None, "Barn 2", "",
+                          shard_dir)
+    males = get_data("MalePiglets", shard_dir)
+    assert sorted(males["barcode"]) == ["PIG-001", "PIG-003", "PIG-005"]
+    assert males["id"].is_unique
+
+def test_move_carries_the_pig_and_its_rows(shard_dir):
+    install_growth(shard_dir)
+    record_weight("PIG-001", "2026-02-01", 20.0, shard_dir)
+    piglet_id = find_piglet("PIG-001", shard_dir)[1]["id"]
+    assert move_piglet("PIG-001", "Barn 2 Pen 7", shard_dir)
+    table, path = piglet_shard("PIG-001", shard_dir)
+    assert _shard(path) == "herd-barn-2.db"
+    assert find_piglet("PIG-001", shard_dir)[1]["id"] == piglet_id
+    conn = sqlite3.connect(path)
+    assert conn.execute("SELECT weight FROM WeightHistory WHERE barcode = 'PIG-001'").fetchall() == [(20.0,)]
+    conn.close()
+    assert len(get_all_piglets(shard_dir)) == 5
+    assert not move_piglet("PIG-404", "Barn 1", shard_dir)
+
+def test_herd_delta_survives_a_move(shard_dir):
+    install_api(shard_dir)
+    db = Connections(shard_dir)
+    body = op_herd(db, {})[1]
+    assert len(body["rows"]) == 5
+    version = body["version"]
+    assert "barn-1:" in version and "barn-2:" in version
+    move_piglet("PIG-002", "Barn 2 Pen 1", shard_dir)
+    delta = op_herd(db, {"since": version})[1]
+    assert [row[0] for row in delta["rows"]] == ["PIG-002"]
+    assert delta["deleted"] == []
+    assert op_piglet(db, {"barcode": "PIG-002"})[1]["location"] == "Barn 2 Pen 1"
+    db.close()
+
+def test_scans_route_to_the_pigs_shard(shard_dir):
+    install_api(shard_dir)
+    db = Connections(shard_dir)
+    scans = [{"scan_id": "s1", "barcode": "PIG-003", "weight": 30.0},
+             {"scan_id": "s2", "barcode": "PIG-004", "location": "Barn 3 Pen 1"},
+             {"scan_id": "s3", "barcode": "PIG-200", "gender": "male", "location": "Barn 1", "weight": 2.0},
+             {"scan_id": "s4", "barcode": "PIG-201"}]
+    results = op_scans(db, {"scans": scans})[1]["results"]
+    assert [r["status"] for r in results] == ["applied", "applied", "created", "unknown_barcode"]
+    assert [r["status"] for r in op_scans(db, {"scans": scans})[1]["results"]] == ["duplicate"] * 4
+    assert _shard(piglet_shard("PIG-004", shard_dir)[1]) == "herd-barn-3.db"
+    assert _shard(piglet_shard("PIG-200", shard_dir)[1]) == "herd-barn-1.db"
+    assert find_piglet("PIG-003", shard_dir)[1]["weight"] == 30.0
+    # The new barn's shard shows up in the herd with the moved pig
+    herd = op_herd(db, {})[1]
+    assert sorted(row[0] for row in herd["rows"]) == ["PIG-001", "PIG-002", "PIG-003", "PIG-004", "PIG-005",
+                                                      "PIG-200"]
+    assert "barn-3:" in herd["version"]
+    db.close()
+
+def test_split_keeps_every_pig_and_summary(herd_db, tmp_path):
+    install_summary(herd_db)
+    shards = str(tmp_path / "split")
+    assert shard_database(herd_db, shards) == 5
+    assert sorted(get_all_piglets(shards)["barcode"]) == sorted(get_all_piglets(herd_db)["barcode"])
+    for table in PIGLET_TABLES:
+        assert sorted(get_data(table, shards)["id"]) == sorted(get_data(table, herd_db)["id"])
+    install_summary(shards)
+    assert get_kpis(shards) == get_kpis(herd_db) == {"piglets": 5, "sick": 2, "alerts": 0}
+    assert index_shards(shards) == []
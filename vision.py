@@ -0,0 +1,42 @@
+from resources import lazy_import
+
+# -----------------------------
+# Settings
+# -----------------------------
+SICK_CLASS = 1
+SICK_CONFIDENCE = 0.5
+
+# -----------------------------
+# Detection Helpers
+# -----------------------------
+# Plain tuples so results can cross process boundaries cheaply:
+#   barcodes   -> [(data, (x, y, w, h)), ...]
+#   detections -> [(x1, y1, x2, y2, class_id, confidence), ...]
+def decode_barcodes(frame):
+    pyzbar = lazy_import("pyzbar.pyzbar")
+    return [(b.data.decode("utf-8"), tuple(b.rect)) for b in pyzbar.decode(frame)]
+
+# model is anything with detect(frame): a SharedModel lease or a detectors backend
+def detect_objects(model, frame):
+    return model.detect(frame)
+
+def is_sick(detection):
+    return detection[4] == SICK_CLASS and detection[5] > SICK_CONFIDENCE
+
+# Draws barcode boxes in green and detections in red (sick) or green (healthy);
+# labels optionally names each detection (see fusion.BarcodeFusion.labels)
+def annotate(frame, barcodes, detections, labels=None):
+    cv2 = lazy_import("cv2")
+    for data, (x, y, w, h) in barcodes:
+        cv2.rectangle(frame, (x, y), (x + w, y + h), (0, 255, 0), 2)
+        cv2.putText(frame, data, (x, y - 10), cv2.FONT_HERSHEY_SIMPLEX, 0.5, (0, 255, 0), 2)
+    for i, detection in enumerate(detections):
+        x1, y1, x2, y2, _, conf = detection
+        sick = is_sick(detection)
+        color = (0, 0, 255) if sick else (0, 255, 0)
+        label = f"Sick ({conf:.2f})" if sick else f"Healthy ({conf:.2f})"
+        if labels and labels[i]:
+            label = f"{labels[i]} {label}"
+        cv2.rectangle(frame, (x1, y1), (x2, y2), color, 2)
+        cv2.putText(frame, label, (x1, y1 - 10), cv2.FONT_HERSHEY_SIMPLEX, 0.5, color, 2)
+    return frame
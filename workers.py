@@ -0,0 +1,214 @@
+import os
+import signal
+import smtplib
+import threading
+import time
+from email.mime.text import MIMEText
+
+from piglet_db import (DB_PATH, PIGLET_TABLES, get_data, init_alerts_table, already_alerted, mark_alerted,
+                       maybe_compact_alerts, herd_shards, shard_files)
+from resources import lazy_import
+
+# -----------------------------
+# Settings
+# -----------------------------
+# Background workers started by launcher.py, one process each:
+#   python workers.py ingest   sensor stream, growth forecasts, alert compaction
+#   python workers.py alerts   sick-piglet table scan and alert delivery
+#   python workers.py vision   camera capture, detection, alerts and MJPEG stream
+#   python workers.py backup   online snapshots of the database
+#   python workers.py api      JSON/msgpack API for handheld scanners
+#   python workers.py reports  daily and weekly herd reports (HTML + JSON)
+# --db may name a shard directory (see piglet_db); every worker routes on it.
+ALERT_SCAN_INTERVAL = 15
+FORECAST_INTERVAL = 60
+HEARTBEAT_INTERVAL = 5
+BACKUP_INTERVAL = int(os.environ.get("PIGLYTICS_BACKUP_MINUTES", "60")) * 60
+REPORT_CHECK_INTERVAL = 60
+
+stop_event = threading.Event()
+
+def _handle_stop(signum, frame):
+    stop_event.set()
+
+# The launcher treats a heartbeat file older than its timeout as a hung worker
+def heartbeat():
+    path = os.environ.get("PIGLYTICS_HEARTBEAT")
+    if path:
+        with open(path, "w") as f:
+            f.write(str(time.time()))
+
+def run_every(interval, *jobs):
+    next_beat = 0.0
+    while not stop_event.is_set():
+        for job in jobs:
+            job()
+        if time.monotonic() >= next_beat:
+            heartbeat()
+            next_beat = time.monotonic() + HEARTBEAT_INTERVAL
+        stop_event.wait(interval)
+
+# -----------------------------
+# Alert Delivery
+# -----------------------------
+# Credentials come from the environment; a channel without them is skipped.
+def send_email_alert(piglet):
+    host = os.environ.get("PIGLYTICS_SMTP_HOST")
+    recipient = os.environ.get("PIGLYTICS_ALERT_EMAIL")
+    if not host or not recipient:
+        return False
+    sender = os.environ.get("PIGLYTICS_SMTP_USER", "")
+    msg = MIMEText("A sick piglet has been detected.\n\n" +
+                   "\n".join(f"{k}: {piglet.get(k, '')}" for k in
+                             ("barcode", "breed", "weight", "location", "health_status", "notes")))
+    msg["Subject"] = f"🚨 Sick Piglet Alert: {piglet['barcode']}"
+    msg["From"] = sender
+    msg["To"] = recipient
+    try:
+        with smtplib.SMTP_SSL(host, int(os.environ.get("PIGLYTICS_SMTP_PORT", "465"))) as server:
+            server.login(sender, os.environ.get("PIGLYTICS_SMTP_PASSWORD", ""))
+            server.sendmail(sender, recipient, msg.as_string())
+        return True
+    except Exception as e:
+        print(f"Email alert failed: {e}", flush=True)
+        return False
+
+def send_sms_alert(piglet):
+    sid, token = os.environ.get("TWILIO_ACCOUNT_SID"), os.environ.get("TWILIO_AUTH_TOKEN")
+    sender, recipient = os.environ.get("TWILIO_FROM"), os.environ.get("PIGLYTICS_ALERT_PHONE")
+    if not (sid and token and sender and recipient):
+        return False
+    try:
+        client = lazy_import("twilio.rest").Client(sid, token)
+        client.messages.create(body=f"🚨 Sick Piglet Alert: {piglet['barcode']} at {piglet.get('location', '')}",
+                               from_=sender, to=recipient)
+        return True
+    except Exception as e:
+        print(f"SMS alert failed: {e}", flush=True)
+        return False
+
+def deliver(piglet, table_name, db_path=DB_PATH):
+    send_email_alert(piglet)
+    send_sms_alert(piglet)
+    mark_alerted(piglet["barcode"], table_name, db_path)
+
+# -----------------------------
+# Workers
+# -----------------------------
+def ingest_worker(db_path=DB_PATH):
+    from changes import install_changes
+    from growth import install_growth, refresh_forecasts
+    from events import event_recorder
+    from sensors import SensorProcessor, start_source, write_snapshot, SNAPSHOT_INTERVAL
+
+    processor = SensorProcessor()
+    events = event_recorder()
+    if events is not None:
+        events.tap_sensors(processor)
+    source = os.environ.get("PIGLYTICS_SENSOR_SOURCE")
+    snapshot_path = os.environ.get("PIGLYTICS_SENSOR_SNAPSHOT")
+    if source:
+        start_source(processor, source)
+    last_forecast = 0.0
+
+    def tick():
+        nonlocal last_forecast
+        if snapshot_path:
+            write_snapshot(processor, snapshot_path)
+        if events is not None:
+            events.flush()
+        if time.monotonic() - last_forecast >= FORECAST_INTERVAL:
+            # Per herd shard; new barns get their growth and change tables on first sight
+            for path in herd_shards(db_path):
+                install_growth(path)
+                install_changes(path)
+                refresh_forecasts(path)
+            last_forecast = time.monotonic()
+        maybe_compact_alerts(db_path)
+    run_every(SNAPSHOT_INTERVAL, tick)
+
+def alerts_worker(db_path=DB_PATH):
+    init_alerts_table(db_path)
+
+    def scan():
+        for table in PIGLET_TABLES:
+            df = get_data(table, db_path)
+            for piglet in df[df["health_status"] == "Sick"].to_dict("records"):
+                if not already_alerted(piglet["barcode"], db_path):
+                    deliver(piglet, table, db_path)
+    run_every(ALERT_SCAN_INTERVAL, scan)
+
+# One headless camera monitor for every dashboard process: frames are annotated
+# here and served once through the MJPEG stream that dashboards embed.
+def vision_worker(db_path=DB_PATH):
+    from camera_monitor import camera_monitor
+    from clip_buffer import init_clip_column
+    from mjpeg_stream import start_stream_server
+
+    camera_index = int(os.environ.get("PIGLYTICS_CAMERA", "0"))
+    init_alerts_table(db_path)
+    init_clip_column(db_path)
+    start_stream_server()
+    with camera_monitor(camera_index, weights=os.environ.get("PIGLYTICS_WEIGHTS", "yolov8n.pt"),
+                        multiprocess=True, db_path=db_path, deliver=deliver) as monitor:
+        while not stop_event.is_set():
+            # The launcher restarts a worker whose monitor gave up
+            if not monitor.alive():
+                raise RuntimeError(f"camera monitor stopped: {monitor.error}")
+            heartbeat()
+            stop_event.wait(HEARTBEAT_INTERVAL)
+
+# Snapshots are skipped when nothing changed, so a quiet barn doesn't fill the
+# backup directory with identical copies
+def backup_worker(db_path=DB_PATH):
+    from backup import snapshot, rotate
+
+    last_backup = 0.0
+
+    def tick():
+        nonlocal last_backup
+        if time.monotonic() - last_backup >= BACKUP_INTERVAL:
+            for path in shard_files(db_path):
+                try:
+                    snapshot(path)
+                    rotate(db_path=path)
+                except Exception as e:
+                    print(f"Backup of {path} failed: {e}", flush=True)
+            last_backup = time.monotonic()
+    run_every(HEARTBEAT_INTERVAL, tick)
+
+def api_worker(db_path=DB_PATH):
+    from api import start_api_server
+
+    start_api_server(db_path=db_path)
+    run_every(HEARTBEAT_INTERVAL)
+
+# Reports render here rather than in a dashboard rerun; dashboards and the API
+# serve the files it writes
+def reports_worker(db_path=DB_PATH):
+    from reports import render_due
+
+    def tick():
+        try:
+            rendered = render_due(db_path)
+            if rendered:
+                print(f"Rendered {', '.join(rendered)} reports", flush=True)
+        except Exception as e:
+            print(f"Report rendering failed: {e}", flush=True)
+    run_every(REPORT_CHECK_INTERVAL, tick)
+
+WORKERS = {"ingest": ingest_worker, "alerts": alerts_worker, "vision": vision_worker, "backup": backup_worker,
+           "api": api_worker, "reports": reports_worker}
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Run a Piglytics background worker")
+    parser.add_argument("worker", choices=sorted(WORKERS))
+    parser.add_argument("--db", default=DB_PATH)
+    args = parser.parse_args()
+
+    # SIGTERM from the launcher finishes the current iteration and exits cleanly
+    signal.signal(signal.SIGTERM, _handle_stop)
+    signal.signal(signal.SIGINT, _handle_stop)
+    WORKERS[args.worker](args.db)